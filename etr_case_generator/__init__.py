@@ -1,2 +1,10 @@
-from .ontology import Ontology
 # Package initialization
+# Submodules are imported lazily, so that importing one light module (e.g. reified_problem) doesn't pull in pyetr.
+# `from etr_case_generator import Ontology` still works, it just loads ontology.py on first use.
+
+
+def __getattr__(name):
+    if name == "Ontology":
+        from .ontology import Ontology
+        return Ontology
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,24 @@
+import multiprocessing
+import queue
 import random
 import time
 import math
+import itertools
+import traceback
 
 from dataclasses import dataclass, field
 
 from etr_case_generator.logic_types import AtomCount
+from etr_case_generator.problem_fingerprint import problem_fingerprint
+from etr_case_generator.problem_pool import ProblemPool
 from etr_case_generator.reified_problem import PartialProblem, ReifiedView
-from etr_case_generator.seed_problems import create_starting_problems
-from etr_case_generator.mutations import get_view_mutations
+from etr_case_generator.seed_banks import copy_seed_problem, get_seed_bank
+from etr_case_generator.mutations import get_mutation_neighbourhood, view_from_str
 from etr_case_generator.ontology import Ontology
 from pyetr import View
-from pyetr.cases import BaseExample
-from pyetr.inference import default_inference_procedure
-from typing import Optional, Generator, Tuple, Set, Counter, List, Callable
+from pyetr.parsing.common import ParsingError
+from etr_case_generator.etr_inference_cache import cached_inference_procedure
+from typing import Optional, Generator, Iterator, Tuple, Set, Counter, List, Callable, Union
 
 from etr_case_generator.view_to_natural_language import view_to_natural_language
 
@@ -22,6 +28,7 @@ ATOMS_PER_PROBLEM_BOOST = 5.0
 OVERUSED_ATOM_COUNT_DEMERIT = 8.0
 SOFTMAX_TEMPERATURE = 2.0
 KEEP_EXTRA_STUFF=10
+PRODUCER_TIMEOUT = 600.0  # Seconds to wait on the background producer before giving up on it
 
 # TODO A plan for fixing the generator for producing well balanced problems
 # [x] If the problem_set has a problem in a needed bucket, great
@@ -40,11 +47,7 @@ def count_atoms_in_problem(problem: PartialProblem) -> int:
     """Count total number of atoms in a problem's premises."""
     if not problem.premises:
         return 0
-    return sum(
-        len(premise.logical_form_etr_view.atoms)
-        for premise in problem.premises 
-        if premise.logical_form_etr_view
-    )
+    return problem.num_atoms()
 
 def get_atom_count_distribution(problems: List[PartialProblem]) -> tuple[Counter[AtomCount], float]:
     """Get distribution of atom counts across a list of problems and the median frequency.
@@ -59,11 +62,12 @@ def get_atom_count_distribution(problems: List[PartialProblem]) -> tuple[Counter
         count = AtomCount(count_atoms_in_problem(problem))
         counts[count] += 1
     
-    # Calculate median frequency
+    return counts, median_frequency(counts)
+
+def median_frequency(counts: Counter[AtomCount]) -> float:
+    """The median of the frequencies in an atom count distribution, 0.0 if it's empty"""
     frequencies = sorted(counts.values())
-    median_freq = frequencies[len(frequencies)//2] if frequencies else 0.0
-    
-    return counts, median_freq
+    return frequencies[len(frequencies)//2] if frequencies else 0.0
 
 def boost_low_num_atom_problems(problem: PartialProblem, all_problems: List[PartialProblem]) -> float:
     """
@@ -105,8 +109,19 @@ def boost_low_num_atom_problems(problem: PartialProblem, all_problems: List[Part
 
 @dataclass
 class ETRGenerator:
-    """Maintains the state of the ETR problem generator between calls."""
-    problem_set: List[PartialProblem] = field(default_factory=list)
+    """Maintains the state of the ETR problem generator between calls.
+
+    Each instance is an independent session, with its own random number generator, seed problems, queue and record of
+    the problems it has made, so several can run side by side in one process. See `shard_generators` for splitting a
+    run between several of them.
+    """
+    seed: Optional[Union[int, str]] = None  # Seeds this session's random number generator, `rng`
+    seed_bank: Optional[str] = None  # The seed bank to start from (see seed_banks.py), the default one if None
+    seed_ids: Optional[frozenset[str]] = None  # Only start from the seed problems with these ids, all of them if None
+    rng: random.Random = field(init=False, repr=False)
+    already_generated: Set[int] = field(default_factory=set, repr=False)  # problem_fingerprint of the premises of every problem made
+
+    problem_pool: ProblemPool = field(default_factory=ProblemPool)  # Problems by (seed id, atom count), see problem_pool.py
     # Queue sizes are OVERRIDDEN in generate_etr.py
     min_queue_size: int = 50  # Minimum number of problems to maintain in queue
     max_queue_size: int = 100  # Maximum size of the queue. This should be large relative to max_mutations_per_base_problem to maintain diversity
@@ -123,12 +138,34 @@ class ETRGenerator:
 
     needed_counts: Counter[AtomCount] = None  # Atom counts needed for the queue  # TODO Need to actually use this
 
+    # If set, mutation runs in a BackgroundProducer process, which keeps the queue topped up while the caller is busy
+    # with the problems it got, rather than ensure_queue_filled stopping to fill it
+    background: bool = False
+    _producer: Optional["BackgroundProducer"] = None
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.problem_pool.rng = self.rng
+
+    def seed_problems(self) -> list[PartialProblem]:
+        """Copies of the seed problems this session starts from"""
+        problems = [copy_seed_problem(p) for p in get_seed_bank(self.seed_bank)
+                    if self.seed_ids is None or p.seed_id in self.seed_ids]
+        if not problems:
+            raise ValueError(f"No seed problems with ids {sorted(self.seed_ids)} in seed bank {self.seed_bank}")
+        return problems
+
     def initialize_generator(self) -> None:
         """Initialize the problem generator."""
+        if self.background:
+            self._producer = BackgroundProducer.start(self)
+            self.max_queue_size_init = self.max_queue_size
+            return
+
         self._generator = self._generate_problems()
 
         # Fill the queue with initial problems
-        self.problem_set.extend(create_starting_problems())
+        self.problem_pool.extend(self.seed_problems())
 
         self.max_queue_size_init = self.max_queue_size
 
@@ -148,111 +185,122 @@ class ETRGenerator:
             tuple[PartialProblem, bool]: The selected problem and whether to only increase atoms
                                        (True if using strategy b/c, False if strategy a, random if random pick)
         """
-        if not self.problem_set:
+        if not self.problem_pool:
             raise ValueError("Cannot select from empty problem set")
             
         # XX% chance to return random problem
-        if random.random() < 0.15:
-            return random.choice(self.problem_set), random.choice([True, False])
+        if self.rng.random() < 0.15:
+            return self.problem_pool.sample(), self.rng.choice([True, False])
             
         # Get atom counts that still need problems
         needed_sizes = [size for size, count in self.needed_counts.items() if count > 0]
         if not needed_sizes:
-            return random.choice(self.problem_set), random.choice([True, False])
+            return self.problem_pool.sample(), self.rng.choice([True, False])
 
         # Get all unique seed IDs from the problem set
-        seed_ids = list(set(p.seed_id for p in self.problem_set))
-        chosen_seed_id = random.choice(seed_ids)
-        
-        # Filter problems to only those with the chosen seed ID
-        seed_problems = [p for p in self.problem_set if p.seed_id == chosen_seed_id]
-        if not seed_problems:
-            print("!" * 80)
-            print(f"WARNING: Seed ID {chosen_seed_id} not found in problem set")
-            return random.choice(self.problem_set), random.choice([True, False])
+        seed_ids = self.problem_pool.seed_ids()
+        chosen_seed_id = self.rng.choice(seed_ids)
             
         # Pick a random needed size to target
-        target_size = random.choice(needed_sizes)
+        target_size = self.rng.choice(needed_sizes)
         print(f"Selecting problem with {target_size} atoms, with seed id {chosen_seed_id}, to target needed counts, at {self.needed_counts[AtomCount(target_size)]} needed")
         
         # Try strategy a) Find problem with same atom count
-        same_size_problems = [p for p in seed_problems if p.num_atoms() == target_size]
-        if same_size_problems:
-            return random.choice(same_size_problems), False
+        same_size_problem = self.problem_pool.sample(seed_id=chosen_seed_id, atom_counts=[target_size])
+        if same_size_problem is not None:
+            return same_size_problem, False
             
         # Try strategy b) Find problem with n-1 atoms
-        smaller_problems = [p for p in seed_problems if p.num_atoms() == target_size - 1]
-        if smaller_problems:
-            return random.choice(smaller_problems), True
+        smaller_problem = self.problem_pool.sample(seed_id=chosen_seed_id, atom_counts=[target_size - 1])
+        if smaller_problem is not None:
+            return smaller_problem, True
             
         # Try strategy c) Find problem with highest atom count < target
-        problems_by_size = [(p, p.num_atoms()) for p in seed_problems]
-        problems_by_size.sort(key=lambda x: x[1], reverse=True)
-        
-        for problem, size in problems_by_size:
-            if size < target_size:
-                return problem, True
+        smaller_sizes = [size for size in self.problem_pool.atom_counts_for_seed(chosen_seed_id) if size < target_size]
+        if smaller_sizes:
+            return self.problem_pool.sample(seed_id=chosen_seed_id, atom_counts=[max(smaller_sizes)]), True
                 
         # If all else fails, return random problem
-        return random.choice(self.problem_set), random.choice([True, False])
+        return self.problem_pool.sample(), self.rng.choice([True, False])
 
-    def get_mutated_premises(self, problem: PartialProblem, only_increase: bool=False) -> Set[Tuple[View, ...]]:
+    def get_mutated_premises(self, problem: PartialProblem, only_increase: bool=False) -> Iterator[Tuple[View, ...]]:
         """
-        Get all possible mutations of the premises of a problem.
-        
+        The mutations of the premises of a problem, drawn lazily in a random order, without repeats.
+
+        Each one mutates one premise (see `MutationNeighbourhood`) or adds a new premise. The mutations are only
+        described until they're drawn, and their atom counts are worked out from the descriptions, so that those whose
+        atom count is under-represented in the queue (rarer than the median) can be drawn first. Only the mutations
+        that are drawn get built into Views, so taking a few of them skips building the rest.
+
         Returns:
-            Set[List[View]]: A set of all possible mutated premises
+            Iterator[Tuple[View, ...]]: The mutated premises
         """
-        mutations = set()
         assert problem.premises is not None
-        for i, view in enumerate(problem.premises):
-            assert view.logical_form_etr_view is not None
-            for mut in get_view_mutations(view.logical_form_etr_view, only_increase=only_increase):
-                new_mutation = (
-                    tuple([p.logical_form_etr_view for p in problem.premises[:i]]) +
-                    (mut,) +
-                    tuple([p.logical_form_etr_view for p in problem.premises[i+1:]])
-                )
-                mutations.add(new_mutation)
-        # Add a mutation where we add a new premise
-        mutations.add(
-            tuple([p.logical_form_etr_view for p in problem.premises]) +
-            (View.from_str("{A(a())}"),)
-        )
-
-        # Add a mutation where we remove a random premise
+        views = tuple(p.logical_form_etr_view for p in problem.premises)
+        assert all(view is not None for view in views)
+        num_atoms = problem.num_atoms()
 
-        return mutations
+        # Get distribution of atom counts across problems
+        problem_atom_counts = self.problem_pool.atom_counts()
+        median_freq = self.problem_pool.median_frequency()
 
-    def get_some_good_mutations(self, mutations: Set[Tuple[View, ...]]):
-        """The purpose of this function is to promote diversity in the size of problems that are generated by the mutations process."""
+        # (premise index, neighbourhood, mutation), with None for the mutation where we add a new premise
         definitely_good_mutations = []
         other_mutations = []
 
-        # Get distribution of atom counts across problems
-        problem_atom_counts, median_freq = get_atom_count_distribution(self.problem_set)
-
-        for mutation in mutations:
-            num_atoms = sum(len(view.atoms) for view in mutation)
-            
+        def add_candidate(candidate, new_num_atoms: int):
             # Check if this mutation's atom count occurs less often than the median
-            under_represented_num_atoms = problem_atom_counts[AtomCount(num_atoms)] < median_freq
-
-            if under_represented_num_atoms:
-                definitely_good_mutations.append(mutation)
+            if problem_atom_counts[AtomCount(new_num_atoms)] < median_freq:
+                definitely_good_mutations.append(candidate)
             else:
-                other_mutations.append(mutation)
+                other_mutations.append(candidate)
+
+        for i, view in enumerate(views):
+            neighbourhood = get_mutation_neighbourhood(view, only_increase=only_increase)
+            for mutation in neighbourhood.mutations:
+                delta = neighbourhood.atom_delta(mutation)
+                if only_increase and delta < 0:
+                    continue  # Conjoining or disjoining drops the supposition, get_view_mutations doesn't allow these
+                add_candidate((i, neighbourhood, mutation), num_atoms + delta)
+        # Add a mutation where we add a new premise
+        add_candidate((None, None, None), num_atoms + 1)
+
+        # Add a mutation where we remove a random premise
 
-        print(f"Found {len(definitely_good_mutations)} under-represented mutations out of {len(mutations)} total mutations")
-        print("Atom counts in problem_set:", {k: problem_atom_counts[k] for k in sorted(problem_atom_counts.keys())})
+        print(f"Found {len(definitely_good_mutations)} under-represented mutations out of {len(definitely_good_mutations) + len(other_mutations)} total mutations")
+
+        seen = set()
+        for candidates in [definitely_good_mutations, other_mutations]:
+            self.rng.shuffle(candidates)
+            for i, neighbourhood, mutation in candidates:
+                if i is None:
+                    mutated_premises = views + (view_from_str("{A(a())}"),)
+                else:
+                    try:
+                        mutated_view = neighbourhood.to_view(mutation)
+                    except ParsingError:
+                        continue  # Ran off the end of the alphabet for new names, e.g. the constant after z()
+                    mutated_premises = views[:i] + (mutated_view,) + views[i+1:]
+                # Different mutations can come out the same
+                if mutated_premises in seen:
+                    continue
+                seen.add(mutated_premises)
+                yield mutated_premises
+
+    def get_some_good_mutations(self, mutations: Iterator[Tuple[View, ...]]) -> List[Tuple[View, ...]]:
+        """The purpose of this function is to promote diversity in the size of problems that are generated by the mutations process.
+
+        Takes the first max_mutations_per_base_problem of `get_mutated_premises`, which favours under-represented atom counts.
+        """
+        mutations = list(itertools.islice(mutations, self.max_mutations_per_base_problem))
+
+        problem_atom_counts = self.problem_pool.atom_counts()
+        print("Atom counts in problem_pool:", {k: problem_atom_counts[k] for k in sorted(problem_atom_counts.keys())})
         print("Needed counts for p-set:   ", {k: self.needed_counts[k] for k in sorted(self.needed_counts.keys())})
-        seed_counts = Counter[str](p.seed_id for p in self.problem_set)
-        print("Seed counts in problem_set: ", {k: seed_counts[k] for k in sorted(seed_counts.keys())})
+        seed_counts = self.problem_pool.seed_counts()
+        print("Seed counts in problem_pool: ", {k: seed_counts[k] for k in sorted(seed_counts.keys())})
 
-        random.shuffle(definitely_good_mutations)
-        random.shuffle(other_mutations)
-        mutations = definitely_good_mutations + other_mutations
-        return mutations[:self.max_mutations_per_base_problem]
+        return mutations
 
     def _generate_problems(self) -> Generator[PartialProblem, None, None]:
         """Internal generator function that creates new problems."""
@@ -267,7 +315,7 @@ class ETRGenerator:
             # TODO Consider iterating through this data structure in a more chaotic way than
             # just queueing stuff (priority queue, randomizing at each step, etc.)
             # Get the most recent problem from the queue to mutate
-            if not self.problem_set:
+            if not self.problem_pool:
                 print(f"Queue is empty after {mutation_count} mutations")
                 # If queue is empty, we've exhausted this line of problems
                 raise StopIteration("Queue is empty")
@@ -279,8 +327,8 @@ class ETRGenerator:
             print(f"Chose base problem with seed id {base_problem.seed_id} and atom count {count_atoms_in_problem(base_problem)}")
             # print(f"Chose base problem with seed id {base_problem.seed_id}")
 
-            possible_mutations: Set[Tuple[View, ...]] = self.get_mutated_premises(base_problem, only_increase=should_increase)
-            print(f"Selecting new base problem with id {base_problem.seed_id} and atom count {count_atoms_in_problem(base_problem)}", f"Applying {self.max_mutations_per_base_problem} out of {len(possible_mutations)} mutations to base problem")
+            possible_mutations: Iterator[Tuple[View, ...]] = self.get_mutated_premises(base_problem, only_increase=should_increase)
+            print(f"Selecting new base problem with id {base_problem.seed_id} and atom count {count_atoms_in_problem(base_problem)}", f"Applying up to {self.max_mutations_per_base_problem} mutations to base problem")
 
             # Randomly select a subset of the mutations to apply
             used_mutations = self.get_some_good_mutations(possible_mutations)
@@ -288,7 +336,11 @@ class ETRGenerator:
             # Sanity check: everything in possible_mutations should have the same number
             # of premises as base_problem EXCEPT one (which has n+1 premises)
             for mutated_premises in used_mutations:
-                etr_what_follows = default_inference_procedure(mutated_premises)
+                fingerprint = problem_fingerprint(list(mutated_premises))
+                if fingerprint in self.already_generated:
+                    continue
+                self.already_generated.add(fingerprint)
+                etr_what_follows = cached_inference_procedure(mutated_premises)
                 premises = []
                 for p in mutated_premises:
                     premises.append(
@@ -318,25 +370,6 @@ class ETRGenerator:
 
             mutation_count += 1
 
-    def _group_by_atom_count_and_seed(self) -> dict[AtomCount, dict[str, list[int]]]:
-        """Group problems by atom count and seed ID.
-        
-        Returns:
-            dict mapping atom count -> (seed_id -> list of problem indices)
-        """
-        grouped = {}
-        for i, problem in enumerate(self.problem_set):
-            count = AtomCount(problem.num_atoms())
-            if count not in grouped:
-                grouped[count] = {}
-            
-            seed_id = problem.seed_id
-            if seed_id not in grouped[count]:
-                grouped[count][seed_id] = []
-            grouped[count][seed_id].append(i)
-            
-        return grouped
-
     def trim_overfull_buckets(self) -> None:
         """Remove problems from buckets that have more problems than needed.
         
@@ -347,56 +380,80 @@ class ETRGenerator:
         if not self.needed_counts:
             return
             
-        # Group problems by atom count and seed ID
-        grouped = self._group_by_atom_count_and_seed()
-            
         # Find and trim overfull buckets while preserving seed diversity
-        indices_to_remove = []
-        for atom_count, seed_groups in grouped.items():
+        num_removed = 0
+        for atom_count in self.problem_pool.atom_counts():
             needed = self.needed_counts[atom_count] + KEEP_EXTRA_STUFF
-            current = sum(len(indices) for indices in seed_groups.values())
+            current = self.problem_pool.count(atom_count=atom_count)
             
             while current > needed:
                 # Find seed IDs with multiple problems at this atom count
-                removable = [seed_id for seed_id, indices in seed_groups.items() 
-                            if len(indices) > 1]
+                removable = [seed_id for seed_id in self.problem_pool.seed_ids_with_atom_count(atom_count)
+                             if self.problem_pool.count(seed_id=seed_id, atom_count=atom_count) > 1]
                 if not removable:
                     break  # Can't remove more without losing seed diversity
                     
                 # Remove one problem from a seed ID with extras
-                seed_id = random.choice(removable)
-                idx = seed_groups[seed_id].pop()
-                indices_to_remove.append(idx)
+                seed_id = self.rng.choice(removable)
+                self.problem_pool.pop(seed_id=seed_id, atom_counts=[atom_count])
+                num_removed += 1
                 current -= 1
-                
-        # Remove problems in reverse order to maintain correct indices
-        for idx in sorted(indices_to_remove, reverse=True):
-            self.problem_set.pop(idx)
             
-        if indices_to_remove:
-            print(f"Trimmed {len(indices_to_remove)} problems from overfull buckets")
+        if num_removed:
+            print(f"Trimmed {num_removed} problems from overfull buckets")
 
     def ensure_queue_filled(self) -> None:
         """Ensure the queue has at least min_queue_size problems."""
-        if self._generator is None:
+        if self._generator is None and self._producer is None:
             self.initialize_generator()
 
-        if len(self.problem_set) < self.min_queue_size:
-            print(f"Queue has {len(self.problem_set)} problems, filling to {self.max_queue_size}")
+        if self._producer is not None:
+            self._producer.set_needed_counts(self.needed_counts)
+            self._take_from_producer()
+        elif len(self.problem_pool) < self.min_queue_size:
+            print(f"Queue has {len(self.problem_pool)} problems, filling to {self.max_queue_size}")
             current_time = time.time()
-            while len(self.problem_set) < self.max_queue_size:
+            while len(self.problem_pool) < self.max_queue_size:
                 assert self._generator is not None
                 new_problem = next(self._generator)
-                self.problem_set.append(new_problem)
-            print(f"Filled queue to size {len(self.problem_set)} in {time.time() - current_time:.2f} seconds")
+                self.problem_pool.add(new_problem)
+            print(f"Filled queue to size {len(self.problem_pool)} in {time.time() - current_time:.2f} seconds")
 
         self.trim_overfull_buckets()
 
         # Statistics on the new queue
-        num_atoms_count, median_freq = get_atom_count_distribution(self.problem_set)
+        num_atoms_count = self.problem_pool.atom_counts()
         # print("Atom count in new queue:", {k: num_atoms_count[k] for k in sorted(num_atoms_count.keys())})
         # print(f"Median frequency: {median_freq}")
 
+    def _take_from_producer(self) -> None:
+        """Move the problems that the background producer has made into the queue, up to max_queue_size. Only waits for
+        it if the queue has fewer than min_queue_size problems."""
+        assert self._producer is not None
+        num_taken = 0
+        current_time = time.time()
+        while len(self.problem_pool) < self.max_queue_size:
+            must_wait = len(self.problem_pool) < self.min_queue_size
+            problem = self._producer.get(block=must_wait)
+            if problem is None:
+                break
+            self.problem_pool.add(problem)
+            num_taken += 1
+        if num_taken:
+            print(f"Took {num_taken} problems from the background producer in {time.time() - current_time:.2f} seconds, queue has {len(self.problem_pool)}")
+
+    def next_problem(self, needed_counts: Optional[Counter[AtomCount]] = None) -> PartialProblem:
+        """A new problem whose atom count is still needed, like `random_etr_problem` but from this session"""
+        if needed_counts is not None:
+            self.needed_counts = needed_counts
+        return self.get_next_problem()
+
+    def close(self) -> None:
+        """Stop the background producer, if there is one"""
+        if self._producer is not None:
+            self._producer.stop()
+            self._producer = None
+
     # TODO: this could be passed an optional vocab_size, filter the list of problems
     # to match
     # If there isn't one, try to generate until you get one
@@ -411,45 +468,200 @@ class ETRGenerator:
         """
         self.ensure_queue_filled()
 
-        # Get indices of problems with acceptable atom counts
-        valid_indices = []
-        for i, problem in enumerate(self.problem_set):
-            num_atoms = AtomCount(problem.num_atoms())
-            if self.needed_counts[num_atoms] > 0:
-                valid_indices.append(i)
+        # Atom counts of problems that are still needed
+        valid_atom_counts = [count for count in self.problem_pool.atom_counts() if self.needed_counts[count] > 0]
+        num_valid = sum(self.problem_pool.count(atom_count=count) for count in valid_atom_counts)
                 
-        print(f"Found {len(valid_indices)} problems with needed atom counts")
+        print(f"Found {num_valid} problems with needed atom counts")
 
-        if not valid_indices:
+        if not num_valid:
             # Temporarily increase the queue size to try to find a problem with needed atom count
             self.max_queue_size += self.max_queue_size_init
             self.min_queue_size = self.max_queue_size + 1
             print(f"Increasing queue size to {self.max_queue_size} to attempt to find a problem with needed atom count")
 
             # Print atom stats
-            num_atoms_count, _ = get_atom_count_distribution(self.problem_set)
+            num_atoms_count = self.problem_pool.atom_counts()
             print("Atom count in queue:", {AtomCount(k): num_atoms_count[k] for k in sorted(num_atoms_count.keys())})
 
             self.ensure_queue_filled()
-            valid_indices = [i for i, problem in enumerate(self.problem_set) 
-                             if self.needed_counts[AtomCount(problem.num_atoms())] > 0]
+            valid_atom_counts = [count for count in self.problem_pool.atom_counts() if self.needed_counts[count] > 0]
+            num_valid = sum(self.problem_pool.count(atom_count=count) for count in valid_atom_counts)
         
-        if not valid_indices:
+        if not num_valid:
             raise RuntimeError("No problems match the needed atom counts")
             
-        # Select random valid index and remove that problem
-        if len(valid_indices) <= 1:
-            print(f"Warning, only {len(valid_indices)} valid problem found")
-        idx = random.choice(valid_indices)
-        return self.problem_set.pop(idx)
+        # Select a random valid problem and remove it
+        if num_valid <= 1:
+            print(f"Warning, only {num_valid} valid problem found")
+        return self.problem_pool.pop(atom_counts=valid_atom_counts)
+
+class BackgroundProducer:
+    """Runs an ETRGenerator's mutation loop in a separate process, and hands the problems back through a bounded queue.
 
-# Global state instance
+    The producer keeps its own pool of problems to mutate, trimmed to max_queue_size, and is steered by the consumer's
+    needed counts, which are sent to it whenever they change. The queue holds at most max_queue_size problems, so the
+    producer gets at most that far ahead of the consumer.
+    """
+
+    def __init__(self, process: multiprocessing.Process, problems: multiprocessing.Queue,
+                 needed_counts_updates: multiprocessing.Queue, stop_event):
+        self.process = process
+        self.problems = problems
+        self.needed_counts_updates = needed_counts_updates
+        self.stop_event = stop_event
+        self._last_needed_counts: Optional[dict] = None
+
+    @classmethod
+    def start(cls, generator: ETRGenerator) -> "BackgroundProducer":
+        # Spawned rather than forked, like the --workers processes in generate_etr.py
+        context = multiprocessing.get_context("spawn")
+        problems = context.Queue(maxsize=generator.max_queue_size)
+        needed_counts_updates = context.Queue()
+        stop_event = context.Event()
+        settings = dict(
+            seed=generator.rng.getrandbits(64),
+            seed_bank=generator.seed_bank,
+            seed_ids=generator.seed_ids,
+            min_queue_size=generator.min_queue_size,
+            max_queue_size=generator.max_queue_size,
+            max_mutations_per_base_problem=generator.max_mutations_per_base_problem,
+            softmax_temperature=generator.softmax_temperature,
+            unused_seed_boost=generator.unused_seed_boost,
+            overused_atom_count_demerit=generator.overused_atom_count_demerit,
+        )
+        process = context.Process(
+            target=_run_background_producer,
+            args=(settings, dict(generator.needed_counts or {}), problems, needed_counts_updates, stop_event),
+            daemon=True,
+        )
+        process.start()
+        producer = cls(process, problems, needed_counts_updates, stop_event)
+        producer._last_needed_counts = dict(generator.needed_counts or {})
+        return producer
+
+    def set_needed_counts(self, needed_counts: Optional[Counter[AtomCount]]):
+        """Tell the producer what's needed now, if that's changed"""
+        needed_counts = dict(needed_counts or {})
+        if needed_counts != self._last_needed_counts:
+            self.needed_counts_updates.put(needed_counts)
+            self._last_needed_counts = needed_counts
+
+    def get(self, block: bool) -> Optional[PartialProblem]:
+        """The next problem from the producer, or None if there isn't one ready and `block` is False
+
+        Raises:
+            RuntimeError: If the producer failed, or nothing came within PRODUCER_TIMEOUT seconds
+        """
+        try:
+            item = self.problems.get(block=block, timeout=PRODUCER_TIMEOUT if block else None)
+        except queue.Empty:
+            if block:
+                raise RuntimeError(f"Background producer made no problems in {PRODUCER_TIMEOUT} seconds")
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def stop(self):
+        self.stop_event.set()
+        # Empty the queue so that the producer isn't stuck putting a problem into it
+        try:
+            while True:
+                self.problems.get_nowait()
+        except queue.Empty:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def _run_background_producer(settings: dict, needed_counts: dict, problems: multiprocessing.Queue,
+                             needed_counts_updates: multiprocessing.Queue, stop_event) -> None:
+    """The body of the BackgroundProducer process"""
+    generator = ETRGenerator(**settings)
+    generator.needed_counts = Counter[AtomCount](needed_counts)
+    generator.initialize_generator()
+    try:
+        while not stop_event.is_set():
+            # Pick up the latest needed counts from the consumer
+            try:
+                while True:
+                    generator.needed_counts = Counter[AtomCount](needed_counts_updates.get_nowait())
+            except queue.Empty:
+                pass
+
+            assert generator._generator is not None
+            problem = next(generator._generator)
+            generator.problem_pool.add(problem)  # So that it can be mutated further, as it would be in the consumer's queue
+            if len(generator.problem_pool) > generator.max_queue_size:
+                generator.trim_overfull_buckets()
+            while len(generator.problem_pool) > generator.max_queue_size:
+                generator.problem_pool.pop()
+
+            while not stop_event.is_set():
+                try:
+                    problems.put(problem, timeout=1.0)
+                    break
+                except queue.Full:
+                    continue
+    except Exception as e:
+        problems.put(RuntimeError(f"Background producer failed: {e}\n{traceback.format_exc()}"))
+
+
+@dataclass
+class GeneratorShard:
+    """One of the sessions made by `shard_generators`, with the part of the run it's responsible for"""
+    generator: ETRGenerator
+    needed_counts: Counter[AtomCount]
+
+
+def shard_generators(num_shards: int, needed_counts: Counter[AtomCount], seed: Optional[int] = None,
+                     seed_bank: Optional[str] = None, **generator_kwargs) -> list[GeneratorShard]:
+    """Split a run into independent sessions, e.g. one per worker.
+
+    The seed ids in the seed bank are dealt out between the shards, so no two shards start from the same seed problem,
+    and the problems needed at each atom count are divided between them as evenly as possible. Each shard's session
+    is seeded from (seed, shard index).
+
+    Args:
+        num_shards: How many sessions to make
+        needed_counts: Atom count -> number of problems needed, for the whole run
+        seed: Base seed, or None for unseeded sessions
+        seed_bank: The seed bank to split, the default one if None
+        generator_kwargs: Passed on to each ETRGenerator, e.g. the queue sizes
+
+    Raises:
+        ValueError: If there are more shards than seed ids
+    """
+    all_seed_ids = list(dict.fromkeys(p.seed_id for p in get_seed_bank(seed_bank)))
+    if num_shards < 1 or num_shards > len(all_seed_ids):
+        raise ValueError(f"Can't split {len(all_seed_ids)} seed ids into {num_shards} shards")
+
+    shards = []
+    for i in range(num_shards):
+        shard_counts = Counter[AtomCount]()
+        for count, needed in needed_counts.items():
+            shard_counts[count] = needed // num_shards + (1 if i < needed % num_shards else 0)
+        generator = ETRGenerator(
+            seed=None if seed is None else f"{seed}:{i}",
+            seed_bank=seed_bank,
+            seed_ids=frozenset(all_seed_ids[i::num_shards]),
+            **generator_kwargs,
+        )
+        generator.needed_counts = shard_counts
+        shards.append(GeneratorShard(generator=generator, needed_counts=shard_counts))
+    return shards
+
+
+# The session behind the module-level functions below, which are kept for existing callers
 _etr_generator = ETRGenerator()
 
 def random_etr_problem(bias_function: Optional[Callable[[PartialProblem, List[PartialProblem]], float]] = None,
                        needed_counts: Counter[AtomCount] = None) -> PartialProblem:
     """
-    Generate a random ETR problem that matches the filter criteria.
+    Generate a random ETR problem that matches the filter criteria, from the module's default session. Make an
+    ETRGenerator and call its `next_problem` to have a session of your own.
 
     Side Effect:
         Updates the global generator state and sets the generation bias function
@@ -471,8 +683,15 @@ def random_etr_problem(bias_function: Optional[Callable[[PartialProblem, List[Pa
 def reset_generator_state():
     """Reset the generator state to initial conditions."""
     global _etr_generator
+    _etr_generator.close()
     _etr_generator = ETRGenerator()
 
+def set_background_generation(background: bool):
+    """Generate problems in a background process, see BackgroundProducer. Must be set before the first problem."""
+    if _etr_generator._generator is not None or _etr_generator._producer is not None:
+        raise RuntimeError("Set background generation before generating any problems")
+    _etr_generator.background = background
+
 def set_queue_sizes(min_size: int, max_size: int):
     """Configure the queue size parameters."""
     if min_size > max_size:
@@ -484,8 +703,8 @@ def set_max_mutations(max_mutations: int):
     """Set the maximum number of mutations before considering a line exhausted."""
     if max_mutations <= 0:
         raise ValueError("max_mutations must be positive")
-    _etr_generator.max_mutations = max_mutations
+    _etr_generator.max_mutations_per_base_problem = max_mutations
 
 def get_queue_size() -> int:
     """Get the current size of the problem queue."""
-    return len(_etr_generator.problem_set)
+    return len(_etr_generator.problem_pool)
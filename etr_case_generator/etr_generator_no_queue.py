@@ -1,32 +1,29 @@
+import heapq
 import random
 import time
 import math
 
-from copy import deepcopy
 from dataclasses import dataclass, field
 
 from pyparsing import ParseException
 
 from etr_case_generator.logic_types import AtomCount
 from etr_case_generator.reified_problem import PartialProblem, ReifiedView
-from etr_case_generator.seed_problems import (
-    create_starting_problems,
-)
-from etr_case_generator.study_replication_seed_problems import (
-    ILLUSORY_INFERENCE_FROM_DISJUNCTION_REVERSE_PREMISES_TEST,
-    ILLUSORY_INFERENCES_WITH_QUANTIFIERS,
-    ILLUSORY_INFERENCE_FROM_DISJUNCTION,
-)
-from etr_case_generator.mutations import get_view_mutations
+from etr_case_generator.seed_banks import copy_seed_problem, get_seed_bank
+from etr_case_generator.mutations import get_mutation_neighbourhood, get_view_mutations
 from etr_case_generator.ontology import Ontology
 from pyetr import View
-from pyetr.cases import BaseExample
-from pyetr.inference import default_inference_procedure
+from pyetr.parsing.common import ParsingError
 from typing import Optional, Generator, Tuple, Set, Counter, List, Callable
 
 from etr_case_generator.view_to_natural_language import view_to_natural_language
 from etr_case_generator.mutations import get_random_view
-from pyetr.inference import default_inference_procedure
+from etr_case_generator.etr_inference_cache import cached_inference_procedure
+from etr_case_generator.problem_fingerprint import problem_fingerprint
+from etr_case_generator.quota_scheduler import seed_family
+
+# How generate_problem can get from a seed problem to the target atom count, see ETRGeneratorIndependent
+SEARCH_MODES = ("random_walk", "directed")
 
 # HELPER FUNCTIONS
 
@@ -71,7 +68,7 @@ def create_partial_problem(views: Tuple[View], seed_problem_id: str) -> PartialP
                 english_form=None,
             )
         )
-    etr_what_follows = default_inference_procedure(views)
+    etr_what_follows = cached_inference_procedure(views)
     new_problem = PartialProblem(
         premises=premises,
         possible_conclusions_from_logical=None,
@@ -86,22 +83,78 @@ def create_partial_problem(views: Tuple[View], seed_problem_id: str) -> PartialP
     )
     return new_problem
 
+def problem_dedup_key(views: List[View]) -> int:
+    """Key used to spot a repeated problem: a fingerprint of its premises, in order, that ignores renaming."""
+    return problem_fingerprint(views)
+
 def is_categorical_only(partial_problem: PartialProblem) -> bool:
     """Check if a partial problem is categorical."""
     views = [p.logical_form_etr_view for p in partial_problem.premises]
-    conclusion = default_inference_procedure(views)
+    conclusion = cached_inference_procedure(views)
     return len(conclusion.stage) == 1 and not conclusion.is_verum
 
+@dataclass
+class TargetStats:
+    """How `generate_problem` has done for one target atom count"""
+    attempts: int = 0  # Searches started from a seed problem
+    accepted: int = 0  # Searches that produced a problem
+    mutations: int = 0  # Mutated views built
+    inferences: int = 0  # Candidate problems run through ETR inference
+    seconds: float = 0.0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.attempts if self.attempts else 0.0
+
+    @property
+    def problems_per_second(self) -> float:
+        return self.accepted / self.seconds if self.seconds else 0.0
+
+    def merge(self, other: "TargetStats"):
+        self.attempts += other.attempts
+        self.accepted += other.accepted
+        self.mutations += other.mutations
+        self.inferences += other.inferences
+        self.seconds += other.seconds
+
+    def __str__(self) -> str:
+        return (f"{self.accepted}/{self.attempts} accepted ({self.acceptance_rate:.0%}), "
+                f"{self.problems_per_second:.2f} problems/s, {self.mutations} mutations, {self.inferences} inferences")
+
+
+def format_search_stats(search_stats: dict[AtomCount, TargetStats]) -> str:
+    """One line per target atom count"""
+    return "\n".join(f" * {count} atoms: {search_stats[count]}" for count in sorted(search_stats))
+
 # GENERATOR CLASS
 
 class ETRGeneratorIndependent:
-    already_generated: Set[str]  # Used to prevent duplicate problems. str(PartialProblem) is used as key.
+    already_generated: Set[int]  # Used to prevent duplicate problems. problem_dedup_key(premises) is used as key.
 
-    def __init__(self, seed_bank: Optional[str] = None):
+    def __init__(self, seed_bank: Optional[str] = None, search: str = "random_walk", beam_width: int = 1,
+                 max_expansions: int = 60):
+        """
+        Args:
+            seed_bank: Serve problems straight from this seed bank (see seed_banks.py) instead of mutating seeds
+            search: How `generate_problem` gets from a seed problem to the target atom count. "random_walk" mutates
+                at random and retries when it overshoots, "directed" does a best-first search that never overshoots.
+            beam_width: Children per expanded problem, for the directed search
+            max_expansions: Problems the directed search expands before giving up on a seed problem
+        """
         self.already_generated = set()
         self.count_of_atom_counts_generated = Counter[AtomCount]()  # For logging
+        self.search_stats: dict[AtomCount, TargetStats] = {}  # Acceptance stats per target atom count
 
         self.seed_bank = seed_bank
+        if search not in SEARCH_MODES:
+            raise ValueError(f"Invalid search: {search}. Options are {SEARCH_MODES}")
+        self.search = search
+        self.beam_width = beam_width
+        self.max_expansions = max_expansions
+
+    def mark_as_generated(self, views: List[View]):
+        """Record a problem generated elsewhere (e.g. by an earlier, resumed run) so it isn't produced again."""
+        self.already_generated.add(problem_dedup_key(views))
 
     def generate_multi_view_problem(self, needed_counts: Counter[AtomCount], categorical_only: bool=True) -> PartialProblem:
         """Generate a problem with multiple views that meets the specified atom count requirements.
@@ -135,7 +188,7 @@ class ETRGeneratorIndependent:
 
                 try:
                     # Use ETR's inference procedure to check if a conclusion follows
-                    conclusion = default_inference_procedure(temp_views)
+                    conclusion = cached_inference_procedure(temp_views)
 
                     # If conclusion is null (verum), try a different view
                     if conclusion.is_verum:
@@ -152,7 +205,7 @@ class ETRGeneratorIndependent:
                 current_atom_count = sum(len(view.atoms) for view in views)
                 if AtomCount(current_atom_count) in needed_counts and needed_counts[AtomCount(current_atom_count)] > 0:
                     # Check if the conclusion is categorical (if required)
-                    conclusion = default_inference_procedure(views)
+                    conclusion = cached_inference_procedure(views)
                     is_categorical = len(conclusion.stage) == 1 and not conclusion.is_verum
 
                     if not categorical_only or is_categorical:
@@ -171,14 +224,16 @@ class ETRGeneratorIndependent:
         # If we failed to generate a novel problem with desired count
         raise ValueError(f"Failed to generate problem with desired atom count after {max_attempts} attempts")
 
-    def generate_problem(self, needed_counts: Counter[AtomCount], categorical_only: bool=True, multi_view: bool=False) -> PartialProblem:
+    def generate_problem(self, needed_counts: Counter[AtomCount], categorical_only: bool=True, multi_view: bool=False,
+                         seed_families: Optional[Set[str]] = None) -> PartialProblem:
         """
         Generate a single ETR problem.
 
         This function works as follows:
         - Choose a random seed problem from the list in seed_problems.py
         - Choose an atom count from the needed_counts distribution
-        - Repeatedly mutate the seed problem until it has the desired atom count
+        - Mutate the seed problem until it has the desired atom count, either by a random walk or by a directed search
+          (see `self.search`)
         - Check if the problem has already been generated, and if so, repeat the process
         - Return the generated problem
         
@@ -186,6 +241,8 @@ class ETRGeneratorIndependent:
             needed_counts: Counter specifying how many problems of each atom count are needed
             categorical_only: If True, only return problems with categorical conclusions
             multi_view: If True, generate a problem with multiple views instead of mutating a seed problem
+            seed_families: If given, only start from seeds in these families (see quota_scheduler.seed_family), or
+                from seeds that aren't in a family
         """
         if multi_view:
             return self.generate_multi_view_problem(needed_counts, categorical_only)
@@ -194,16 +251,17 @@ class ETRGeneratorIndependent:
         max_attempts = 10
         for attempt in range(max_attempts):
             # Choose random seed problem
+            seeds = get_seed_bank(self.seed_bank)
+            if seed_families is not None:
+                seeds = [p for p in seeds if seed_family(p.seed_id) in seed_families or seed_family(p.seed_id) is None]
+                if not seeds:
+                    raise ValueError(f"No seed problems left in the seed families {seed_families}")
             if self.seed_bank:
-                # Try to access the seed problems from the specified seed bank
-                try:
-                    seed_bank_problems = locals()[self.seed_bank]
-                except:
-                    raise ValueError(f"Invalid seed bank: {self.seed_bank}")
-                seed_problem: PartialProblem = random.choice(seed_bank_problems)
-                return deepcopy(seed_problem)
+                # Serve the seed problems from the specified seed bank as they are
+                seed_problem: PartialProblem = random.choice(seeds)
+                return copy_seed_problem(seed_problem)
 
-            seed_problem: PartialProblem = random.choice(create_starting_problems())
+            seed_problem: PartialProblem = random.choice(seeds)
             
             # Choose target atom count from needed_counts
             possible_counts = [count for count, needed in needed_counts.items() if needed > 0]
@@ -211,87 +269,190 @@ class ETRGeneratorIndependent:
                 raise ValueError("No more problems needed for any atom count")
                 
             target_count = random.choice(possible_counts)
-            current_problem: PartialProblem = seed_problem
-
-            # Try up to 200 sequential mutations to reach target count
-            mutation_attempts = 200
-            for mut_count in range(mutation_attempts):
-                current_count = AtomCount(count_atoms_in_problem(current_problem))
-
-                # print(f"Problem currently has this many premises: {current_count}, trying to get to {target_count}")
-                if current_count > target_count + 2:
-                    # Oops, try again
-                    # print(f"Too many atoms, retrying -- 2")
-                    break
-                
-                if current_count == target_count:
-                    # Check if we've generated this exact problem before
-                    problem_key = str(current_problem)
-                    if problem_key in self.already_generated and self.seed_bank is None:
-                        print(f"Already generated this problem, retrying")
-                        # Keep going with mutations, to try to get a novel problem
-                    else:
-                        problem_is_categorical = is_categorical_only(current_problem)
-                        current_problem.etr_predicted_conclusion_is_categorical = (
-                            problem_is_categorical
-                        )
-                        if categorical_only and not problem_is_categorical:
-                            print(f"Problem is not categorical, retrying")
-                        elif categorical_only and problem_is_categorical:
-                            print(f"Found a categorical problem yay!")
-                        if (not categorical_only) or problem_is_categorical:
-                            # Return the problem!
-                            self.already_generated.add(problem_key)
-                            self.count_of_atom_counts_generated[current_count] += 1
-
-                            # Stats on what we've already generated
-                            # print(f"Generated atom counts:", {k: self.count_of_atom_counts_generated[k] for k in sorted(self.count_of_atom_counts_generated.keys())})
-
-                            return current_problem
-                
-                # Randomly choose a premise to mutate
-                if len(current_problem.premises) == 1:
-                    premise_idx = 0
-                else:
-                    # Try to keep the last premise unchanged
-                    premise_idx = random.randrange(len(current_problem.premises) - 1)
-                view = current_problem.premises[premise_idx]
-                
-                # Decide whether to try to increase atoms or allow any mutation
-                if random.random() < 0.5:  # Sometimes mutate sideways
-                    only_increase = False
-                elif current_count >= target_count:  # Don't grow if we're already over
-                    only_increase = False
+
+            stats = self.search_stats.setdefault(target_count, TargetStats())
+            stats.attempts += 1
+            start_time = time.perf_counter()
+            try:
+                if self.search == "directed":
+                    problem = self._directed_search(seed_problem, target_count, categorical_only, stats)
                 else:
-                    only_increase = current_count < target_count
-                    
-                # Get a single mutation
-                try:
-                    mutations = get_view_mutations(view.logical_form_etr_view,
-                                                only_increase=only_increase,
-                                                only_do_one=True)
-                    if not mutations or len(mutations) != 1:
-                        print(f"Expected exactly one mutation, got {len(mutations)}")
-                        print(f"Seed id: {seed_problem.seed_id}")
-                        print("View:", view.logical_form_etr_view)
-                        print("Current Problem:", current_problem)
-                        raise ValueError("Expected exactly one mutation")
-
-                    # Apply the mutation to create new problem
-                    mut = next(iter(mutations))  # Get the single mutation
-                    new_premises: Tuple[ReifiedView] = (
-                        current_problem.premises[:premise_idx] +
-                        [ReifiedView(logical_form_etr_view=mut)] +
-                        current_problem.premises[premise_idx+1:]
-                    )
-                    base_views = [p.logical_form_etr_view for p in new_premises]
-
-                    # Update current problem for next iteration
-                    current_problem = create_partial_problem(base_views, seed_problem.seed_id)
-                except ParseException as e:
-                    print(f"Failed to mutate problem: {e}, retrying")
-                    raise e
-                    # continue
+                    problem = self._random_walk(seed_problem, target_count, categorical_only, stats)
+            finally:
+                stats.seconds += time.perf_counter() - start_time
+            if problem is not None:
+                stats.accepted += 1
+                return problem
 
         # If we failed to generate a novel problem with desired count
         raise ValueError(f"Failed to generate problem with desired atom count after {max_attempts} attempts")
+
+    def _try_accept(self, problem: PartialProblem, atom_count: AtomCount, categorical_only: bool) -> bool:
+        """Accept a problem that has the target atom count, unless it's a repeat or not categorical when it should be.
+
+        Accepted problems are recorded so they aren't generated again.
+        """
+        # Check if we've generated this exact problem before
+        problem_key = problem_dedup_key([p.logical_form_etr_view for p in problem.premises])
+        if problem_key in self.already_generated and self.seed_bank is None:
+            print(f"Already generated this problem, retrying")
+            # Keep going with mutations, to try to get a novel problem
+            return False
+
+        problem_is_categorical = is_categorical_only(problem)
+        problem.etr_predicted_conclusion_is_categorical = problem_is_categorical
+        if categorical_only and not problem_is_categorical:
+            print(f"Problem is not categorical, retrying")
+            return False
+        elif categorical_only and problem_is_categorical:
+            print(f"Found a categorical problem yay!")
+
+        self.already_generated.add(problem_key)
+        self.count_of_atom_counts_generated[atom_count] += 1
+
+        # Stats on what we've already generated
+        # print(f"Generated atom counts:", {k: self.count_of_atom_counts_generated[k] for k in sorted(self.count_of_atom_counts_generated.keys())})
+        return True
+
+    def _random_walk(self, seed_problem: PartialProblem, target_count: AtomCount, categorical_only: bool,
+                     stats: TargetStats) -> Optional[PartialProblem]:
+        """Mutate the seed at random, leaning towards the target atom count, until a problem with that count is accepted.
+
+        Gives up (returning None) after 200 mutations, or once the problem has overshot the target by more than 2.
+        Every step runs ETR inference on the new problem.
+        """
+        current_problem: PartialProblem = copy_seed_problem(seed_problem)  # The seed itself is shared
+
+        # Try up to 200 sequential mutations to reach target count
+        mutation_attempts = 200
+        for mut_count in range(mutation_attempts):
+            current_count = AtomCount(count_atoms_in_problem(current_problem))
+
+            # print(f"Problem currently has this many premises: {current_count}, trying to get to {target_count}")
+            if current_count > target_count + 2:
+                # Oops, try again
+                # print(f"Too many atoms, retrying -- 2")
+                return None
+
+            if current_count == target_count and self._try_accept(current_problem, current_count, categorical_only):
+                # Return the problem!
+                return current_problem
+
+            # Randomly choose a premise to mutate
+            if len(current_problem.premises) == 1:
+                premise_idx = 0
+            else:
+                # Try to keep the last premise unchanged
+                premise_idx = random.randrange(len(current_problem.premises) - 1)
+            view = current_problem.premises[premise_idx]
+
+            # Decide whether to try to increase atoms or allow any mutation
+            if random.random() < 0.5:  # Sometimes mutate sideways
+                only_increase = False
+            elif current_count >= target_count:  # Don't grow if we're already over
+                only_increase = False
+            else:
+                only_increase = current_count < target_count
+
+            # Get a single mutation
+            try:
+                mutations = get_view_mutations(view.logical_form_etr_view,
+                                            only_increase=only_increase,
+                                            only_do_one=True)
+                if not mutations or len(mutations) != 1:
+                    print(f"Expected exactly one mutation, got {len(mutations)}")
+                    print(f"Seed id: {seed_problem.seed_id}")
+                    print("View:", view.logical_form_etr_view)
+                    print("Current Problem:", current_problem)
+                    raise ValueError("Expected exactly one mutation")
+
+                # Apply the mutation to create new problem
+                mut = next(iter(mutations))  # Get the single mutation
+                new_premises: Tuple[ReifiedView] = (
+                    current_problem.premises[:premise_idx] +
+                    [ReifiedView(logical_form_etr_view=mut)] +
+                    current_problem.premises[premise_idx+1:]
+                )
+                base_views = [p.logical_form_etr_view for p in new_premises]
+
+                # Update current problem for next iteration
+                current_problem = create_partial_problem(base_views, seed_problem.seed_id)
+                stats.mutations += 1
+                stats.inferences += 1
+            except ParseException as e:
+                print(f"Failed to mutate problem: {e}, retrying")
+                raise e
+                # continue
+        return None
+
+    def _directed_search(self, seed_problem: PartialProblem, target_count: AtomCount, categorical_only: bool,
+                         stats: TargetStats) -> Optional[PartialProblem]:
+        """Best-first search from the seed towards the target atom count.
+
+        The search works on tuples of premise views, with the frontier ordered by distance to the target. Every
+        mutation's effect on the atom count is known before it's built (`MutationNeighbourhood.atom_delta`), so each
+        child moves towards the target without overshooting it. To keep the variety the random walk gets from its
+        sideways steps, half the time a child also gets a mutation that keeps the count the same, and a repeat at the
+        target only gets sideways children. ETR inference only runs on candidates that have the target count and aren't
+        repeats, rather than on every step.
+
+        Gives up (returning None) after expanding `self.max_expansions` problems, `self.beam_width` children each.
+        """
+        start = tuple(p.logical_form_etr_view for p in seed_problem.premises)
+        start_count = sum(len(v.atoms) for v in start)
+        # (distance to target, random tie break, atom count, premise views)
+        frontier = [(abs(target_count - start_count), random.random(), start_count, start)]
+        visited = {start}
+        for _ in range(self.max_expansions):
+            if not frontier:
+                return None
+            distance, _, count, views = heapq.heappop(frontier)
+
+            if distance == 0 and problem_dedup_key(list(views)) not in self.already_generated:
+                problem = create_partial_problem(list(views), seed_problem.seed_id)
+                stats.inferences += 1
+                if self._try_accept(problem, AtomCount(count), categorical_only):
+                    return problem
+                # Not categorical. Sideways steps from here mostly aren't either, so try the rest of the frontier.
+                continue
+
+            # Try to keep the last premise unchanged, as the random walk does
+            premise_indices = [0] if len(views) == 1 else range(len(views) - 1)
+            for _ in range(self.beam_width):
+                premise_idx = random.choice(premise_indices)
+                view = views[premise_idx]
+                needed = target_count - count
+                if needed != 0 and random.random() < 0.5:
+                    view = self._directed_mutation(view, 0, stats) or view
+                mutated = self._directed_mutation(view, needed, stats)  # Sideways steps keep the count, so still `needed`
+                if mutated is None:
+                    continue
+                new_views = views[:premise_idx] + (mutated,) + views[premise_idx + 1:]
+                if new_views in visited:
+                    continue
+                visited.add(new_views)
+                new_count = count - len(views[premise_idx].atoms) + len(mutated.atoms)
+                heapq.heappush(frontier, (abs(target_count - new_count), random.random(), new_count, new_views))
+        return None
+
+    def _directed_mutation(self, view: View, needed: int, stats: TargetStats) -> Optional[View]:
+        """A random mutation of the view that changes its atom count towards `needed` without overshooting.
+
+        If there isn't one (or `needed` is 0), one that keeps the count the same. None if there's neither.
+        """
+        neighbourhood = get_mutation_neighbourhood(view, only_increase=False)
+        towards, sideways = [], []
+        for mutation in neighbourhood.mutations:
+            delta = neighbourhood.atom_delta(mutation)
+            if delta == 0:
+                sideways.append(mutation)
+            elif 0 < delta <= needed or needed <= delta < 0:
+                towards.append(mutation)
+        pool = towards or sideways
+        if not pool:
+            return None
+        stats.mutations += 1
+        try:
+            return neighbourhood.to_view(random.choice(pool))
+        except ParsingError:
+            return None  # Ran off the end of the alphabet for new names, e.g. the constant after z()
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Sequence
+
+from pyetr import View
+from pyetr.inference import default_inference_procedure
+
+
+def views_cache_key(views: Sequence[View]) -> str:
+    """Canonical string for an ordered tuple of premises. Order matters to the inference procedure, so it's kept."""
+    return " | ".join(v.to_str() for v in views)
+
+
+class ETRInferenceCache:
+    """A bounded LRU cache in front of `default_inference_procedure`.
+
+    Generation infers the same premise tuples over and over (building a PartialProblem, checking whether its
+    conclusion is categorical, filling out predictions), so every one of those call sites goes through here and each
+    distinct premise tuple is only inferred once while it stays in the cache. Views are immutable, so handing the
+    same conclusion View back to several callers is safe.
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, View] = OrderedDict()
+
+    def infer(self, views: Sequence[View]) -> View:
+        key = views_cache_key(views)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        # Let exceptions propagate without caching anything, callers already handle failed inference
+        conclusion = default_inference_procedure(tuple(views))
+        self._cache[key] = conclusion
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return conclusion
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._cache),
+        }
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by the whole process. Worker processes each get their own.
+_inference_cache = ETRInferenceCache()
+
+
+def cached_inference_procedure(views: Sequence[View]) -> View:
+    """Drop-in replacement for `default_inference_procedure(views)` that goes through the shared cache."""
+    return _inference_cache.infer(views)
+
+
+def get_inference_cache() -> ETRInferenceCache:
+    return _inference_cache
@@ -1,5 +1,5 @@
 from pyetr import View
-from pyetr.inference import default_inference_procedure
+from etr_case_generator.etr_inference_cache import cached_inference_procedure
 
 from etr_case_generator.reified_problem import FullProblem, ReifiedView
 
@@ -12,7 +12,7 @@ def get_etr_conclusion(views: list[ReifiedView]) -> ReifiedView:
         view_objects.append(View.from_str(view_string))
     # print("View objects:")
     # print(view_objects)
-    etr_predicted_conclusion: View = default_inference_procedure(tuple(view_objects))
+    etr_predicted_conclusion: View = cached_inference_procedure(tuple(view_objects))
     # print("Predicted conclusion:")
     # print(etr_predicted_conclusion)
     view = ReifiedView(logical_form_etr=etr_predicted_conclusion.__str__())
@@ -35,7 +35,11 @@ def full_problem_from_partial_problem(partial_problem: PartialProblem, ontology:
         # Multiple choice section
         multiple_choices=multiple_choices if multiple_choices else None,
         # Open ended question
-        etr_predicted_conclusion=Conclusion(view=etr_predicted_conclusion),
+        etr_predicted_conclusion=Conclusion(
+            view=etr_predicted_conclusion,
+            # Known already if generate_problem's verdict stage ran, otherwise worked out in fill_out
+            is_classically_correct=partial_problem.etr_predicted_conclusion_is_classically_correct,
+        ),
         seed_id=partial_problem.seed_id,
     )
 
@@ -1,4 +1,4 @@
-from typing import Callable, Counter
+from typing import Callable, Counter, Optional
 
 import pyetr
 
@@ -8,34 +8,65 @@ from etr_case_generator.logic_types import AtomCount
 from etr_case_generator.reified_problem import FullProblem, QuestionType, PartialProblem, Conclusion, \
     ReifiedView
 from etr_case_generator.full_problem_creator import full_problem_from_partial_problem
+from etr_case_generator.logic_helper import EntailmentEngine
 from etr_case_generator.ontology import ELEMENTS, Ontology, natural_name_to_logical_name
+from etr_case_generator.problem_pipeline import PipelineStats, ProblemRejected
+from etr_case_generator.quota_scheduler import QuotaScheduler
 from etr_case_generator.smt_generator import random_smt_problem, SMTProblem, generate_conclusions, \
     add_conclusions
+from etr_case_generator.view_builder import rename_symbols
 from etr_case_generator.view_to_natural_language import view_to_natural_language
 from pyetr import View
+from smt_interface.smt_encoder import view_to_smt
 
 # TODO write similar method to below that takes any View and returns something like
 # {A(a())}^{B(a())}
 # This method would automatically be a way to map anything into our queue
 
 def renamed_view(view: View, renames: dict[str, str]) -> View:
-    new_view_str = ""
-    for c in view.to_str():
-        if c in renames.keys():
-            new_view_str += natural_name_to_logical_name(renames[c])
-        else:
-            new_view_str += c
-    return View.from_str(new_view_str)
+    """Swap placeholder names (e.g. "A", "a") for their logical names from the ontology, without reparsing the view"""
+    return rename_symbols(view, {k: natural_name_to_logical_name(v) for k, v in renames.items()})
 
 
-def generate_problem(args, ontology: Ontology = ELEMENTS, needed_counts: Counter[AtomCount] = None, generator: ETRGeneratorIndependent=None) -> FullProblem:
-    # Generate partial problems
+def generate_problem(args, ontology: Ontology = ELEMENTS, needed_counts: Counter[AtomCount] = None, generator: ETRGeneratorIndependent=None,
+                     scheduler: Optional[QuotaScheduler] = None, stats: Optional[PipelineStats] = None) -> FullProblem:
+    """Generate one problem and fill it out, with English, SMT and conclusions.
+
+    The work is split into the stages described in problem_pipeline.py, cheapest first, and any of them can turn the
+    problem away by raising ProblemRejected. Pass `stats` to collect the time spent and rejections at each stage.
+
+    If a `scheduler` is given, it steers which atom counts and seeds are tried (overriding `needed_counts`), and the
+    problem is checked against its quotas before it's filled out.
+    """
+    if stats is None:
+        stats = PipelineStats()
+    if scheduler is not None:
+        needed_counts = scheduler.needed_counts()
+
+    with stats.stage("structure"):
+        partial_problem = generate_structure(args, ontology, needed_counts, generator, scheduler)
+    with stats.stage("verdict"):
+        add_classical_verdict(args, partial_problem)
+    with stats.stage("admission"):
+        if scheduler is not None and partial_problem.etr_predicted_conclusion_is_classically_correct is not None:
+            scheduler.check_partial_problem(partial_problem)
+    with stats.stage("ontology"):
+        if args.generate_function == "random_etr_problem":
+            render_in_ontology(partial_problem, ontology)
+    with stats.stage("prompt"):
+        full_problem = fill_out_problem(partial_problem, ontology)
+    return full_problem
+
+
+def generate_structure(args, ontology: Ontology, needed_counts: Optional[Counter[AtomCount]],
+                       generator: Optional[ETRGeneratorIndependent], scheduler: Optional[QuotaScheduler]) -> PartialProblem:
+    """Structure stage: the premises and the ETR conclusion, still with placeholder names for the ETR problems"""
     if args.generate_function == "random_smt_problem":
         if args.num_atoms_set:
             raise NotImplementedError("Balancing num atoms not implemented for SMT problems")
         small_ontology = ontology.create_smaller_ontology(args.num_predicates_per_problem, args.num_objects_per_problem)
         smt_problem: SMTProblem = random_smt_problem(ontology=small_ontology, total_num_pieces=args.num_pieces)
-        partial_problem = smt_problem.to_partial_problem()
+        return smt_problem.to_partial_problem()
     elif args.generate_function == "random_etr_problem":
         # This is the main path!
         random_etr_problem_kwargs = {}
@@ -48,52 +79,77 @@ def generate_problem(args, ontology: Ontology = ELEMENTS, needed_counts: Counter
 
         assert generator is not None
 
-        partial_problem = generator.generate_problem(needed_counts=needed_counts, categorical_only=not args.non_categorical_okay, multi_view=args.multi_view)
+        return generator.generate_problem(
+            needed_counts=needed_counts, categorical_only=not args.non_categorical_okay, multi_view=args.multi_view,
+            seed_families=scheduler.open_seed_families() if scheduler is not None else None,
+        )
+    else:
+        raise ValueError(f"Unknown generate_function: {args.generate_function}")
 
-        # Use this space to update the natural language object mapping for the ontology.
-        assert partial_problem.premises is not None
-        for p in partial_problem.premises:
-            assert p.logical_form_etr_view is not None
-            english_form, obj_map = view_to_natural_language(
-                ontology=ontology, 
-                view=p.logical_form_etr_view,
-                obj_map=ontology.logical_placeholder_to_short_name
-            )
-            p.english_form = english_form
-            ontology.logical_placeholder_to_short_name.update(obj_map)
-
-            # Now that we have the English form, replace placeholders in the ETR view
-            try:
-                p.logical_form_etr_view = renamed_view(
-                    p.logical_form_etr_view,
-                    renames=ontology.logical_placeholder_to_short_name
-                )
-            except Exception as e:
-                # TODO This should make sure it's a pyetr.parsing.common.ParsingError
-                print("ParsingException caught when renaming view.")
-                print(p.logical_form_etr_view)
-                print("The ontology is:", ontology.name)
-                raise e
-
-        # Do the ETR supported conclusion in addition to the premises
-        assert partial_problem.etr_what_follows is not None
-        assert partial_problem.etr_what_follows.logical_form_etr_view is not None
+
+def add_classical_verdict(args, partial_problem: PartialProblem):
+    """Verdict stage: work out whether the ETR conclusion is classically correct, rejecting it if it is and
+    `--etr_only_wrong` is set.
+
+    Runs on the views as generated, before the ontology's names are swapped in, which doesn't change the answer. Does
+    nothing for problems that don't have an ETR conclusion yet (the SMT problems), which get it when filled out.
+    """
+    if partial_problem.etr_what_follows is None or partial_problem.etr_predicted_conclusion_is_classically_correct is not None:
+        return
+    premises = [view_to_smt(p.logical_form_etr_view) for p in partial_problem.premises]
+    with EntailmentEngine(premises) as engine:
+        is_classical = engine.follows(view_to_smt(partial_problem.etr_what_follows.logical_form_etr_view))
+    partial_problem.etr_predicted_conclusion_is_classically_correct = is_classical
+    if getattr(args, "etr_only_wrong", False) and is_classical:
+        raise ProblemRejected("ETR conclusion is correct")
+
+
+def render_in_ontology(partial_problem: PartialProblem, ontology: Ontology):
+    """Ontology stage: put the premises and ETR conclusion into English, and swap the ontology's names into the views"""
+    # Use this space to update the natural language object mapping for the ontology.
+    assert partial_problem.premises is not None
+    for p in partial_problem.premises:
+        assert p.logical_form_etr_view is not None
         english_form, obj_map = view_to_natural_language(
-            ontology=ontology, 
-            view=partial_problem.etr_what_follows.logical_form_etr_view,
+            ontology=ontology,
+            view=p.logical_form_etr_view,
             obj_map=ontology.logical_placeholder_to_short_name
         )
-        partial_problem.etr_what_follows.english_form = english_form
+        p.english_form = english_form
         ontology.logical_placeholder_to_short_name.update(obj_map)
+
         # Now that we have the English form, replace placeholders in the ETR view
-        partial_problem.etr_what_follows.logical_form_etr_view = renamed_view(
-            partial_problem.etr_what_follows.logical_form_etr_view,
-            renames=ontology.logical_placeholder_to_short_name
-        )
+        try:
+            p.logical_form_etr_view = renamed_view(
+                p.logical_form_etr_view,
+                renames=ontology.logical_placeholder_to_short_name
+            )
+        except Exception as e:
+            # TODO This should make sure it's a pyetr.parsing.common.ParsingError
+            print("ParsingException caught when renaming view.")
+            print(p.logical_form_etr_view)
+            print("The ontology is:", ontology.name)
+            raise e
+
+    # Do the ETR supported conclusion in addition to the premises
+    assert partial_problem.etr_what_follows is not None
+    assert partial_problem.etr_what_follows.logical_form_etr_view is not None
+    english_form, obj_map = view_to_natural_language(
+        ontology=ontology,
+        view=partial_problem.etr_what_follows.logical_form_etr_view,
+        obj_map=ontology.logical_placeholder_to_short_name
+    )
+    partial_problem.etr_what_follows.english_form = english_form
+    ontology.logical_placeholder_to_short_name.update(obj_map)
+    # Now that we have the English form, replace placeholders in the ETR view
+    partial_problem.etr_what_follows.logical_form_etr_view = renamed_view(
+        partial_problem.etr_what_follows.logical_form_etr_view,
+        renames=ontology.logical_placeholder_to_short_name
+    )
 
-    else:
-        raise ValueError(f"Unknown generate_function: {args.generate_function}")
 
+def fill_out_problem(partial_problem: PartialProblem, ontology: Ontology) -> FullProblem:
+    """Prompt stage: SMT forms, conclusions and everything the question prompts need"""
     # Fill out the partial problem as much as possible, e.g. fill in the ETR from the SMT and vice versa
     partial_problem.fill_out(ontology=ontology)
     partial_problem.add_etr_predictions(ontology=ontology)
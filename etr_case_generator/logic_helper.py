@@ -1,12 +1,147 @@
 
 from pysmt.shortcuts import Symbol, And, Or, Not, Implies, Iff, ForAll, Exists, is_valid, Solver
 from pysmt.fnode import FNode
+from typing import Literal, Optional
+
+import numpy as np
+
+from etr_case_generator.truth_table import TRUTH_TABLE_MAX_ATOMS, TruthTable, collect_atoms
+
+# How a conclusion stands against the premises: true in every model, false in every model, or true in some and not others
+Verdict = Literal["entailed", "refuted", "contingent"]
+
+
+class EntailmentEngine:
+    """Answers classical entailment questions about one fixed set of premises.
+
+    When the premises and the formula being asked about are quantifier-free and have at most
+    `truth_table_max_atoms` ground atoms between them, queries are answered from a TruthTable over those atoms.
+    Otherwise the premises are asserted into a single solver once, and each query pushes a frame, asserts the
+    formula under test, solves, and pops the frame again, so checking many conclusions against the same premises
+    doesn't pay for a new solver (and re-asserting the premises) every time. To check many conclusions at once, use
+    `verdicts`, which evaluates all the ones the truth table can cover in one go.
+
+    Use it as a context manager, or call `close()` when done, to free the solver.
+    """
+
+    def __init__(self, premises: list[FNode], truth_table_max_atoms: int = TRUTH_TABLE_MAX_ATOMS):
+        self.premises = premises
+        self.truth_table_max_atoms = truth_table_max_atoms
+        self.num_queries = 0
+        self.num_truth_table_queries = 0
+        self._solver = None  # Only created once a query can't be answered from the truth table
+
+        self._table_atoms: Optional[dict] = {}  # None once we know the premises need the solver
+        if not all(collect_atoms(p, self._table_atoms) for p in premises):
+            self._table_atoms = None
+        self._table: Optional[TruthTable] = None
+        self._premises_mask = None
+
+    def _truth_table_for(self, formula: FNode) -> Optional[TruthTable]:
+        """A truth table covering the premises and formula, growing the current one if the formula adds atoms"""
+        if self._table_atoms is None:
+            return None
+        atoms = dict(self._table_atoms)
+        if not collect_atoms(formula, atoms) or len(atoms) > self.truth_table_max_atoms:
+            return None
+        return self._truth_table_over(atoms)
+
+    def _truth_table_over(self, atoms: dict) -> TruthTable:
+        """The truth table over these atoms, which include the premises' atoms, rebuilding it if they're new"""
+        if self._table is None or len(atoms) != len(self._table_atoms):
+            self._table_atoms = atoms
+            self._table = TruthTable(list(atoms))
+            self._premises_mask = np.ones(self._table.num_rows, dtype=bool)
+            for p in self.premises:
+                self._premises_mask &= self._table.evaluate(p)
+        return self._table
+
+    def _get_solver(self) -> Solver:
+        if self._solver is None:
+            self._solver = Solver()
+            self._solver.add_assertion(And(self.premises))
+        return self._solver
+
+    def is_satisfiable_with(self, formula: FNode) -> bool:
+        """Check whether the premises and formula can be true together"""
+        self.num_queries += 1
+        table = self._truth_table_for(formula)
+        if table is not None:
+            self.num_truth_table_queries += 1
+            return bool(np.any(self._premises_mask & table.evaluate(formula)))
+
+        solver = self._get_solver()
+        solver.push()
+        try:
+            solver.add_assertion(formula)
+            return solver.solve()
+        finally:
+            solver.pop()
+
+    def follows(self, conclusion: FNode) -> bool:
+        """The conclusion is true in every model of the premises"""
+        return not self.is_satisfiable_with(Not(conclusion))
+
+    def contradicts(self, conclusion: FNode) -> bool:
+        """The conclusion is false in every model of the premises"""
+        return not self.is_satisfiable_with(conclusion)
+
+    def contingent(self, conclusion: FNode) -> bool:
+        """The conclusion is true in some models of the premises and false in others"""
+        return self.is_satisfiable_with(conclusion) and self.is_satisfiable_with(Not(conclusion))
+
+    def verdicts(self, conclusions: list[FNode]) -> list[Verdict]:
+        """The verdict on each of the conclusions, in order.
+
+        The truth table is grown once to cover as many of the conclusions as it can, and those are all evaluated
+        against the premises' models together. The rest go to the solver one at a time. If the premises have no
+        models, every conclusion is "entailed", as with `follows`.
+        """
+        results: list[Optional[Verdict]] = [None] * len(conclusions)
+
+        # Conclusions the truth table can answer, as long as adding their atoms keeps it small enough
+        table_indices = []
+        if self._table_atoms is not None:
+            atoms = dict(self._table_atoms)
+            for i, conclusion in enumerate(conclusions):
+                with_conclusion = dict(atoms)
+                if collect_atoms(conclusion, with_conclusion) and len(with_conclusion) <= self.truth_table_max_atoms:
+                    atoms = with_conclusion
+                    table_indices.append(i)
+        if table_indices:
+            table = self._truth_table_over(atoms)
+            # One row per conclusion, one column per model of the premises
+            values = np.stack([table.evaluate(conclusions[i]) for i in table_indices])[:, self._premises_mask]
+            can_be_true = values.any(axis=1)
+            can_be_false = (~values).any(axis=1)
+            for i, true, false in zip(table_indices, can_be_true, can_be_false):
+                results[i] = "entailed" if not false else "refuted" if not true else "contingent"
+            self.num_queries += len(table_indices)
+            self.num_truth_table_queries += len(table_indices)
+
+        for i, conclusion in enumerate(conclusions):
+            if results[i] is None:
+                if not self.is_satisfiable_with(Not(conclusion)):
+                    results[i] = "entailed"
+                elif not self.is_satisfiable_with(conclusion):
+                    results[i] = "refuted"
+                else:
+                    results[i] = "contingent"
+        return results
+
+    def close(self):
+        if self._solver is not None:
+            self._solver.exit()
+            self._solver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 def does_it_follow(views: list[FNode], conclusion: FNode) -> bool:
     """Check if the conclusion follows from the views"""
-    solver = Solver()
-    premises = And(views)
-    solver.add_assertion(premises)
-    solver.add_assertion(Not(conclusion))
-    return not solver.solve()
+    with EntailmentEngine(views) as engine:
+        return engine.follows(conclusion)
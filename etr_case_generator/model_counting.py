@@ -0,0 +1,218 @@
+from typing import Optional, Union
+
+from pysmt.fnode import FNode
+from pysmt.operators import AND, BOOL_CONSTANT, IFF, IMPLIES, NOT, OR
+from pysmt.shortcuts import And, Not, Solver
+
+from etr_case_generator.truth_table import TRUTH_TABLE_MAX_ATOMS, TruthTable, collect_atoms
+
+# Formulas as the counter sees them: True/False, an atom index, or ("and" | "or", args) / ("not", arg)
+Formula = Union[bool, int, tuple]
+
+
+def count_models(views: list[FNode], limit: Optional[int] = None,
+                 truth_table_max_atoms: int = TRUTH_TABLE_MAX_ATOMS) -> int:
+    """Count the assignments to the atoms of `views` that make all of them true.
+
+    Small propositional problems are counted with a TruthTable. Larger propositional ones go through an exact #SAT
+    counter (DPLL with component decomposition and caching). Anything else (e.g. quantifiers) falls back to
+    enumerating models with the solver.
+
+    Args:
+        views: The formulas to satisfy
+        limit: If given, stop counting once `limit` models are found. Useful when you only need to know whether
+            there are more than some number of models.
+        truth_table_max_atoms: Use a truth table up to this many atoms
+
+    Returns:
+        int: The number of models, or `limit` if there are at least that many
+    """
+    atoms: dict[tuple[str, str], None] = {}
+    if not all(collect_atoms(v, atoms) for v in views):
+        return _count_models_with_solver(views, limit)
+
+    if len(atoms) <= truth_table_max_atoms:
+        num_models = TruthTable(list(atoms)).count_models(views)
+    else:
+        index = {atom: i for i, atom in enumerate(atoms)}
+        formula = _simplify_and(tuple(_to_formula(v, index) for v in views))
+        num_models = _count(formula, {}, {}, limit) * 2 ** (len(atoms) - len(_atoms_of(formula, {})))
+
+    return num_models if limit is None else min(num_models, limit)
+
+
+def _to_formula(node: FNode, index: dict) -> Formula:
+    node_type = node.node_type()
+    if node_type == AND:
+        return _simplify_and(tuple(_to_formula(a, index) for a in node.args()))
+    if node_type == OR:
+        return _simplify_or(tuple(_to_formula(a, index) for a in node.args()))
+    if node_type == NOT:
+        return _negate(_to_formula(node.arg(0), index))
+    if node_type == IMPLIES:
+        return _simplify_or((_negate(_to_formula(node.arg(0), index)), _to_formula(node.arg(1), index)))
+    if node_type == IFF:
+        left, right = _to_formula(node.arg(0), index), _to_formula(node.arg(1), index)
+        return _simplify_or((_simplify_and((left, right)), _simplify_and((_negate(left), _negate(right)))))
+    if node_type == BOOL_CONSTANT:
+        return node.constant_value()
+    atoms: dict = {}
+    collect_atoms(node, atoms)
+    return index[next(iter(atoms))]
+
+
+def _negate(f: Formula) -> Formula:
+    if isinstance(f, bool):
+        return not f
+    if isinstance(f, tuple) and f[0] == "not":
+        return f[1]
+    return ("not", f)
+
+
+def _simplify_and(args: tuple) -> Formula:
+    kept = []
+    for a in args:
+        if a is False:
+            return False
+        if a is True:
+            continue
+        if isinstance(a, tuple) and a[0] == "and":
+            kept.extend(a[1])
+        else:
+            kept.append(a)
+    if not kept:
+        return True
+    return kept[0] if len(kept) == 1 else ("and", tuple(kept))
+
+
+def _simplify_or(args: tuple) -> Formula:
+    kept = []
+    for a in args:
+        if a is True:
+            return True
+        if a is False:
+            continue
+        if isinstance(a, tuple) and a[0] == "or":
+            kept.extend(a[1])
+        else:
+            kept.append(a)
+    if not kept:
+        return False
+    return kept[0] if len(kept) == 1 else ("or", tuple(kept))
+
+
+def _condition(f: Formula, atom: int, value: bool) -> Formula:
+    """Set `atom` to `value` in f and simplify"""
+    if isinstance(f, bool):  # Check bool before int, since bools are ints
+        return f
+    if isinstance(f, int):
+        return value if f == atom else f
+    if f[0] == "not":
+        return _negate(_condition(f[1], atom, value))
+    args = tuple(_condition(a, atom, value) for a in f[1])
+    return _simplify_and(args) if f[0] == "and" else _simplify_or(args)
+
+
+def _atoms_of(f: Formula, memo: dict) -> frozenset[int]:
+    if isinstance(f, bool):
+        return frozenset()
+    if isinstance(f, int):
+        return frozenset([f])
+    if f not in memo:
+        children = [f[1]] if f[0] == "not" else f[1]
+        memo[f] = frozenset().union(*(_atoms_of(c, memo) for c in children))
+    return memo[f]
+
+
+def _components(conjuncts: tuple, atoms_memo: dict) -> list[tuple]:
+    """Group conjuncts that (transitively) share atoms, so each group can be counted on its own"""
+    groups: list[tuple[set[int], list]] = []
+    for c in conjuncts:
+        c_atoms = set(_atoms_of(c, atoms_memo))
+        merged_atoms, merged = c_atoms, [c]
+        remaining = []
+        for group_atoms, group in groups:
+            if group_atoms & c_atoms:
+                merged_atoms |= group_atoms
+                merged = group + merged
+            else:
+                remaining.append((group_atoms, group))
+        groups = remaining + [(merged_atoms, merged)]
+    return [tuple(group) for _, group in groups]
+
+
+def _count(f: Formula, cache: dict, atoms_memo: dict, limit: Optional[int] = None) -> int:
+    """Exact number of models of f over its own atoms, or at least `limit` if it stopped early"""
+    if isinstance(f, bool):
+        return int(f)
+    if isinstance(f, int):
+        return 1
+    if f in cache:
+        return cache[f]
+
+    if f[0] == "and":
+        components = _components(f[1], atoms_memo)
+        if len(components) > 1:
+            result = 1
+            for component in components:
+                result *= _count(_simplify_and(component), cache, atoms_memo)
+                if result == 0:
+                    break
+            cache[f] = result
+            return result
+
+    # Branch on the atom that shows up most often
+    f_atoms = _atoms_of(f, atoms_memo)
+    occurrences: dict[int, int] = {}
+    stack = [f]
+    while stack:
+        g = stack.pop()
+        if isinstance(g, bool):
+            continue
+        if isinstance(g, int):
+            occurrences[g] = occurrences.get(g, 0) + 1
+        else:
+            stack.extend([g[1]] if g[0] == "not" else g[1])
+    atom = max(sorted(occurrences), key=lambda a: occurrences[a])
+
+    result = 0
+    for value in (True, False):
+        branch = _condition(f, atom, value)
+        num_free = len(f_atoms) - 1 - len(_atoms_of(branch, atoms_memo))  # Atoms that dropped out of this branch
+        branch_limit = None if limit is None else -(-(limit - result) // 2 ** num_free)
+        result += _count(branch, cache, atoms_memo, branch_limit) * 2 ** num_free
+        if limit is not None and result >= limit:
+            return result  # Might be an undercount, so don't cache it
+    cache[f] = result
+    return result
+
+
+def _count_models_with_solver(views: list[FNode], limit: Optional[int] = None) -> int:
+    """Enumerate models one by one, blocking each one found, until there are no more or we hit `limit`"""
+    def get_atoms(formula: FNode) -> set[FNode]:
+        if formula.is_symbol():
+            return {formula} if formula.symbol_type().is_bool_type() else set()
+        return set().union(*(get_atoms(child) for child in formula.args()))
+
+    atoms = set()
+    for view in views:
+        atoms.update(get_atoms(view))
+
+    num_models = 0
+    with Solver() as solver:
+        solver.add_assertion(And(views))
+        while limit is None or num_models < limit:
+            if not solver.solve():
+                break
+            num_models += 1
+
+            # Add constraint to exclude this solution
+            model = solver.get_model()
+            solution_constraints = []
+            for atom in atoms:
+                if model.get_value(atom).is_true():
+                    solution_constraints.append(atom)
+                else:
+                    solution_constraints.append(Not(atom))
+            solver.add_assertion(Not(And(solution_constraints)))
+    return num_models
@@ -1,11 +1,15 @@
 import random
-from typing import cast
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, cast
 from pyetr import ArbitraryObject, FunctionalTerm, PredicateAtom, View
 
-from etr_case_generator.seed_problems import create_starting_problems
-from etr_case_generator.study_replication_seed_problems import ILLUSORY_INFERENCE_FROM_DISJUNCTION
+from etr_case_generator.seed_banks import get_seed_bank
+from etr_case_generator.view_builder import conjoin_atom, disjoin_state, ground_states, quantify_constant, unary_atom
 
-ALL_SEED_PROBLEMS = create_starting_problems() + ILLUSORY_INFERENCE_FROM_DISJUNCTION
+# The seed banks whose views get_random_view starts from
+ALL_SEED_BANKS = ("STARTING_PROBLEMS", "ILLUSORY_INFERENCE_FROM_DISJUNCTION")
 
 def get_object_sets_for_view(
     view: View,
@@ -66,22 +70,95 @@ def set_of_states_to_str(set_of_states) -> str:
     return "{" + ",".join([state_to_str(s) for s in set_of_states]) + "}"
 
 
-def get_view_mutations(view: View, only_increase: bool = False, only_do_one: bool = False) -> set[View]:
-    """_summary_
+def _atom_tuple(atom) -> tuple[str, str, bool]:
+    """(predicate, term, negated) for a unary atom, matching atom_to_str"""
+    term = atom.terms[0]
+    term_name = term.name if isinstance(term, ArbitraryObject) else term.f.name
+    return atom.predicate.name, term_name, not atom.predicate.verifier
 
-    Args:
-        view (View): The base View to mutate.
-        only_increase (bool, optional): If set to True, will only return views that are
-        larger than view in terms of number of atoms. Defaults to False.
-        only_do_one (bool, optional): If set to True, will only return one mutation, in a set of size 1. Defaults to False.
 
-    Raises:
-        ValueError: _description_
+@dataclass(frozen=True)
+class ViewMutation:
+    """A description of one mutation of a view, cheap to build. Turning it into a View is left until it's picked.
 
-    Returns:
-        set[View]: _description_
+    kind is one of:
+        "quantify": replace `constant` with `arb_obj` everywhere (at issue if `at_issue`) and bind it with
+            `quantifier` ("A" or "E")
+        "conjoin": add the atom `predicate`(`constant`) (negated if `negated`, at issue if `at_issue`) to the state
+            at `state_index`
+        "disjoin": add that atom as a new state
     """
-    mutation_strings = set[str]()
+    kind: str
+    predicate: Optional[str] = None
+    negated: bool = False
+    state_index: Optional[int] = None
+    quantifier: Optional[str] = None
+    constant: Optional[str] = None
+    arb_obj: Optional[str] = None
+    at_issue: bool = False
+
+    def atom_str(self) -> str:
+        return f"{'~' if self.negated else ''}{self.predicate}({self.constant}(){'*' if self.at_issue else ''})"
+
+
+@dataclass
+class MutationNeighbourhood:
+    """All the single-step mutations of a view, as descriptors, plus what's needed to build any one of them."""
+    view: View
+    states: list[list[PredicateAtom]]  # ground_states(view), lined up with state_strs
+    view_str: str
+    state_strs: list[str]  # state_to_str of each state in view.stage, in order
+    mutations: list[ViewMutation]
+    num_atoms: int  # len(view.atoms)
+    stage_atoms: frozenset[tuple[str, str, bool]]  # The atoms of `states`, as _atom_tuple gives them
+
+    def atom_delta(self, mutation: ViewMutation) -> int:
+        """How many more atoms the mutated view has than the view, without building it.
+
+        Quantifying a constant keeps every atom. Conjoining or disjoining builds on the grounded stage only, so any
+        atoms that were only in the supposition are lost, and the new atom only counts if it isn't there already.
+        """
+        if mutation.kind == "quantify":
+            return 0
+        new_atom = (mutation.predicate, mutation.constant, mutation.negated)
+        return len(self.stage_atoms) + (new_atom not in self.stage_atoms) - self.num_atoms
+
+    def to_str(self, mutation: ViewMutation) -> str:
+        """The mutated view written out. `to_view` builds the same View without parsing this."""
+        if mutation.kind == "quantify":
+            replacement = mutation.arb_obj + ("*" if mutation.at_issue else "")
+            return f"{mutation.quantifier}{mutation.arb_obj} " + self.view_str.replace(mutation.constant + "()", replacement)
+        if mutation.kind == "conjoin":
+            i = mutation.state_index
+            return "{" + ",".join(self.state_strs[:i] + [self.state_strs[i] + mutation.atom_str()] + self.state_strs[i + 1:]) + "}"
+        # Disjunction: the atom becomes a new state
+        return "{" + ",".join(self.state_strs + [mutation.atom_str()]) + "}"
+
+    def to_view(self, mutation: ViewMutation) -> View:
+        names = [mutation.predicate, mutation.constant, mutation.arb_obj]
+        if not all(name is None or name.isidentifier() for name in names):
+            # We've run off the end of the alphabet, e.g. the constant after "z" is "{". Let the parser reject it.
+            return view_from_str(self.to_str(mutation))
+        if mutation.kind == "quantify":
+            view = quantify_constant(self.view, mutation.constant, mutation.arb_obj,
+                                     universal=mutation.quantifier == "A", make_at_issue=mutation.at_issue)
+            if view is None:  # Weighted views aren't handled by the builder
+                view = view_from_str(self.to_str(mutation))
+            return view
+        atom = unary_atom(mutation.predicate, mutation.constant, negated=mutation.negated)
+        if mutation.kind == "conjoin":
+            return conjoin_atom(self.states, mutation.state_index, atom, atom_at_issue=mutation.at_issue)
+        return disjoin_state(self.states, atom, atom_at_issue=mutation.at_issue)
+
+
+@lru_cache(maxsize=16384)
+def view_from_str(view_str: str) -> View:
+    """Memoized View.from_str. Parsing dominates mutation, and the same strings come up again and again."""
+    return View.from_str(view_str)
+
+
+def _build_mutation_neighbourhood(view: View, only_increase: bool) -> MutationNeighbourhood:
+    mutations: dict[ViewMutation, None] = {}  # Deduplicated, in a fixed order
 
     # Assemble lists of strings of predicates, constants, and arbitrary objects
     predicates, constants, arb_objs = get_object_sets_for_view(view)
@@ -101,16 +178,13 @@ def get_view_mutations(view: View, only_increase: bool = False, only_do_one: boo
         new_arb_obj = chr(ord(max_arb_obj) + 1)
 
     if not only_increase:
-        for o in constants:
+        for o in sorted(constants):
             # Also append problems where the variable is taken to be at issue in all
             # occurrences (can I do this with issue only occurring sometimes?)
-            for is_at_issue in [new_arb_obj, new_arb_obj + "*"]:
-                mutation_strings.add(
-                    f"A{new_arb_obj} " + view.to_str().replace(o + "()", is_at_issue)
-                )
-                mutation_strings.add(
-                    f"E{new_arb_obj} " + view.to_str().replace(o + "()", is_at_issue)
-                )
+            for is_at_issue in [False, True]:
+                for quantifier in ["A", "E"]:
+                    mutations[ViewMutation("quantify", quantifier=quantifier, constant=o, arb_obj=new_arb_obj,
+                                           at_issue=is_at_issue)] = None
 
     if len(constants) == 0:
         constants = set(["a"])
@@ -122,130 +196,100 @@ def get_view_mutations(view: View, only_increase: bool = False, only_do_one: boo
     predicates.add(new_predicate)  # Now, e.g., predicates are P, Q, R, S
     constants.add(new_constant)
 
-    atoms = [
-        f"{p}({o}())" for p in predicates for o in constants
-    ]
+    # Atoms as (predicate, constant, negated). Arbitrary objects in the view are treated as constants of the same
+    # name, as atom_to_str does.
+    atoms = [(p, o, False) for p in sorted(predicates) for o in sorted(constants)]
 
     # If only_increase is set to true, filter atoms to the set of atoms that are not
     # already in the view
+    view_atoms = [_atom_tuple(a) for a in sorted(view.atoms, key=atom_to_str)]
     if only_increase:
-        existing_atoms = set([atom_to_str(a) for a in view.atoms])
+        existing_atoms = set(view_atoms)
         atoms = [a for a in atoms if a not in existing_atoms]
     else:
-        atoms += [atom_to_str(a) for a in view.atoms]
-        atoms = list(set(atoms))
+        atoms += view_atoms
+        atoms = list(dict.fromkeys(atoms))
 
     # We also don't do anything with suppositions in this version
     # TODO: prepend all possible quantifier strings given the current set of arbitrary
     # objects
-    for atom in atoms:
-        atom_at_issue = atom[:-1] + "*)"
-        # All conjunctions
-        for i in range(len(list(view.stage))):
-            new_state_str = state_to_str(list(view.stage)[i]) + atom
-            new_stage_str = (
-                "{"
-                + ",".join(
-                    list([state_to_str(s) for s in view.stage])[:i]
-                    + [new_state_str]
-                    + list([state_to_str(s) for s in view.stage])[i + 1 :]
-                )
-                + "}"
-            )
-            mutation_strings.add(new_stage_str)
-
-            # Also add one where the new atom is at issue -- this can also be done
-            # before the for loop with atoms (same as below TODO)
-            new_state_str = state_to_str(list(view.stage)[i]) + atom_at_issue
-            new_stage_str = (
-                "{"
-                + ",".join(
-                    list([state_to_str(s) for s in view.stage])[:i]
-                    + [new_state_str]
-                    + list([state_to_str(s) for s in view.stage])[i + 1 :]
-                )
-                + "}"
-            )
-            mutation_strings.add(new_stage_str)
+    num_states = len(view.stage)
+    for p, o, negated in atoms:
+        for new_negated in [negated, not negated]:
+            # Each atom is also added at issue
+            for is_at_issue in [False, True]:
+                # All conjunctions
+                for i in range(num_states):
+                    mutations[ViewMutation("conjoin", predicate=p, constant=o, negated=new_negated,
+                                           at_issue=is_at_issue, state_index=i)] = None
+                # Disjunctions
+                mutations[ViewMutation("disjoin", predicate=p, constant=o, negated=new_negated,
+                                       at_issue=is_at_issue)] = None
 
         # TODO add a mutation where this atom is dropped entirely
 
-        # Disjunctions
-        mutation_strings.add(
-            "{"
-            + ",".join(list([state_to_str(s) for s in view.stage]) + [atom])
-            + "}"
-        )
-        mutation_strings.add(
-            "{"
-            + ",".join(
-                list([state_to_str(s) for s in view.stage]) + [atom_at_issue]
-            )
-            + "}"
-        )
-    
-        # TODO: refactor to only have to loop once (negate every atom before for loop)
-        # Now, negate
-        if atom[0] == "~":
-            atom = atom[1:]
-        else:
-            atom = "~" + atom
-
-        atom_at_issue = atom[:-1] + "*)"
-        # All conjunctions
-        for i in range(len(list(view.stage))):
-            # Add atom directly into state string (P(a()) becomes P(a())Q(a()))
-            new_state_str = state_to_str(list(view.stage)[i]) + atom
-            new_stage_str = (
-                "{"
-                + ",".join(  # Now that we're disjoining, the delimiter is a comma
-                    list([state_to_str(s) for s in view.stage])[:i]
-                    + [new_state_str]
-                    + list([state_to_str(s) for s in view.stage])[i + 1 :]
-                )
-                + "}"
-            )
-            mutation_strings.add(new_stage_str)
-
-            # Also add one where the new atom is at issue
-            new_state_str = state_to_str(list(view.stage)[i]) + atom_at_issue
-            new_stage_str = (
-                "{"
-                + ",".join(
-                    list([state_to_str(s) for s in view.stage])[:i]
-                    + [new_state_str]
-                    + list([state_to_str(s) for s in view.stage])[i + 1 :]
-                )
-                + "}"
-            )
-            mutation_strings.add(new_stage_str)
-
-        # Disjunctions
-        mutation_strings.add(
-            "{"
-            + ",".join(list([state_to_str(s) for s in view.stage]) + [atom])
-            + "}"
-        )
-        mutation_strings.add(
-            "{"
-            + ",".join(
-                list([state_to_str(s) for s in view.stage]) + [atom_at_issue]
-            )
-            + "}"
-        )
-
-    if not mutation_strings:
+    states = ground_states(view)
+    return MutationNeighbourhood(
+        view=view,
+        states=states,
+        view_str=view.to_str(),
+        state_strs=[state_to_str(s) for s in view.stage],
+        mutations=list(mutations),
+        num_atoms=len(view.atoms),
+        stage_atoms=frozenset(_atom_tuple(a) for state in states for a in state),
+    )
+
+
+_neighbourhood_cache: OrderedDict[tuple[View, bool], MutationNeighbourhood] = OrderedDict()
+NEIGHBOURHOOD_CACHE_SIZE = 4096
+
+
+def get_mutation_neighbourhood(view: View, only_increase: bool = False) -> MutationNeighbourhood:
+    """The mutations of a view, memoized (LRU) per view, since the same views get mutated many times.
+
+    Keyed on the View itself rather than its string: the available predicates and constants come from the view's
+    weights, which `to_str` doesn't show.
+    """
+    key = (view, only_increase)
+    if key in _neighbourhood_cache:
+        _neighbourhood_cache.move_to_end(key)
+        return _neighbourhood_cache[key]
+    neighbourhood = _build_mutation_neighbourhood(view, only_increase)
+    _neighbourhood_cache[key] = neighbourhood
+    if len(_neighbourhood_cache) > NEIGHBOURHOOD_CACHE_SIZE:
+        _neighbourhood_cache.popitem(last=False)
+    return neighbourhood
+
+
+def get_view_mutations(view: View, only_increase: bool = False, only_do_one: bool = False) -> set[View]:
+    """Get the views one mutation away from a view.
+
+    Args:
+        view (View): The base View to mutate.
+        only_increase (bool, optional): If set to True, will only return views that are
+        larger than view in terms of number of atoms. Defaults to False.
+        only_do_one (bool, optional): If set to True, will only return one mutation, in a set of size 1. Defaults to False.
+            Only that one mutation gets built into a View.
+
+    Raises:
+        ValueError: If the view has non-unary predicates, or there are no mutations.
+
+    Returns:
+        set[View]: The mutated views
+    """
+    neighbourhood = get_mutation_neighbourhood(view, only_increase)
+
+    if not neighbourhood.mutations:
         print("No mutations found for:", view)
         raise ValueError(f"No mutations found for {view}")
 
-    # Convert strings to Views at the end
+    # Convert descriptors to Views at the end
     if only_do_one:
-        # If we only need one, randomly select a string and convert just that one
-        chosen_string = random.choice(list(mutation_strings))
-        mutations = {View.from_str(chosen_string)}
+        # If we only need one, randomly select a mutation and convert just that one
+        mutations = {neighbourhood.to_view(random.choice(neighbourhood.mutations))}
     else:
-        # Convert all strings to Views
-        mutations = {View.from_str(s) for s in mutation_strings}
+        # Convert all mutations to Views
+        mutations = {neighbourhood.to_view(m) for m in neighbourhood.mutations}
 
     # Add an assertion that if only_increase is passed as True, we only return views
     # that are larger than the original view
@@ -266,6 +310,19 @@ def get_view_mutations(view: View, only_increase: bool = False, only_do_one: boo
 
     return mutations
 
+@lru_cache(maxsize=None)
+def _seed_views() -> tuple[View, ...]:
+    """All the views (premises and conclusions) of the problems in ALL_SEED_BANKS, in a fixed order"""
+    all_views = []
+    for bank in ALL_SEED_BANKS:
+        for problem in get_seed_bank(bank):
+            for premise in problem.premises:
+                all_views.append(premise.logical_form_etr_view)
+            if problem.etr_what_follows and problem.etr_what_follows.logical_form_etr_view:
+                all_views.append(problem.etr_what_follows.logical_form_etr_view)
+    return tuple(all_views)
+
+
 def get_random_view(num_mutations: int = None) -> View:
     """Generate a random view by selecting a seed problem and applying mutations.
     
@@ -276,21 +333,12 @@ def get_random_view(num_mutations: int = None) -> View:
     Returns:
         View: A randomly generated and mutated view
     """
-    # Collect all available views from seed problems
-    all_views = []
-    
-    # Extract all views (premises and conclusions) from the seed problems
-    for problem in ALL_SEED_PROBLEMS:
-        for premise in problem.premises:
-            all_views.append(premise.logical_form_etr_view)
-        if problem.etr_what_follows and problem.etr_what_follows.logical_form_etr_view:
-            all_views.append(problem.etr_what_follows.logical_form_etr_view)
-    
-    # Select a random view as our starting point
+    all_views = _seed_views()
     if not all_views:
         # Fallback if no views found
         raise ValueError("No views found in seed problems")
-    
+
+    # Select a random view as our starting point
     view: View = random.choice(all_views)
     
     # Determine number of mutations if not specified
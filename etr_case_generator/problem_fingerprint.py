@@ -0,0 +1,192 @@
+"""Renaming-invariant fingerprints of problems, used to spot repeated problems during generation.
+
+Two problems whose premises are the same up to a consistent renaming of predicates, constants and arbitrary objects
+(e.g. {A(a())B(a())} and {C(b())D(b())}) get the same fingerprint. The fingerprint is a 128-bit int, so a dedup set
+of them stays small however many problems are generated.
+
+To get there, every symbol is given a "color" that only depends on how it's used (color refinement, as in graph
+isomorphism testing), symbols are renamed in color order, and the renamed premises are written out in a sorted,
+canonical form and hashed. Symbols that refinement can't tell apart are tried in every order (up to
+`MAX_TIE_ORDERINGS`) and the smallest form is kept; past that, ties are broken by name, so some renamed duplicates
+can slip through, but two different problems never share a fingerprint (short of a hash collision).
+"""
+import hashlib
+import itertools
+import math
+from typing import Optional, Sequence
+
+from pyetr import ArbitraryObject, FunctionalTerm, PredicateAtom, View
+
+from etr_case_generator.view_builder import at_issue
+
+# Give up on trying every ordering of symbols that look alike once there are more orderings than this
+MAX_TIE_ORDERINGS = 24
+
+
+def canonical_premises_str(views: Sequence[View]) -> str:
+    """The premises written out with canonical symbol names. Equal for premises that only differ by renaming."""
+    structure = _ViewsStructure(views)
+    colors = structure.refined_colors()
+
+    # Group symbols that got the same color. Within a group, try every ordering if there aren't too many.
+    groups: dict[int, list[str]] = {}
+    for name in sorted(colors, key=lambda n: (colors[n], n)):
+        groups.setdefault(colors[name], []).append(name)
+    tied = [g for g in groups.values() if len(g) > 1]
+    if math.prod(math.factorial(len(g)) for g in tied) > MAX_TIE_ORDERINGS:
+        tied = []
+
+    best: Optional[str] = None
+    for tie_orders in itertools.product(*(itertools.permutations(g) for g in tied)):
+        reordered = dict(zip(map(tuple, tied), tie_orders))
+        order = []
+        for group in groups.values():
+            order.extend(reordered.get(tuple(group), group))
+        candidate = structure.to_str(structure.canonical_names(order))
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+
+def problem_fingerprint(views: Sequence[View]) -> int:
+    """A compact (128-bit) renaming-invariant fingerprint of a problem's premises, in order."""
+    digest = hashlib.blake2b(canonical_premises_str(views).encode(), digest_size=16).digest()
+    return int.from_bytes(digest, "big")
+
+
+class _ViewsStructure:
+    """The parts of a sequence of views that matter for the fingerprint, with symbols kept by name"""
+
+    def __init__(self, views: Sequence[View]):
+        self.views = list(views)
+        self.kinds: dict[str, set[str]] = {}  # Symbol name -> "p" (predicate), "c" (constant), "x" (arb object)
+        # (view index, "stage" | "supposition", [(atom, issue flags) for each atom of the state], weight or None)
+        self.states: list[tuple[int, str, list[tuple[PredicateAtom, tuple[bool, ...]]], Optional[str]]] = []
+
+        for i, view in enumerate(self.views):
+            issues = view.issue_structure
+            weights = None if view.weights.is_null_weights else view.weights
+            for part, states in (("stage", view.stage), ("supposition", view.supposition)):
+                for state in states:
+                    atoms = []
+                    for atom in state:
+                        if isinstance(atom, PredicateAtom):
+                            self._add_symbol(atom.predicate.name, "p")
+                            for term in atom.terms:
+                                self._add_term(term)
+                            flags = tuple(entry in issues for entry in at_issue(atom))
+                        else:
+                            flags = ()
+                        atoms.append((atom, flags))
+                    # Weights are kept as written, names and all. They're almost always null anyway.
+                    weight = str(weights[state]) if part == "stage" and weights is not None else None
+                    self.states.append((i, part, atoms, weight))
+            for arb_obj in view.dependency_relation.universals | view.dependency_relation.existentials:
+                self._add_symbol(arb_obj.name, "x")
+
+    def _add_symbol(self, name: str, kind: str):
+        self.kinds.setdefault(name, set()).add(kind)
+
+    def _add_term(self, term):
+        if isinstance(term, ArbitraryObject):
+            self._add_symbol(term.name, "x")
+        elif isinstance(term, FunctionalTerm):
+            self._add_symbol(term.f.name, "c")
+            for t in term.t:
+                self._add_term(t)
+
+    def refined_colors(self) -> dict[str, int]:
+        """Color symbols by how they're used, refining until the coloring stops splitting"""
+        colors = self._ranks({name: tuple(sorted(kinds)) for name, kinds in self.kinds.items()})
+        while True:
+            occurrences: dict[str, list] = {name: [] for name in colors}
+            for i, part, atoms, _ in self.states:
+                atom_sigs = [self._atom_sig(atom, flags, colors) for atom, flags in atoms]
+                state_sig = tuple(sorted(atom_sigs))
+                for (atom, _), atom_sig in zip(atoms, atom_sigs):
+                    if not isinstance(atom, PredicateAtom):
+                        continue
+                    occurrences[atom.predicate.name].append((i, part, -1, atom_sig, state_sig))
+                    for position, term in enumerate(atom.terms):
+                        for name in self._term_names(term):
+                            occurrences[name].append((i, part, position, atom_sig, state_sig))
+            for i, view in enumerate(self.views):
+                dep_rel = view.dependency_relation
+                for u in dep_rel.universals:
+                    deps = sorted(colors[d.existential.name] for d in dep_rel.dependencies if d.universal == u)
+                    occurrences[u.name].append((i, "universal", tuple(deps)))
+                for e in dep_rel.existentials:
+                    deps = sorted(colors[d.universal.name] for d in dep_rel.dependencies if d.existential == e)
+                    occurrences[e.name].append((i, "existential", tuple(deps)))
+
+            new_colors = self._ranks({name: (colors[name], tuple(sorted(occurrences[name]))) for name in colors})
+            if len(set(new_colors.values())) == len(set(colors.values())):
+                return new_colors
+            colors = new_colors
+
+    @staticmethod
+    def _ranks(signatures: dict[str, tuple]) -> dict[str, int]:
+        # Colors are ranks of signatures rather than hashes, so they're the same in every process
+        ranks = {sig: rank for rank, sig in enumerate(sorted(set(signatures.values())))}
+        return {name: ranks[sig] for name, sig in signatures.items()}
+
+    def _term_sig(self, term, colors: dict[str, int]) -> tuple:
+        if isinstance(term, ArbitraryObject):
+            return (colors[term.name], ())
+        if isinstance(term, FunctionalTerm):
+            return (colors[term.f.name], tuple(self._term_sig(t, colors) for t in term.t))
+        return (-1, (str(term),))
+
+    def _atom_sig(self, atom, flags: tuple[bool, ...], colors: dict[str, int]) -> tuple:
+        if not isinstance(atom, PredicateAtom):
+            return (-1, True, (), (str(atom),))
+        return (colors[atom.predicate.name], atom.predicate.verifier,
+                tuple(self._term_sig(t, colors) for t in atom.terms), flags)
+
+    def _term_names(self, term) -> list[str]:
+        if isinstance(term, ArbitraryObject):
+            return [term.name]
+        if isinstance(term, FunctionalTerm):
+            return [term.f.name] + [n for t in term.t for n in self._term_names(t)]
+        return []
+
+    def canonical_names(self, order: list[str]) -> dict[str, str]:
+        """New names for the symbols, numbered in the given order, e.g. p0, p1, c0, x0"""
+        counts = {"p": 0, "c": 0, "x": 0}
+        names = {}
+        for name in order:
+            kind = min(self.kinds[name])  # "c" < "p" < "x", only matters if one name is used as several kinds
+            names[name] = f"{kind}{counts[kind]}"
+            counts[kind] += 1
+        return names
+
+    def _term_str(self, term, names: dict[str, str]) -> str:
+        if isinstance(term, ArbitraryObject):
+            return names[term.name]
+        if isinstance(term, FunctionalTerm):
+            return names[term.f.name] + "(" + ",".join(self._term_str(t, names) for t in term.t) + ")"
+        return str(term)
+
+    def _atom_str(self, atom, flags: tuple[bool, ...], names: dict[str, str]) -> str:
+        if not isinstance(atom, PredicateAtom):
+            return str(atom)
+        terms = ",".join(self._term_str(t, names) + ("*" if flag else "") for t, flag in zip(atom.terms, flags))
+        return ("" if atom.predicate.verifier else "~") + names[atom.predicate.name] + "(" + terms + ")"
+
+    def to_str(self, names: dict[str, str]) -> str:
+        parts: list[dict[str, list[str]]] = [{"stage": [], "supposition": []} for _ in self.views]
+        for i, part, atoms, weight in self.states:
+            state_str = "".join(sorted(self._atom_str(atom, flags, names) for atom, flags in atoms))
+            parts[i][part].append(state_str if weight is None else f"{weight}={state_str}")
+
+        view_strs = []
+        for view, view_parts in zip(self.views, parts):
+            dep_rel = view.dependency_relation
+            quantifiers = sorted(
+                [f"∀{names[u.name]}" for u in dep_rel.universals]
+                + [f"∃{names[e.name]}" for e in dep_rel.existentials]
+                + [f"{names[d.universal.name]}<{names[d.existential.name]}" for d in dep_rel.dependencies]
+            )
+            view_strs.append(" ".join(quantifiers) + " {" + ",".join(sorted(view_parts["stage"])) + "}^{"
+                             + ",".join(sorted(view_parts["supposition"])) + "}")
+        return " | ".join(view_strs)
@@ -0,0 +1,80 @@
+"""Bookkeeping for the stages of `generate_problem_from_logical.generate_problem`.
+
+A candidate problem goes through these stages in order, and any of them can turn it away by raising ProblemRejected:
+- structure: the generator builds the premises and runs ETR inference (and rejects non-categorical conclusions)
+- verdict: is the ETR conclusion classically correct? Rejects correct ones with `--etr_only_wrong`
+- admission: is there still room in the quotas? (see quota_scheduler.py)
+- ontology: the premises and conclusion are put into English, and the ontology's names swapped in
+- prompt: SMT forms, conclusions and the question prompts are filled in
+
+The cheap stages come first, so most candidates that get thrown away never reach the expensive ones. `PipelineStats`
+records how long each stage takes and why candidates were rejected at it, to see where the time goes.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+PIPELINE_STAGES = ("structure", "verdict", "admission", "ontology", "prompt")
+
+
+class ProblemRejected(ValueError):
+    """A candidate problem was turned away by one of the pipeline stages, e.g. because its quota is full"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Rejected problem: {reason}")
+        self.reason = reason
+
+
+@dataclass
+class StageStats:
+    calls: int = 0  # Candidates that reached this stage
+    seconds: float = 0.0
+    rejections: Counter = field(default_factory=Counter)  # Reason -> count. Errors are counted by exception type.
+
+    @property
+    def num_rejected(self) -> int:
+        return sum(self.rejections.values())
+
+    def merge(self, other: "StageStats"):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.rejections.update(other.rejections)
+
+
+@dataclass
+class PipelineStats:
+    stages: dict[str, StageStats] = field(default_factory=lambda: {stage: StageStats() for stage in PIPELINE_STAGES})
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage, and count the candidate as rejected there if it raises"""
+        stats = self.stages[name]
+        stats.calls += 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        except ProblemRejected as e:
+            stats.rejections[e.reason] += 1
+            raise
+        except Exception as e:
+            stats.rejections[f"error: {type(e).__name__}"] += 1
+            raise
+        finally:
+            stats.seconds += time.perf_counter() - start_time
+
+    def merge(self, other: "PipelineStats"):
+        for name, stats in other.stages.items():
+            self.stages.setdefault(name, StageStats()).merge(stats)
+
+    def summary(self) -> str:
+        """One line per stage"""
+        total_seconds = sum(stats.seconds for stats in self.stages.values()) or 1.0
+        lines = []
+        for name, stats in self.stages.items():
+            line = (f" * {name}: {stats.calls} candidates, {stats.seconds:.2f}s ({stats.seconds / total_seconds:.0%}), "
+                    f"{stats.num_rejected} rejected")
+            if stats.rejections:
+                line += f" {dict(stats.rejections.most_common())}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,157 @@
+"""The pool of problems that the queued `ETRGenerator` mutates and hands out.
+
+Problems are kept in buckets by (seed_id, atom count), so the generator can pick a problem of a given seed and size, or
+count how many it has of each, without scanning the whole pool. Adding, removing and sampling a random problem are O(1),
+and sampling among several buckets only looks at the buckets, which keeps large queues (10k+ problems) cheap.
+
+The atom count histogram, and the median of its frequencies that `ETRGenerator.get_some_good_mutations` compares
+against, are kept up to date as problems come and go, rather than recounted from the problems.
+"""
+import bisect
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from etr_case_generator.logic_types import AtomCount
+from etr_case_generator.reified_problem import PartialProblem
+
+BucketKey = tuple[Optional[str], AtomCount]  # (seed_id, atom count)
+
+
+@dataclass
+class _PoolEntry:
+    key: BucketKey
+    pool_index: int  # Position in ProblemPool._problems
+    bucket_index: int  # Position in its bucket
+
+
+@dataclass
+class ProblemPool:
+    _problems: list[PartialProblem] = field(default_factory=list)  # Every problem, for uniform sampling
+    _buckets: dict[BucketKey, list[PartialProblem]] = field(default_factory=dict)
+    _entries: dict[int, _PoolEntry] = field(default_factory=dict)  # id(problem) -> where it is
+    _atom_counts: Counter[AtomCount] = field(default_factory=Counter)
+    _seed_counts: Counter[str] = field(default_factory=Counter)
+    _sorted_frequencies: list[int] = field(default_factory=list)  # The values of _atom_counts, sorted
+    rng: Optional[random.Random] = None  # What to sample with, the random module's shared generator if None
+
+    def __len__(self) -> int:
+        return len(self._problems)
+
+    def __iter__(self) -> Iterator[PartialProblem]:
+        return iter(list(self._problems))
+
+    def __contains__(self, problem: PartialProblem) -> bool:
+        return id(problem) in self._entries
+
+    def add(self, problem: PartialProblem):
+        if problem in self:
+            raise ValueError("Problem is already in the pool")
+        key = (problem.seed_id, AtomCount(problem.num_atoms()))
+        bucket = self._buckets.setdefault(key, [])
+        self._entries[id(problem)] = _PoolEntry(key=key, pool_index=len(self._problems), bucket_index=len(bucket))
+        self._problems.append(problem)
+        bucket.append(problem)
+        self._change_atom_count(key[1], 1)
+        self._seed_counts[key[0]] += 1
+
+    def extend(self, problems: Iterable[PartialProblem]):
+        for problem in problems:
+            self.add(problem)
+
+    def remove(self, problem: PartialProblem):
+        """Remove a problem, by swapping the last problem into its place in the pool and in its bucket"""
+        entry = self._entries.pop(id(problem), None)
+        if entry is None:
+            raise ValueError("Problem is not in the pool")
+
+        last = self._problems.pop()
+        if last is not problem:
+            self._problems[entry.pool_index] = last
+            self._entries[id(last)].pool_index = entry.pool_index
+
+        bucket = self._buckets[entry.key]
+        last = bucket.pop()
+        if last is not problem:
+            bucket[entry.bucket_index] = last
+            self._entries[id(last)].bucket_index = entry.bucket_index
+        if not bucket:
+            del self._buckets[entry.key]
+
+        seed_id, atom_count = entry.key
+        self._change_atom_count(atom_count, -1)
+        self._seed_counts[seed_id] -= 1
+        if self._seed_counts[seed_id] == 0:
+            del self._seed_counts[seed_id]
+
+    def _change_atom_count(self, atom_count: AtomCount, change: int):
+        """Update the histogram and its sorted frequencies"""
+        old = self._atom_counts[atom_count]
+        new = old + change
+        if old > 0:
+            del self._sorted_frequencies[bisect.bisect_left(self._sorted_frequencies, old)]
+        if new > 0:
+            bisect.insort(self._sorted_frequencies, new)
+            self._atom_counts[atom_count] = new
+        else:
+            del self._atom_counts[atom_count]
+
+    def median_frequency(self) -> float:
+        """The median number of problems per atom count, like `etr_generator.median_frequency`, 0.0 if the pool is empty"""
+        frequencies = self._sorted_frequencies
+        return frequencies[len(frequencies)//2] if frequencies else 0.0
+
+    def count(self, seed_id: Optional[str] = None, atom_count: Optional[int] = None) -> int:
+        """Number of problems with this seed id and/or atom count"""
+        if seed_id is not None and atom_count is not None:
+            return len(self._buckets.get((seed_id, AtomCount(atom_count)), []))
+        if seed_id is not None:
+            return self._seed_counts[seed_id]
+        if atom_count is not None:
+            return self._atom_counts[AtomCount(atom_count)]
+        return len(self)
+
+    def atom_counts(self) -> Counter[AtomCount]:
+        """Atom count -> number of problems, like `get_atom_count_distribution`"""
+        return Counter(self._atom_counts)
+
+    def seed_counts(self) -> Counter[str]:
+        return Counter(self._seed_counts)
+
+    def seed_ids(self) -> list[str]:
+        return list(self._seed_counts)
+
+    def seed_ids_with_atom_count(self, atom_count: int) -> list[str]:
+        return [seed_id for seed_id, count in self._buckets if count == atom_count]
+
+    def atom_counts_for_seed(self, seed_id: str) -> list[AtomCount]:
+        return [count for s, count in self._buckets if s == seed_id]
+
+    def sample(self, seed_id: Optional[str] = None, atom_counts: Optional[Iterable[int]] = None) -> Optional[PartialProblem]:
+        """A problem chosen uniformly at random from those with this seed id and one of these atom counts (either can be
+        left out to allow any). None if there are no such problems."""
+        rng = self.rng or random
+        if seed_id is None and atom_counts is None:
+            return rng.choice(self._problems) if self._problems else None
+        if seed_id is not None and atom_counts is not None:
+            atom_counts = list(atom_counts)
+            if len(atom_counts) == 1:
+                bucket = self._buckets.get((seed_id, AtomCount(atom_counts[0])))
+                return rng.choice(bucket) if bucket else None
+
+        # Pick a bucket weighted by its size, then a problem in it
+        allowed_atom_counts = None if atom_counts is None else set(atom_counts)
+        buckets = [bucket for (s, count), bucket in self._buckets.items()
+                   if (seed_id is None or s == seed_id) and (allowed_atom_counts is None or count in allowed_atom_counts)]
+        if not buckets:
+            return None
+        bucket = rng.choices(buckets, weights=[len(bucket) for bucket in buckets])[0]
+        return rng.choice(bucket)
+
+    def pop(self, seed_id: Optional[str] = None, atom_counts: Optional[Iterable[int]] = None) -> Optional[PartialProblem]:
+        """Like `sample`, but the problem is removed from the pool"""
+        problem = self.sample(seed_id=seed_id, atom_counts=atom_counts)
+        if problem is not None:
+            self.remove(problem)
+        return problem
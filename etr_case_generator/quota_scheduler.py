@@ -0,0 +1,160 @@
+"""Quotas for balanced dataset generation, and steering generation towards the cells that still need problems.
+
+Every generated problem falls into a cell: (atom count, balancing category, seed family). The category is the
+quadrant (erotetic, classical) with `--balance_quadrants`, whether ETR agrees with classical logic with
+`--balance_etr_agreement`, and None otherwise. The seed family is "control" or "target" for seeds from
+ILLUSORY_INFERENCE_FROM_DISJUNCTION, and None for everything else.
+
+The `QuotaScheduler` keeps count of the problems accepted in each cell, and is used in three places:
+- `needed_counts` and `open_seed_families` tell the generator which atom counts and seed families are still worth
+  generating, leaving out those whose cells are all full
+- `check_partial_problem` decides from the partial problem, before the English, SMT and conclusions are filled in,
+  whether the problem could still be kept. That only needs its atom count, seed and whether the ETR conclusion is
+  classically correct, which the verdict stage of `generate_problem` has already worked out (see problem_pipeline.py).
+- `rejection_reason` and `record` are the final say on the finished problem
+"""
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from etr_case_generator.logic_types import AtomCount
+from etr_case_generator.problem_pipeline import ProblemRejected
+from etr_case_generator.reified_problem import PartialProblem
+
+BALANCE_MODES = ("quadrants", "etr_agreement")
+
+SEED_FAMILIES = ("control", "target")
+
+
+def seed_family(seed_id: Optional[str]) -> Optional[str]:
+    """"control" or "target" for the illusory inference seeds, None for seeds without a family"""
+    for family in SEED_FAMILIES:
+        if str(seed_id).startswith(family):
+            return family
+    return None
+
+
+@dataclass
+class QuotaScheduler:
+    n_problems: int
+    num_atoms_set: list[int] = field(default_factory=list)
+    balance: Optional[str] = None  # One of BALANCE_MODES, or None to not balance
+    etr_only_wrong: bool = False  # Only problems whose ETR conclusion is classically wrong can be kept
+    balance_seed_families: bool = False  # At most half the problems from each seed family
+
+    # Problems accepted so far
+    atom_counts: Counter = field(default_factory=Counter)  # atom count -> count
+    category_counts: Counter = field(default_factory=Counter)  # category -> count
+    cell_counts: Counter = field(default_factory=Counter)  # (atom count, category) -> count
+    seed_family_counts: Counter = field(default_factory=Counter)  # seed family -> count
+
+    # Problems turned away after they were filled out, by why. Those turned away before are in the PipelineStats.
+    late_rejections: Counter = field(default_factory=Counter)
+
+    def __post_init__(self):
+        if self.balance is not None and self.balance not in BALANCE_MODES:
+            raise ValueError(f"Invalid balance mode: {self.balance}. Options are {BALANCE_MODES}")
+        if self.balance == "quadrants":
+            self.num_needed_per_category = (self.n_problems + 3) // 4
+        elif self.balance == "etr_agreement":
+            self.num_needed_per_category = self.n_problems // 2
+        else:
+            self.num_needed_per_category = self.n_problems
+        if self.num_atoms_set:
+            self.num_needed_per_category_by_atom = self.num_needed_per_category // len(self.num_atoms_set)
+            self.count_per_size = math.ceil(self.n_problems / len(self.num_atoms_set))
+        else:
+            self.num_needed_per_category_by_atom = 0
+            self.count_per_size = 0
+
+    def category(self, is_classical: bool, is_erotetic: bool = True):
+        """The balancing category of a problem. Generated ETR conclusions are erotetic by definition."""
+        if self.balance == "quadrants":
+            return (is_erotetic, is_classical)
+        elif self.balance == "etr_agreement":
+            return is_erotetic == is_classical
+        return None
+
+    def reachable_categories(self) -> list:
+        """Categories a generated problem can still end up in, given `etr_only_wrong`"""
+        classical_values = [False] if self.etr_only_wrong else [True, False]
+        return list(dict.fromkeys(self.category(is_classical) for is_classical in classical_values))
+
+    def rejection_reason(self, num_atoms: int, is_classical: bool, seed_id: Optional[str]) -> Optional[str]:
+        """Why a problem with these characteristics can't be kept, or None if there's room for it"""
+        if self.num_atoms_set and num_atoms not in self.num_atoms_set:
+            return "atom count not wanted"
+        category = self.category(is_classical)
+        if category is not None:
+            if self.num_atoms_set and self.cell_counts[(num_atoms, category)] >= self.num_needed_per_category_by_atom:
+                return "category full for atom count"
+            if self.category_counts[category] >= self.num_needed_per_category:
+                return "category full"
+        family = seed_family(seed_id)
+        if self.balance_seed_families and family is not None and self.seed_family_counts[family] >= self.n_problems // 2:
+            return "seed family full"
+        return None
+
+    def record(self, num_atoms: int, is_classical: bool, seed_id: Optional[str]):
+        """Count a kept problem towards the quotas"""
+        category = self.category(is_classical)
+        self.atom_counts[num_atoms] += 1
+        if category is not None:
+            self.category_counts[category] += 1
+            if self.num_atoms_set:
+                self.cell_counts[(num_atoms, category)] += 1
+        family = seed_family(seed_id)
+        if family is not None:
+            self.seed_family_counts[family] += 1
+
+    def _has_open_category(self, num_atoms: int) -> bool:
+        for category in self.reachable_categories():
+            if category is None:
+                return True
+            if self.num_atoms_set and self.cell_counts[(num_atoms, category)] >= self.num_needed_per_category_by_atom:
+                continue
+            if self.category_counts[category] < self.num_needed_per_category:
+                return True
+        return False
+
+    def needed_counts(self) -> Counter[AtomCount]:
+        """How many more problems are wanted at each atom count, 0 for atom counts whose cells are all full"""
+        needed_counts = Counter[AtomCount]()
+        for size in self.num_atoms_set:
+            remaining = self.count_per_size - self.atom_counts[size]
+            needed_counts[AtomCount(size)] = remaining if self._has_open_category(size) else 0
+        return needed_counts
+
+    def open_seed_families(self) -> Optional[set[str]]:
+        """Seed families that still need problems, or None if seed families aren't balanced"""
+        if not self.balance_seed_families:
+            return None
+        return {family for family in SEED_FAMILIES if self.seed_family_counts[family] < self.n_problems // 2}
+
+    def is_exhausted(self) -> bool:
+        """No problem the generator can produce could be kept any more"""
+        if self.num_atoms_set:
+            return not any(needed > 0 for needed in self.needed_counts().values())
+        return not self._has_open_category(0)
+
+    def check_partial_problem(self, partial_problem: PartialProblem):
+        """Turn a generated problem away before it's filled out, if every cell it could go in is full.
+
+        Raises:
+            ProblemRejected: If the problem can't be kept
+        """
+        reason = self.rejection_reason(partial_problem.num_atoms(),
+                                       partial_problem.etr_predicted_conclusion_is_classically_correct,
+                                       partial_problem.seed_id)
+        if reason is not None:
+            raise ProblemRejected(reason)
+
+    def summary(self) -> str:
+        lines = [f" * Atom counts: {dict(sorted(self.atom_counts.items()))}"]
+        if self.category_counts:
+            lines.append(f" * Categories: {dict(self.category_counts)}")
+        if self.seed_family_counts:
+            lines.append(f" * Seed families: {dict(self.seed_family_counts)}")
+        lines.append(f" * Rejected after filling out: {dict(self.late_rejections)}")
+        return "\n".join(lines)
@@ -1,22 +1,23 @@
+"""The problem classes that generation builds up and that the datasets are written from.
+
+Only the standard library is imported at module level, so `FullProblem`, `QuestionType` and friends can be imported
+(e.g. by the lm_eval scoring hooks) without loading pyetr, pysmt or rich. The methods that need those import them when
+they're called. `scripts/benchmark_imports.py` checks that this stays true.
+"""
+from __future__ import annotations
+
 import json
 import random
 import textwrap
-from dataclasses import dataclass
-from typing import Optional, Literal, cast, get_args
-
-from pyetr import View
-from pyetr.inference import default_procedure_does_it_follow, default_inference_procedure
-from pysmt.fnode import FNode
-from pyetr import View
-from pysmt.shortcuts import Symbol
-from rich.console import Console, Group
-from rich.panel import Panel
-from rich.text import Text
-
-from etr_case_generator import Ontology
-from etr_case_generator.formatting_smt import format_smt, smt_to_etr, smt_to_english, load_fnode_from_string
-from etr_case_generator.logic_helper import does_it_follow
-from smt_interface.smt_encoder import view_to_smt
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional, Literal, cast, get_args
+
+if TYPE_CHECKING:
+    from pyetr import View
+    from pysmt.fnode import FNode
+
+    from etr_case_generator.logic_helper import EntailmentEngine
+    from etr_case_generator.ontology import Ontology
 
 # Different ways of asking a question
 QuestionType = Literal["yes_no", "multiple_choice", "open_ended"]
@@ -31,6 +32,10 @@ class ReifiedView:
     english_form: Optional[str] = None
 
     def fill_out(self, ontology: Optional[Ontology] = None):
+        from pyetr import View
+        from etr_case_generator.formatting_smt import format_smt, load_fnode_from_string, smt_to_english, smt_to_etr
+        from smt_interface.smt_encoder import view_to_smt
+
         if self.logical_form_etr is not None:
             view: View = View.from_str(self.logical_form_etr)
             # Consider using `view_to_smt` to go from ETR->SMT
@@ -99,42 +104,86 @@ class PartialProblem:
     # The result of the default_inference_procedure
     etr_what_follows: Optional[ReifiedView] = None
     etr_predicted_conclusion_is_categorical: Optional[bool] = None
+    etr_predicted_conclusion_is_classically_correct: Optional[bool] = None  # Whether etr_what_follows follows classically
 
     # Used during generation
     seed_id: Optional[str] = None
 
-    def num_atoms(self) -> int:
-        return sum(len(view.logical_form_etr_view.atoms) for view in self.premises if view.logical_form_etr_view is not None)
+    # Cached by num_atoms once every premise has its ETR view, since the premises don't change after that
+    _num_atoms: Optional[int] = field(default=None, init=False, repr=False, compare=False)
 
-    def fill_out_conclusion(self, conclusion: Conclusion, ontology: Optional[Ontology] = None):
-        conclusion.view.fill_out(ontology)
+    def __post_init__(self):
+        if self.premises is not None:
+            self.num_atoms()
 
+    def num_atoms(self) -> int:
+        if self._num_atoms is not None:
+            return self._num_atoms
+        num_atoms = sum(len(view.logical_form_etr_view.atoms) for view in self.premises if view.logical_form_etr_view is not None)
+        if all(view.logical_form_etr_view is not None for view in self.premises):
+            self._num_atoms = num_atoms
+        return num_atoms
+
+    def fingerprint(self) -> int:
+        """Renaming-invariant fingerprint of the premises, see problem_fingerprint"""
+        from etr_case_generator.problem_fingerprint import problem_fingerprint
+        return problem_fingerprint([p.logical_form_etr_view for p in self.premises])
+
+    def entailment_engine(self) -> EntailmentEngine:
+        """An EntailmentEngine over the (filled out) premises, for checking several conclusions against them"""
+        from etr_case_generator.logic_helper import EntailmentEngine
+        return EntailmentEngine([p.logical_form_smt_fnode for p in self.premises])
+
+    def fill_out_conclusion(self, conclusion: Conclusion, ontology: Optional[Ontology] = None,
+                            engine: Optional[EntailmentEngine] = None):
+        self.fill_out_conclusions([conclusion], ontology, engine=engine)
+
+    def fill_out_conclusions(self, conclusions: list[Conclusion], ontology: Optional[Ontology] = None,
+                             engine: Optional[EntailmentEngine] = None):
+        """Fill out several conclusions, working out all their classical verdicts in one batch"""
+        from pyetr.inference import default_procedure_does_it_follow
+
+        conclusions = list({id(c): c for c in conclusions}.values())  # The same conclusion can be in several lists
         premises_views = [p.logical_form_etr_view for p in self.premises]
-        if conclusion.is_etr_predicted is None:
-            conclusion.is_etr_predicted = default_procedure_does_it_follow(premises_views, conclusion.view.logical_form_etr_view)
-        if conclusion.is_classically_correct is None:
-            premise_fnodes = [p.logical_form_smt_fnode for p in self.premises]
-            conclusion.is_classically_correct = does_it_follow(premise_fnodes, conclusion.view.logical_form_smt_fnode)
+        for conclusion in conclusions:
+            conclusion.view.fill_out(ontology)
+            if conclusion.is_etr_predicted is None:
+                conclusion.is_etr_predicted = default_procedure_does_it_follow(premises_views, conclusion.view.logical_form_etr_view)
+        self.add_classical_verdicts(conclusions, engine=engine)
+
+    def add_classical_verdicts(self, conclusions: list[Conclusion], engine: Optional[EntailmentEngine] = None):
+        """Set is_classically_correct on the conclusions that don't have it yet, with one call to
+        EntailmentEngine.verdicts against the (filled out) premises"""
+        pending = [c for c in conclusions if c.is_classically_correct is None]
+        if not pending:
+            return
+        if engine is None:
+            with self.entailment_engine() as engine:
+                self.add_classical_verdicts(pending, engine=engine)
+            return
+        verdicts = engine.verdicts([c.view.logical_form_smt_fnode for c in pending])
+        for conclusion, verdict in zip(pending, verdicts):
+            conclusion.is_classically_correct = verdict == "entailed"
 
     def fill_out(self, ontology: Optional[Ontology] = None):
         if self.premises is not None:
             for premise in self.premises:
                 premise.fill_out(ontology)
-        if self.possible_conclusions_from_logical is not None:
-            for conclusion in self.possible_conclusions_from_logical:
-                self.fill_out_conclusion(conclusion, ontology)
-        if self.possible_conclusions_from_etr is not None:
-            for conclusion in self.possible_conclusions_from_etr:
-                self.fill_out_conclusion(conclusion, ontology)
+        conclusions = (self.possible_conclusions_from_logical or []) + (self.possible_conclusions_from_etr or [])
+        if conclusions:
+            self.fill_out_conclusions(conclusions, ontology)
         if self.etr_what_follows is not None:
             self.etr_what_follows.fill_out(ontology)
 
         # Note that you may also want to call add_etr_predictions
 
     def add_etr_predictions(self, ontology: Optional[Ontology] = None):
+        from pyetr.inference import default_procedure_does_it_follow
+        from etr_case_generator.etr_inference_cache import cached_inference_procedure
+
         premises_views = [p.logical_form_etr_view for p in self.premises]
         if self.etr_what_follows is None:
-            follows_view = default_inference_procedure(premises_views)
+            follows_view = cached_inference_procedure(premises_views)
             self.etr_what_follows = ReifiedView(logical_form_etr_view=follows_view, logical_form_etr=follows_view.to_str())
             self.etr_what_follows.fill_out(ontology=ontology)
         if self.possible_conclusions_from_logical is not None:
@@ -148,11 +197,8 @@ class PartialProblem:
                     print("WARNING! Are you sure you want to add ETR predictions to the ETR conclusions? It's likely you meant to add them during their generation.")
 
     def add_classical_logic_predictions(self):
-        premise_fnodes = [p.logical_form_smt_fnode for p in self.premises]
         if self.possible_conclusions_from_etr:
-            for conclusion in self.possible_conclusions_from_etr:
-                if conclusion.is_classically_correct is None:
-                    conclusion.is_classically_correct = does_it_follow(premise_fnodes, conclusion.view.logical_form_smt_fnode)
+            self.add_classical_verdicts(self.possible_conclusions_from_etr)
         assert self.possible_conclusions_from_logical is None or all(c.is_classically_correct is not None for c in self.possible_conclusions_from_logical), "Error adding classical logic predictions to PartialProblem. Make sure to annotate correctness when creating possible_conclusions_from_logical. Or delete this assert and replace it with the for loop, idc." + str(self)
 
 
@@ -245,14 +291,12 @@ class FullProblem:
         if self.views is not None:
             for view in self.views:
                 view.fill_out(ontology)
-        if self.possible_conclusions is not None:
-            for conclusion in self.possible_conclusions:
-                partial_problem.fill_out_conclusion(conclusion, ontology)
-        if self.multiple_choices is not None:
-            for conclusion in self.multiple_choices:
-                partial_problem.fill_out_conclusion(conclusion, ontology)
+        # All the conclusions are checked against the same premises, so their classical verdicts are done together
+        conclusions = (self.possible_conclusions or []) + (self.multiple_choices or [])
         if self.etr_predicted_conclusion is not None:
-            partial_problem.fill_out_conclusion(self.etr_predicted_conclusion, ontology)
+            conclusions.append(self.etr_predicted_conclusion)
+        if conclusions:
+            partial_problem.fill_out_conclusions(conclusions, ontology)
         if self.yes_or_no_conclusion is None:
             correct_yes_no = random.random() < 0.5
             if correct_yes_no:
@@ -329,6 +373,8 @@ class FullProblem:
         return sum(str(view.logical_form_smt_fnode).count("&") for view in self.views)
 
     def to_dict_for_jsonl(self, args, format: QuestionType = "yes_no", chain_of_thought: bool = False) -> dict:
+        from etr_case_generator.formatting_smt import format_smt
+
         total_num_atoms = sum(len(view.logical_form_etr_view.atoms) for view in self.views)
         # print("Storing these premises:", [view.logical_form_etr for view in self.views])
         dict = {
@@ -377,6 +423,14 @@ class FullProblem:
 
 
     def full_string(self, question_types: list[str] = get_args(QuestionType), show_empty: bool = False) -> str:
+        # The first import of rich draws from the global random stream (rich.style seeds an id counter with it), which
+        # would shift everything after it in a seeded run, so put the random state back afterwards
+        random_state = random.getstate()
+        from rich.console import Console, Group
+        from rich.panel import Panel
+        from rich.text import Text
+        random.setstate(random_state)
+
         console = Console(record=True)
         
         # Create the main content
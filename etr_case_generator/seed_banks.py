@@ -0,0 +1,148 @@
+"""Named banks of seed problems, parsed once per process and shared.
+
+The seed problems are written out as view strings (see `seed_problems.py` and `study_replication_seed_problems.py`),
+and parsing those is most of the cost of loading them. So:
+
+- `get_seed_bank` builds each bank once per process and hands back the same tuple every time after that. The problems
+  in it are shared, so don't modify them, use `copy_seed_problem` to get one you can change.
+- `seed_view` parses a seed view string. If the `ETR_SEED_CACHE_DIR` environment variable is set, the slow half of
+  parsing (turning the string into a parse tree) is cached on disk, keyed by the pyetr version, so short-lived
+  processes skip it. The parse tree is still turned into a View in this process, the same way `View.from_str` does,
+  so the views come out exactly as if they had been parsed from scratch, down to how their sets iterate.
+"""
+import functools
+import os
+import pickle
+import tempfile
+from dataclasses import replace
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable, Optional
+
+from pyetr import View
+from pyetr.parsing.common import funcs_converter
+from pyetr.parsing.string_parser.parse_string import parse_string
+from pyetr.parsing.string_parser.parse_view import parse_pv
+
+from etr_case_generator.reified_problem import PartialProblem, ReifiedView
+
+DEFAULT_SEED_BANK = "STARTING_PROBLEMS"
+
+
+def _starting_problems() -> list[PartialProblem]:
+    from etr_case_generator.seed_problems import create_starting_problems
+    return create_starting_problems()
+
+
+def _study_replication_bank(name: str) -> Callable[[], list[PartialProblem]]:
+    def load() -> list[PartialProblem]:
+        from etr_case_generator import study_replication_seed_problems
+        return getattr(study_replication_seed_problems, name)
+    return load
+
+
+SEED_BANKS: dict[str, Callable[[], list[PartialProblem]]] = {
+    DEFAULT_SEED_BANK: _starting_problems,
+    "ILLUSORY_INFERENCE_FROM_DISJUNCTION": _study_replication_bank("ILLUSORY_INFERENCE_FROM_DISJUNCTION"),
+    "ILLUSORY_INFERENCES_WITH_QUANTIFIERS": _study_replication_bank("ILLUSORY_INFERENCES_WITH_QUANTIFIERS"),
+    "ILLUSORY_INFERENCE_FROM_DISJUNCTION_REVERSE_PREMISES_TEST": _study_replication_bank(
+        "ILLUSORY_INFERENCE_FROM_DISJUNCTION_REVERSE_PREMISES_TEST"
+    ),
+}
+
+
+def get_seed_bank(name: Optional[str] = None) -> tuple[PartialProblem, ...]:
+    """The problems in a seed bank, in their fixed order. Built on first use and shared after that, don't modify them.
+
+    Args:
+        name: One of `SEED_BANKS`, defaults to `DEFAULT_SEED_BANK`
+
+    Raises:
+        ValueError: If there's no seed bank with that name
+    """
+    name = name or DEFAULT_SEED_BANK
+    if name not in SEED_BANKS:
+        raise ValueError(f"Invalid seed bank: {name}. Options are {list(SEED_BANKS)}")
+    return _load_seed_bank(name)
+
+
+@functools.cache
+def _load_seed_bank(name: str) -> tuple[PartialProblem, ...]:
+    problems = tuple(SEED_BANKS[name]())
+    _parse_tree_cache.save()
+    return problems
+
+
+def copy_seed_problem(problem: PartialProblem) -> PartialProblem:
+    """A copy of a shared seed problem that can be modified freely.
+
+    The Views themselves are immutable, so they're shared rather than copied, only their wrappers are new.
+    """
+    def copy_view(view: Optional[ReifiedView]) -> Optional[ReifiedView]:
+        return None if view is None else replace(view)
+
+    def copy_conclusions(conclusions):
+        return None if conclusions is None else [replace(c, view=copy_view(c.view)) for c in conclusions]
+
+    return replace(
+        problem,
+        premises=None if problem.premises is None else [copy_view(p) for p in problem.premises],
+        possible_conclusions_from_logical=copy_conclusions(problem.possible_conclusions_from_logical),
+        possible_conclusions_from_etr=copy_conclusions(problem.possible_conclusions_from_etr),
+        etr_what_follows=copy_view(problem.etr_what_follows),
+    )
+
+
+def seed_view(s: str) -> View:
+    """Parse a seed view string, same as `View.from_str(s)` but with the parse tree cached (see the module docstring)"""
+    return View._from_view_storage(parse_pv(_parse_tree_cache.get(s), funcs_converter([])))
+
+
+class _ParseTreeCache:
+    """Parse trees of view strings, read from and written back to a pickle file in `ETR_SEED_CACHE_DIR` if it's set"""
+
+    def __init__(self):
+        self.trees: Optional[dict] = None
+        self.dirty = False
+
+    def path(self) -> Optional[str]:
+        cache_dir = os.environ.get("ETR_SEED_CACHE_DIR")
+        if not cache_dir:
+            return None
+        try:
+            pyetr_version = version("pyetr")
+        except PackageNotFoundError:
+            return None  # Nothing to key the cache on, parse trees could change under us
+        return os.path.join(cache_dir, f"seed_parse_trees-pyetr-{pyetr_version}.pkl")
+
+    def get(self, s: str):
+        if self.trees is None:
+            self.trees = self.load()
+        if s not in self.trees:
+            self.trees[s] = parse_string(s)
+            self.dirty = True
+        return self.trees[s]
+
+    def load(self) -> dict:
+        path = self.path()
+        if path is None or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable seed parse cache {path}: {e}")
+            return {}
+
+    def save(self):
+        path = self.path()
+        if path is None or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and move it into place, since several workers may be starting at once
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path), delete=False) as f:
+            pickle.dump(self.trees, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, path)
+        self.dirty = False
+
+
+_parse_tree_cache = _ParseTreeCache()
@@ -4,11 +4,13 @@ import random
 
 from pyetr import ArbitraryObject, FunctionalTerm, PredicateAtom
 from pysmt.shortcuts import Symbol, And, Or, Not, Implies, Iff, ForAll, Exists, is_valid, Solver
-from typing import List, Union, Optional, cast
+from typing import Counter, List, Union, Optional, cast
 from pysmt.fnode import FNode
 from pysmt.typing import BOOL, REAL, PySMTType
 
 from etr_case_generator import Ontology
+from etr_case_generator.logic_helper import EntailmentEngine
+from etr_case_generator.model_counting import count_models
 from etr_case_generator.reified_problem import PartialProblem, ReifiedView, Conclusion
 from etr_case_generator.ontology import ELEMENTS, natural_name_to_logical_name, NameShorteningScheme
 
@@ -61,10 +63,9 @@ def smt_atom_from_etr_atom(etr_atom: PredicateAtom) -> Symbol:
     )
 
 
-def has_a_good_number_of_necessary_assignments(views: list[FNode], min_solutions: int = 1,
-                                               max_solutions: int = 5) -> bool:
+def model_count_rejection_reason(views: list[FNode], min_solutions: int = 1, max_solutions: int = 5) -> Optional[str]:
     """
-    Returns true if the number of possible solutions is within the specified range.
+    Checks that the number of possible solutions is within the specified range.
 
     Args:
         views: List of boolean formula nodes representing the constraints
@@ -72,72 +73,16 @@ def has_a_good_number_of_necessary_assignments(views: list[FNode], min_solutions
         max_solutions: Maximum acceptable number of solutions (default: 5)
 
     Returns:
-        bool: True if number of solutions is within [min_solutions, max_solutions], False otherwise
+        Optional[str]: Why the views have a bad number of solutions, or None if it's within [min_solutions, max_solutions]
     """
-    # print(f"\n=== Checking for {min_solutions}-{max_solutions} solutions ===")
-    # print("Input views:")
-    # for i, view in enumerate(views):
-    #     print(f"  View {i}: {view}")
-
-    premises = And(views)
-    # print(f"\nCombined premises: {premises}")
-
-    # Extract all unique predicate applications
-    def get_atoms(formula: FNode) -> set[FNode]:
-        if formula.is_symbol():
-            return {formula}
-        return set().union(*(get_atoms(child) for child in formula.args()))
-
-    atoms = set()
-    for view in views:
-        atoms.update(get_atoms(view))
-
-    # print("\nExtracted atomic predicates:")
-    # for atom in atoms:
-    #     print(f"  {atom}")
-
-    # Find solutions until we exceed max_solutions or run out
-    solutions = []
-    solver = Solver()
-    solver.add_assertion(premises)
-
-    while len(solutions) <= max_solutions:
-        if not solver.solve():
-            break
-
-        # Get the current solution
-        current_solution = solver.get_model()
-        solutions.append(current_solution)
-
-        # print(f"\nFound solution #{len(solutions)}:")
-        # for atom in atoms:
-        #     print(f"  {atom} = {current_solution.get_value(atom)}")
-        #
-        # if len(solutions) > max_solutions:
-        #     print(f"\nExceeded maximum of {max_solutions} solutions!")
-        #     return False
-
-        # Add constraint to exclude this solution
-        solution_constraints = []
-        for atom in atoms:
-            if current_solution.get_value(atom).is_true():
-                solution_constraints.append(atom)
-            else:
-                solution_constraints.append(Not(atom))
-        solver.add_assertion(Not(And(solution_constraints)))
-
-    num_solutions = len(solutions)
-    # print(f"\nFound {num_solutions} total solutions")
-
+    # Only need to know whether there are more than max_solutions, not exactly how many
+    num_solutions = count_models(views, limit=max_solutions + 1)
+    # print(f"Found {num_solutions} solutions, want [{min_solutions}, {max_solutions}]")
     if num_solutions < min_solutions:
-        # print(f"Too few solutions (minimum is {min_solutions})")
-        return False
-    elif num_solutions > max_solutions:
-        # print(f"Too many solutions (maximum is {max_solutions})")
-        return False
-    else:
-        # print(f"Number of solutions ({num_solutions}) is within acceptable range [{min_solutions}, {max_solutions}]")
-        return True
+        return f"fewer than {min_solutions} models"
+    if num_solutions > max_solutions:
+        return f"more than {max_solutions} models"
+    return None
 
 
 def generate_conclusions(views: list[FNode], possible_atoms: list[Symbol], num_wrong: int = 3) -> list[
@@ -154,73 +99,54 @@ def generate_conclusions(views: list[FNode], possible_atoms: list[Symbol], num_w
         num_wrong: Number of wrong conclusions to generate
     """
     # print("\n=== Generating conclusions ===")
-    premises = And(views)
     conclusions = []
+    with EntailmentEngine(views) as engine:  # Every candidate is checked against the same premises
+
+        # Helper to test if a formula is necessary (true/false in all models)
+        def is_necessary(formula: FNode) -> tuple[bool, bool]:
+            """Returns (is_necessary, necessary_value)"""
+            must_be_true = engine.follows(formula)
+            must_be_false = engine.contradicts(formula)
+
+            return (must_be_true or must_be_false, must_be_true)
+
+        # Generate some compound formulas to test
+        def generate_compound_formula() -> FNode:
+            """Generate a random compound formula"""
+            formula_type = random.choice(['ATOM', 'AND', 'OR'])
+            if formula_type == 'ATOM':
+                return random.choice(possible_atoms)
+            elif formula_type == 'AND':
+                atoms = random.sample(possible_atoms, 2)
+                return And(atoms)
+            else:  # OR
+                atoms = random.sample(possible_atoms, 2)
+                return Or(atoms)
+
+        # First find a correct conclusion (something that's necessary)
+        # print("\nLooking for necessary conclusion...")
+        attempts = 0
+        while len(conclusions) == 0 and attempts < 100:
+            attempts += 1
+            candidate = generate_compound_formula()
+            is_nec, nec_value = is_necessary(candidate)
+            if is_nec:
+                conclusions.append((candidate, nec_value))
+                # print(f"Found necessary {'truth' if nec_value else 'falsehood'}: {candidate}")
+                break
 
-    # Helper to test if a formula is necessary (true/false in all models)
-    def is_necessary(formula: FNode) -> tuple[bool, bool]:
-        """Returns (is_necessary, necessary_value)"""
-        # Test if it must be true
-        solver_true = Solver()
-        solver_true.add_assertion(premises)
-        solver_true.add_assertion(Not(formula))
-        must_be_true = not solver_true.solve()
-
-        # Test if it must be false
-        solver_false = Solver()
-        solver_false.add_assertion(premises)
-        solver_false.add_assertion(formula)
-        must_be_false = not solver_false.solve()
-
-        return (must_be_true or must_be_false, must_be_true)
-
-    # Generate some compound formulas to test
-    def generate_compound_formula() -> FNode:
-        """Generate a random compound formula"""
-        formula_type = random.choice(['ATOM', 'AND', 'OR'])
-        if formula_type == 'ATOM':
-            return random.choice(possible_atoms)
-        elif formula_type == 'AND':
-            atoms = random.sample(possible_atoms, 2)
-            return And(atoms)
-        else:  # OR
-            atoms = random.sample(possible_atoms, 2)
-            return Or(atoms)
-
-    # First find a correct conclusion (something that's necessary)
-    # print("\nLooking for necessary conclusion...")
-    attempts = 0
-    while len(conclusions) == 0 and attempts < 100:
-        attempts += 1
-        candidate = generate_compound_formula()
-        is_nec, nec_value = is_necessary(candidate)
-        if is_nec:
-            conclusions.append((candidate, nec_value))
-            # print(f"Found necessary {'truth' if nec_value else 'falsehood'}: {candidate}")
-            break
+        # Now generate wrong conclusions (things that are contingent)
+        # print("\nGenerating contingent conclusions...")
+        wrong_attempts = 0
+        while len(conclusions) < num_wrong + 1 and wrong_attempts < 100:
+            wrong_attempts += 1
+            candidate = generate_compound_formula()
 
-    # Now generate wrong conclusions (things that are contingent)
-    # print("\nGenerating contingent conclusions...")
-    wrong_attempts = 0
-    while len(conclusions) < num_wrong + 1 and wrong_attempts < 100:
-        wrong_attempts += 1
-        candidate = generate_compound_formula()
-
-        # Check if it's contingent (can be both true and false)
-        solver_true = Solver()
-        solver_true.add_assertion(premises)
-        solver_true.add_assertion(candidate)
-        can_be_true = solver_true.solve()
-
-        solver_false = Solver()
-        solver_false.add_assertion(premises)
-        solver_false.add_assertion(Not(candidate))
-        can_be_false = solver_false.solve()
-
-        if can_be_true and can_be_false:
-            # It's contingent! Add it as a wrong answer
-            # print(f"Found contingent statement: {candidate}")
-            conclusions.append((candidate, False))
+            # Check if it's contingent (can be both true and false)
+            if engine.contingent(candidate):
+                # It's contingent! Add it as a wrong answer
+                # print(f"Found contingent statement: {candidate}")
+                conclusions.append((candidate, False))
 
     # print(f"\nGenerated {len(conclusions)} conclusions after {attempts + wrong_attempts} attempts")
     random.shuffle(conclusions)  # Randomize order
@@ -246,11 +172,16 @@ def random_smt_problem(ontology: Ontology=ELEMENTS,
     # There will be exactly num_clauses number of clauses distributed across those views
     # Each clause will have between min_disjuncts_per_clause and max_disjuncts_per_clause disjuncts
 
+    rejections = Counter[str]()  # Why candidate premise sets were thrown out
     while True:
         views = cnf_generation(total_num_pieces, possible_atoms)
 
-        if has_a_good_number_of_necessary_assignments(views):
+        reason = model_count_rejection_reason(views)
+        if reason is None:
             break
+        rejections[reason] += 1
+
+    # print(f"random_smt_problem rejected {sum(rejections.values())} candidate premise sets: {dict(rejections)}")
 
     # print("Got SMT Problem with views:")
     # print(views)
@@ -317,16 +248,15 @@ def cnf_generation(total_num_pieces: int, possible_atoms: list[Symbol]) -> list[
 def add_conclusions(partial_problem: PartialProblem, ontology: Ontology, num_wrong: int = 3):
     # Use the logical forms of the premises to get possibly relevant atoms for the
     # conclusions
-    possible_atoms = set()
+    # FNodes hash by their creation order in the pysmt environment, which depends on whatever this process built
+    # before, so deduplicate with a dict rather than a set to keep the order reproducible
+    possible_atoms = dict()
     assert partial_problem.premises is not None
     for premise in partial_problem.premises:
         assert premise.logical_form_etr_view is not None
         possible_atoms.update(
-            [
-                smt_atom_from_etr_atom(
-                    cast(PredicateAtom, a)
-                ) for a in premise.logical_form_etr_view.atoms
-            ]
+            (smt_atom_from_etr_atom(cast(PredicateAtom, a)), None)
+            for a in premise.logical_form_etr_view.atoms
         )
 
     possible_atoms = list(possible_atoms)[:6]  # Trim down to the right number of atoms
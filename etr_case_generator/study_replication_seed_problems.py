@@ -1,5 +1,5 @@
 
-from pyetr import View
+from etr_case_generator.seed_banks import seed_view
 from etr_case_generator.reified_problem import PartialProblem, ReifiedView
 
 
@@ -7,61 +7,61 @@ ILLUSORY_INFERENCE_FROM_DISJUNCTION: list[PartialProblem] = [
     PartialProblem(
         seed_id="target1",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(a()), C(b()) D(b()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(a()), C(b()) D(b()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ B(a()) }")
+            logical_form_etr_view=seed_view("{ B(a()) }")
         )
     ),
     PartialProblem(
         seed_id="target2",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(b()), C(c()) D(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(b()), C(c()) D(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ B(b()) }")
+            logical_form_etr_view=seed_view("{ B(b()) }")
         )
     ),
     PartialProblem(
         seed_id="target3",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()) A(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()) A(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ A(b()) }")
+            logical_form_etr_view=seed_view("{ A(b()) }")
         )
     ),
     PartialProblem(
         seed_id="control1",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(a()), C(b()) D(b()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ ~A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(a()), C(b()) D(b()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ ~A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ C(b()) D(b()) }")
+            logical_form_etr_view=seed_view("{ C(b()) D(b()) }")
         )
     ),
     PartialProblem(
         seed_id="control2",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(b()), C(c()) D(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ ~A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(b()), C(c()) D(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ ~A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ C(c()) D(d()) }")
+            logical_form_etr_view=seed_view("{ C(c()) D(d()) }")
         )
     ),
     PartialProblem(
         seed_id="control3",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()) A(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ ~A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()) A(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ ~A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ A(c()) A(d()) }")
+            logical_form_etr_view=seed_view("{ A(c()) A(d()) }")
         )
     ),
 ]
@@ -70,101 +70,101 @@ ILLUSORY_INFERENCE_FROM_DISJUNCTION_REVERSE_PREMISES_TEST: list[PartialProblem]
     PartialProblem(
         seed_id="target1",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(a()), C(b()) D(b()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(a()), C(b()) D(b()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ B(a()) }")
+            logical_form_etr_view=seed_view("{ B(a()) }")
         )
     ),
     PartialProblem(
         seed_id="target2",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(b()), C(c()) D(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(b()), C(c()) D(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ B(b()) }")
+            logical_form_etr_view=seed_view("{ B(b()) }")
         )
     ),
     PartialProblem(
         seed_id="target3",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()) A(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()) A(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ A(b()) }")
+            logical_form_etr_view=seed_view("{ A(b()) }")
         )
     ),
     PartialProblem(
         seed_id="target4",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()) A(d()), A(e()) A(f()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()) A(d()), A(e()) A(f()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ A(b()) }")
+            logical_form_etr_view=seed_view("{ A(b()) }")
         )
     ),
     PartialProblem(
         seed_id="target5",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()), A(d()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }"))
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()), A(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }"))
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ A(b()) }")
+            logical_form_etr_view=seed_view("{ A(b()) }")
         )
     ),
     PartialProblem(
         seed_id="control1",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(a()), C(b()) D(b()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(a()), C(b()) D(b()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{B(a()),C(b())D(b())}")
+            logical_form_etr_view=seed_view("{B(a()),C(b())D(b())}")
         )
     ),
     PartialProblem(
         seed_id="control2",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) B(b()), C(c()) D(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) B(b()), C(c()) D(d()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{B(b()),C(c())D(d())}")
+            logical_form_etr_view=seed_view("{B(b()),C(c())D(d())}")
         )
     ),
     PartialProblem(
         seed_id="control3",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()) A(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()) A(d()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{A(b()),A(c())A(d())}")
+            logical_form_etr_view=seed_view("{A(b()),A(c())A(d())}")
         )
     ),
     PartialProblem(
         seed_id="control4",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()) A(d()), A(e()) A(f()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()) A(d()), A(e()) A(f()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{A(b()),A(c())A(d()),A(e())A(f())}")
+            logical_form_etr_view=seed_view("{A(b()),A(c())A(d()),A(e())A(f())}")
         )
     ),
     PartialProblem(
         seed_id="control5",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()) A(b()), A(c()), A(d()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()) A(b()), A(c()), A(d()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{A(b()),A(c()),A(d())}")
+            logical_form_etr_view=seed_view("{A(b()),A(c()),A(d())}")
         )
     ),
 ]
@@ -179,41 +179,41 @@ ILLUSORY_INFERENCES_WITH_QUANTIFIERS: list[PartialProblem] = [
     PartialProblem(
         seed_id="indefinite_illusory_inference_target", # p. 129
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("∃x { B(x) A(x*) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("∃x { B(x) A(x*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()*) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ B(a()) }")
+            logical_form_etr_view=seed_view("{ B(a()) }")
         )
     ),
     PartialProblem(
         seed_id="indefinite_illusory_inference_target_reversed",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ A(a()*) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("∃x { B(x) A(x*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ A(a()*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("∃x { B(x) A(x*) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ B(a()) }")
+            logical_form_etr_view=seed_view("{ B(a()) }")
         )
     ),
     PartialProblem(
         seed_id="indefinite_illusory_inference_control",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("∃x { B(x) A(x*) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ ~A(a()*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("∃x { B(x) A(x*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ ~A(a()*) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{0}")
+            logical_form_etr_view=seed_view("{0}")
         )
     ),
     PartialProblem(
         seed_id="indefinite_illusory_inference_control_reversed",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ ~A(a()*) }")),
-            ReifiedView(logical_form_etr_view=View.from_str("∃x { B(x) A(x*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ ~A(a()*) }")),
+            ReifiedView(logical_form_etr_view=seed_view("∃x { B(x) A(x*) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{0}")
+            logical_form_etr_view=seed_view("{0}")
         )
     ),
 ]
@@ -222,21 +222,21 @@ MODUS_PONENS_MODUS_TOLLENS: list[PartialProblem] = [
     PartialProblem(
         seed_id="control",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ P(a()) Q(a()) }^{ P(a()) } ")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ P(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ P(a()) Q(a()) }^{ P(a()) } ")),
+            ReifiedView(logical_form_etr_view=seed_view("{ P(a()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ Q(a()) }")
+            logical_form_etr_view=seed_view("{ Q(a()) }")
         )
     ),
     PartialProblem(
         seed_id="target",
         premises=[
-            ReifiedView(logical_form_etr_view=View.from_str("{ P(a()) Q(a()) }^{ P(a()) } ")),
-            ReifiedView(logical_form_etr_view=View.from_str("{ ~Q(a()) }")),
+            ReifiedView(logical_form_etr_view=seed_view("{ P(a()) Q(a()) }^{ P(a()) } ")),
+            ReifiedView(logical_form_etr_view=seed_view("{ ~Q(a()) }")),
         ],
         etr_what_follows=ReifiedView(
-            logical_form_etr_view=View.from_str("{ ~P(a()) }")
+            logical_form_etr_view=seed_view("{ ~P(a()) }")
         )
     ),
 ]
@@ -0,0 +1,115 @@
+from typing import Optional
+
+import numpy as np
+from pysmt.fnode import FNode
+from pysmt.operators import AND, BOOL_CONSTANT, FUNCTION, IFF, IMPLIES, NOT, OR, SYMBOL
+
+# Above this many ground atoms, a table has 2^n rows and the solver is the better option
+TRUTH_TABLE_MAX_ATOMS = 16
+
+
+def _is_ground_term(term: FNode) -> bool:
+    """A non-boolean term built only from constants and function applications, like `a` or `f(a)`"""
+    if term.get_type().is_bool_type():
+        return False
+    if term.node_type() == SYMBOL:
+        return True
+    if term.node_type() == FUNCTION:
+        return all(_is_ground_term(arg) for arg in term.args())
+    return False
+
+
+def _atom_key(atom: FNode) -> tuple[str, str]:
+    # Premises and conclusions come from different pysmt environments (every `View.to_smt` call makes its own), so
+    # the same atom shows up as different FNodes. Key atoms by name, the same way the solver identifies them.
+    if atom.node_type() == SYMBOL:
+        return ("symbol", atom.symbol_name())
+    return ("apply", str(atom))
+
+
+def collect_atoms(formula: FNode, atoms: dict[tuple[str, str], None]) -> bool:
+    """Add the ground atoms of a formula to `atoms`, keeping first-seen order.
+
+    Returns False if the formula isn't a plain propositional combination of ground atoms (it has quantifiers,
+    equalities, arithmetic, ...), in which case it has to go to the solver.
+    """
+    node_type = formula.node_type()
+    if node_type in (AND, OR, NOT, IMPLIES, IFF):
+        return all(collect_atoms(arg, atoms) for arg in formula.args())
+    if node_type == BOOL_CONSTANT:
+        return True
+    if node_type == SYMBOL and formula.symbol_type().is_bool_type():
+        atoms[_atom_key(formula)] = None
+        return True
+    if node_type == FUNCTION and formula.get_type().is_bool_type() and all(_is_ground_term(a) for a in formula.args()):
+        atoms[_atom_key(formula)] = None
+        return True
+    return False
+
+
+class TruthTable:
+    """Every assignment to a small set of ground atoms, with formulas evaluated over all of them at once.
+
+    Row i of the table assigns atom j the value of bit j of i, and a formula evaluates to a boolean vector with one
+    entry per row. For quantifier-free formulas without equality this decides satisfiability and entailment exactly
+    like the solver does, since any assignment to the ground atoms can be realized by a model where all the
+    constants are distinct.
+    """
+
+    def __init__(self, atoms: list[tuple[str, str]]):
+        self.atoms = atoms
+        self.index = {atom: i for i, atom in enumerate(atoms)}
+        rows = np.arange(2 ** len(atoms), dtype=np.uint32)
+        self.columns = [((rows >> i) & 1).astype(bool) for i in range(len(atoms))]
+        self.num_rows = len(rows)
+
+    @classmethod
+    def build(cls, formulas: list[FNode], max_atoms: int = TRUTH_TABLE_MAX_ATOMS) -> Optional["TruthTable"]:
+        """Build a table over the atoms of `formulas`, or return None if they need the solver instead."""
+        atoms: dict[tuple[str, str], None] = {}
+        if not all(collect_atoms(f, atoms) for f in formulas) or len(atoms) > max_atoms:
+            return None
+        return cls(list(atoms))
+
+    def covers(self, formula: FNode) -> bool:
+        """Whether the formula only uses atoms that are in this table"""
+        atoms: dict[tuple[str, str], None] = {}
+        return collect_atoms(formula, atoms) and all(atom in self.index for atom in atoms)
+
+    def evaluate(self, formula: FNode) -> np.ndarray:
+        """The formula's truth value in every row, as a boolean vector"""
+        memo: dict[FNode, np.ndarray] = {}
+
+        def ev(node: FNode) -> np.ndarray:
+            if node in memo:
+                return memo[node]
+            node_type = node.node_type()
+            if node_type == AND:
+                result = np.ones(self.num_rows, dtype=bool)
+                for arg in node.args():
+                    result = result & ev(arg)
+            elif node_type == OR:
+                result = np.zeros(self.num_rows, dtype=bool)
+                for arg in node.args():
+                    result = result | ev(arg)
+            elif node_type == NOT:
+                result = ~ev(node.arg(0))
+            elif node_type == IMPLIES:
+                result = ~ev(node.arg(0)) | ev(node.arg(1))
+            elif node_type == IFF:
+                result = ev(node.arg(0)) == ev(node.arg(1))
+            elif node_type == BOOL_CONSTANT:
+                result = np.full(self.num_rows, node.constant_value(), dtype=bool)
+            else:
+                result = self.columns[self.index[_atom_key(node)]]
+            memo[node] = result
+            return result
+
+        return ev(formula)
+
+    def count_models(self, formulas: list[FNode]) -> int:
+        """Number of assignments to the table's atoms that make all the formulas true"""
+        mask = np.ones(self.num_rows, dtype=bool)
+        for f in formulas:
+            mask &= self.evaluate(f)
+        return int(np.count_nonzero(mask))
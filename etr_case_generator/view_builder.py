@@ -0,0 +1,205 @@
+"""Build pyetr Views out of the pieces of existing ones, without going through `View.from_str`.
+
+Parsing is the most expensive part of mutating views, so mutations and renaming assemble the new
+`View`/`State`/`PredicateAtom` objects directly. Each builder gives the same View that parsing the equivalent string
+used to (see `MutationNeighbourhood.to_str`).
+
+That includes the order things go in: a View hashes its weights in dict order, and how a State or SetOfStates
+iterates depends on the order its elements were added, so equal views only hash and iterate alike if they were built
+alike. States and atoms are added in the order they appear in the view's string, which is the order the parser would
+have added them in.
+"""
+from typing import Iterable, Optional
+
+from pyetr import (
+    ArbitraryObject,
+    Dependency,
+    DependencyRelation,
+    Function,
+    FunctionalTerm,
+    Predicate,
+    PredicateAtom,
+    SetOfStates,
+    State,
+    View,
+)
+from pyetr.weight import Weights
+from pyetr.atoms.open_predicate_atom import OpenPredicateAtom
+from pyetr.atoms.terms.open_term import QuestionMark
+from pyetr.issues import IssueStructure
+
+
+def constant(name: str) -> FunctionalTerm:
+    """A constant like `a()`"""
+    return FunctionalTerm(f=Function(name, 0), t=())
+
+
+def unary_atom(predicate_name: str, constant_name: str, negated: bool = False) -> PredicateAtom:
+    """An atom like `P(a())`, or `~P(a())` if negated"""
+    return PredicateAtom(
+        predicate=Predicate(name=predicate_name, arity=1, _verifier=not negated),
+        terms=(constant(constant_name),),
+    )
+
+
+def at_issue(atom: PredicateAtom) -> list[tuple]:
+    """Issue structure entries making every term of the atom at issue, as `P(a()*)` does"""
+    return [
+        (term, OpenPredicateAtom(
+            predicate=atom.predicate,
+            terms=tuple(QuestionMark() if j == i else t for j, t in enumerate(atom.terms)),
+        ))
+        for i, term in enumerate(atom.terms)
+    ]
+
+
+def ground_atom(atom: PredicateAtom) -> PredicateAtom:
+    """Turn arbitrary objects into constants of the same name, so `A(x)` becomes `A(x())`.
+
+    This is what writing a state out with `mutations.state_to_str` and reading it back in does.
+    """
+    return PredicateAtom(
+        predicate=atom.predicate,
+        terms=tuple(constant(t.name) if isinstance(t, ArbitraryObject) else t for t in atom.terms),
+    )
+
+
+def ground_states(view: View) -> list[list[PredicateAtom]]:
+    """The atoms of each state in a view's stage, grounded, in the order `mutations.state_to_str` writes them.
+
+    Issues, suppositions and quantifiers are dropped.
+    """
+    return [[ground_atom(a) for a in state] for state in view.stage]
+
+
+def view_from_states(states: Iterable[list[PredicateAtom]], issues: Iterable[tuple] = ()) -> View:
+    """A plain view with a state for each list of atoms, no supposition, no quantifiers"""
+    states = [State(atoms) for atoms in states]
+    return View.with_defaults(stage=SetOfStates(states), issue_structure=IssueStructure(issues),
+                              weights=_null_weights(states))
+
+
+def _null_weights(states: list[State]) -> Weights:
+    return Weights.get_null_weights(states)  # In the given order, see the module docstring
+
+
+def conjoin_atom(states: list[list[PredicateAtom]], state_index: int, atom: PredicateAtom,
+                 atom_at_issue: bool = False) -> View:
+    """Add an atom to one of the states"""
+    new_states = list(states)
+    new_states[state_index] = states[state_index] + [atom]
+    return view_from_states(new_states, at_issue(atom) if atom_at_issue else ())
+
+
+def disjoin_state(states: list[list[PredicateAtom]], atom: PredicateAtom, atom_at_issue: bool = False) -> View:
+    """Add a new state holding just the atom"""
+    return view_from_states(states + [[atom]], at_issue(atom) if atom_at_issue else ())
+
+
+def quantify_constant(view: View, constant_name: str, arb_obj_name: str, universal: bool,
+                      make_at_issue: bool = False) -> Optional[View]:
+    """Replace a constant with a new arbitrary object everywhere, quantified outside all existing quantifiers.
+
+    Args:
+        view: The view to quantify
+        constant_name: Name of the constant to replace, e.g. "a" for `a()`
+        arb_obj_name: Name of the new arbitrary object
+        universal: Whether to quantify it universally (otherwise existentially)
+        make_at_issue: Make the arbitrary object at issue everywhere it occurs
+
+    Returns:
+        The new view, or None if the view has non-null weights, which this doesn't handle
+    """
+    if not view.weights.is_null_weights:
+        return None
+    old = constant(constant_name)
+    new = ArbitraryObject(name=arb_obj_name)
+
+    def sub(atom: PredicateAtom) -> PredicateAtom:
+        return PredicateAtom(predicate=atom.predicate, terms=tuple(new if t == old else t for t in atom.terms))
+
+    old_stage = [state for state, _ in view.weights.sorted_items()]
+    old_supposition = view.supposition.sorted_iter()
+    states = [State([sub(a) for a in state.sorted_iter()]) for state in old_stage]
+    stage = SetOfStates(states)
+    supposition = SetOfStates([State([sub(a) for a in state.sorted_iter()]) for state in old_supposition])
+
+    # Issues in the order the parser would find them, atom by atom through the stage and then the supposition
+    issues = []
+    for state in old_stage + old_supposition:
+        for atom in state.sorted_iter():
+            for old_entry, new_entry in zip(at_issue(atom), at_issue(sub(atom))):
+                if old_entry in view.issue_structure or (make_at_issue and new_entry[0] == new):
+                    issues.append(new_entry)
+
+    dep_rel = view.dependency_relation
+    if universal:
+        # Being outermost, every existing existential now depends on it
+        dependencies = set(dep_rel.dependencies) | {
+            Dependency(existential=e, universal=new) for e in dep_rel.existentials
+        }
+        dep_rel = DependencyRelation(dep_rel.universals | {new}, dep_rel.existentials, dependencies)
+    else:
+        dep_rel = DependencyRelation(dep_rel.universals, dep_rel.existentials | {new}, dep_rel.dependencies)
+
+    return View.with_defaults(stage=stage, supposition=supposition, dependency_relation=dep_rel,
+                              issue_structure=IssueStructure(issues), weights=_null_weights(states))
+
+
+def rename_symbols(view: View, renames: dict[str, str]) -> View:
+    """Rename predicates, constants and arbitrary objects all at once, e.g. {"A": "red", "a": "ace"}.
+
+    Names that aren't in `renames` are left alone.
+    """
+    present = set()
+    for state in view.stage | view.supposition:
+        for atom in state:
+            present.add(atom.predicate.name)
+            for term in atom.terms:
+                present.update(_term_names(term))
+    to_rename = {old: new for old, new in renames.items() if old in present and old != new}
+
+    # View.match renames one name at a time, so go via placeholder names in case a new name is also an old one
+    steps = list(to_rename.items())
+    if set(to_rename.values()) & set(to_rename):
+        placeholders = {old: f"__rename{i}" for i, old in enumerate(to_rename)}
+        steps = list(placeholders.items()) + [(placeholders[old], new) for old, new in to_rename.items()]
+
+    def rename(item):
+        for old_name, new_name in steps:
+            item = item.match(old_name, _renamer(new_name))
+        return item
+
+    # Rebuild the states atom by atom so they go in in the original view's string order (see the module docstring).
+    # The quantifiers and issues don't depend on order, so take those from matching on the whole view.
+    weights = Weights()
+    for state, weight in view.weights.sorted_items():
+        weights.adding(State([rename(a) for a in state.sorted_iter()]), rename(weight))
+    supposition = SetOfStates(State([rename(a) for a in state.sorted_iter()]) for state in view.supposition.sorted_iter())
+    renamed = rename(view)
+    return View(
+        stage=SetOfStates(weights.keys()),
+        supposition=supposition,
+        dependency_relation=renamed.dependency_relation,
+        issue_structure=renamed.issue_structure,
+        weights=weights,
+    )
+
+
+def _term_names(term) -> set[str]:
+    if isinstance(term, ArbitraryObject):
+        return {term.name}
+    if isinstance(term, FunctionalTerm):
+        return {term.f.name}.union(*(_term_names(t) for t in term.t))
+    return set()
+
+
+def _renamer(new_name: str):
+    """A View.match callback giving whatever matched the new name"""
+    def rename(match):
+        if isinstance(match, ArbitraryObject):
+            return ArbitraryObject(name=new_name)
+        if isinstance(match, Function):
+            return Function(name=new_name, arity=match.arity, func_caller=match.func_caller)
+        return Predicate(name=new_name, arity=match.arity, _verifier=match.verifier)
+    return rename
@@ -0,0 +1,191 @@
+"""Score a whole samples JSONL from an open-ended lm_eval run, outside of lm_eval.
+
+This gives the same scores as `open_ended_scoring.score_answer`, but the rewrite model calls are made concurrently with
+asyncio, and the logic checks (ETR inference, classical entailment and equivalence) are run in a process pool, so
+neither one waits on the other.
+
+Run it from the root of the repo, like this:
+
+```bash
+python lm_eval/tasks/etr_problems_open_ended/batch_scoring.py path/to/samples_etr_problems_open_ended.jsonl --concurrency 32
+```
+
+Use `--endpoint offline` to score without calling any model, which is useful for testing, and `--base_url` to use a
+local OpenAI-compatible server (like vLLM or Ollama) for the rewrites. Rewrites are cached on disk like in
+`score_answer`, so scoring the same samples again doesn't call the model. Answers that are already in ETR notation
+aren't rewritten at all, unless `--no_local_parse` is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Run from the root of the repo, like lm_eval does
+sys.path.append(os.getcwd())
+
+from open_ended_scoring import (
+    NUM_ATTEMPTS,
+    REWRITE_MODEL,
+    answer_tier_stats,
+    attempt_score_answer_locally,
+    cached_rewrite,
+    etr_text_from_rewrite,
+    get_answer_text,
+    get_etr_substr,
+    parse_error_result,
+    report_scoring_stats,
+    rewrite_prompt,
+    rewrite_cache_key,
+    rewrite_temperature,
+    score_etr_answer,
+    set_openai_key,
+    store_rewrite,
+)
+
+
+class OpenAIEndpoint:
+    """Rewrites with the OpenAI API, or any OpenAI-compatible server if `base_url` is given"""
+
+    use_cache = True
+
+    def __init__(self, model: str = REWRITE_MODEL, base_url: Optional[str] = None):
+        self.model = model
+        self.base_url = base_url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+
+            if self.base_url is None:
+                set_openai_key()
+            # Local servers usually don't check the key, but the client needs one
+            api_key = os.getenv("OPENAI_API_KEY") or "local"
+            self._client = openai.AsyncOpenAI(api_key=api_key, base_url=self.base_url)
+        return self._client
+
+    async def complete(self, prompt: str, claim: str, temperature: float) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=200
+        )
+        return response.choices[0].message.content
+
+
+class OfflineEndpoint:
+    """A stand-in for the rewrite model that doesn't make any calls. It assumes that the claim is already written in
+    ETR notation, like the answers in the few-shot examples, and passes it through."""
+
+    use_cache = False  # Nothing to save
+
+    def __init__(self, model: str = "offline", base_url: Optional[str] = None):
+        self.model = model
+
+    async def complete(self, prompt: str, claim: str, temperature: float) -> str:
+        return f"Answer: {get_etr_substr(claim)}"
+
+
+ENDPOINTS = {
+    "openai": OpenAIEndpoint,
+    "offline": OfflineEndpoint,
+}
+
+
+async def score_sample(sample: dict, endpoint, semaphore: asyncio.Semaphore, executor: ProcessPoolExecutor,
+                       local_parse: bool = True) -> dict:
+    """Score one sample like `score_answer` does, retrying the rewrite up to NUM_ATTEMPTS times"""
+    question = sample["doc"]
+    answer_text = get_answer_text(sample["filtered_resps"])
+    if len(answer_text.strip()) == 0:
+        print(f"Empty answer text for doc {sample.get('doc_id')}")
+        answer_tier_stats["failed"] += 1
+        return parse_error_result(answer_text, answer_text)
+
+    loop = asyncio.get_running_loop()
+    if local_parse:
+        local_result = await loop.run_in_executor(executor, attempt_score_answer_locally, question, answer_text, answer_text)
+        if local_result is not None:
+            answer_tier_stats["local"] += 1
+            return local_result
+
+    short_name_to_full_name: dict[str, str] = question["scoring_guide"]["open_ended"]["short_name_to_full_name"]
+    premises = question["scoring_guide"]["generation_details"]["premises_etr"]
+    prompt = rewrite_prompt(answer_text, short_name_to_full_name, premises)
+
+    for i in range(NUM_ATTEMPTS):
+        try:
+            temperature = rewrite_temperature(i)
+            cache_key = rewrite_cache_key(answer_text, short_name_to_full_name, premises, temperature, model=endpoint.model)
+            rewritten_by_model = cached_rewrite(cache_key) if endpoint.use_cache else None
+            if rewritten_by_model is None:
+                async with semaphore:
+                    rewritten_by_model = await endpoint.complete(prompt, answer_text, temperature=temperature)
+                if endpoint.use_cache:
+                    store_rewrite(cache_key, rewritten_by_model)
+            etr_text = etr_text_from_rewrite(rewritten_by_model, short_name_to_full_name)
+            result = await loop.run_in_executor(executor, score_etr_answer, question, etr_text, answer_text)
+            answer_tier_stats["model"] += 1
+            return result
+        except Exception as e:
+            print(f"!!!! Failure {i+1}/{NUM_ATTEMPTS} for doc {sample.get('doc_id')}: {str(e)[:100]}...")
+    answer_tier_stats["failed"] += 1
+    return parse_error_result(answer_text, answer_text)
+
+
+async def score_samples(samples: list[dict], endpoint, concurrency: int = 16, workers: Optional[int] = None,
+                        local_parse: bool = True) -> list[dict]:
+    """Scores for each sample, in the same order"""
+    semaphore = asyncio.Semaphore(concurrency)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return await asyncio.gather(*[score_sample(sample, endpoint, semaphore, executor, local_parse=local_parse)
+                                      for sample in samples])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the samples from an open-ended lm_eval run, in parallel")
+    parser.add_argument("samples_jsonl", type=str, help="The samples JSONL written by lm_eval with --log_samples")
+    parser.add_argument("--output", type=str, help="Where to write the scored samples (default: next to the input, with _scored)")
+    parser.add_argument("--endpoint", type=str, default="openai", choices=ENDPOINTS.keys(), help="What rewrites the answers into ETR notation")
+    parser.add_argument("--model", type=str, default=REWRITE_MODEL, help="The rewrite model")
+    parser.add_argument("--base_url", type=str, default=None, help="Base URL of an OpenAI-compatible server to use instead of OpenAI")
+    parser.add_argument("--concurrency", type=int, default=16, help="Rewrite requests in flight at once")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the logic checks (default: one per CPU)")
+    parser.add_argument("--limit", type=int, default=None, help="Only score this many samples")
+    parser.add_argument("--no_local_parse", action="store_true", help="Rewrite every answer with the model, even ones already in ETR notation")
+    args = parser.parse_args()
+
+    with open(args.samples_jsonl, "r") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    if args.limit is not None:
+        samples = samples[:args.limit]
+    output = args.output or args.samples_jsonl.replace(".jsonl", "_scored.jsonl")
+
+    endpoint = ENDPOINTS[args.endpoint](model=args.model, base_url=args.base_url)
+    print(f"Scoring {len(samples)} samples from {args.samples_jsonl} with {args.endpoint} ({args.model})")
+    start_time = time.time()
+    results = asyncio.run(score_samples(samples, endpoint, concurrency=args.concurrency, workers=args.workers,
+                                        local_parse=not args.no_local_parse))
+    elapsed = time.time() - start_time
+
+    with open(output, "w") as f:
+        for sample, result in zip(samples, results):
+            f.write(json.dumps({**sample, **result}) + "\n")
+
+    print(f"Scored {len(samples)} samples in {elapsed:.1f}s, saved to {output}")
+    for key in ["correct", "is_etr_predicted", "is_etr_predicted_exact", "is_logically_equivalent", "parse_error"]:
+        mean = sum(result[key] for result in results) / max(len(results), 1)
+        print(f" * {key}: {mean:.3f}")
+    report_scoring_stats()
+
+
+if __name__ == "__main__":
+    main()
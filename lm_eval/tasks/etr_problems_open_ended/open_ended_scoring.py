@@ -1,10 +1,15 @@
+import atexit
+import hashlib
 import json
 import re
 import os
 import sys
 import textwrap
-import openai
 import logging
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
 
 # Disable OpenAI HTTP request logs
 logging.getLogger("openai._base_client").setLevel(logging.WARNING)
@@ -22,7 +27,35 @@ from smt_interface.smt_encoder import view_to_smt
 # This is necessary because of the way that lm_eval runs this file
 sys.path.append(os.getcwd())
 
+# The model that rewrites free-form answers into ETR notation
+REWRITE_MODEL = "gpt-4.1-mini"  # 20 times cheaper than gpt-4!
+
+# Rewrite attempts per answer. Each retry uses a higher temperature.
+NUM_ATTEMPTS = 3
+
+# Bump this whenever `rewrite_prompt` changes, so that rewrites of the old prompt aren't reused from the cache
+REWRITE_PROMPT_VERSION = 1
+
+# The rewrites are cached on disk, so re-scoring the same answers doesn't call the model again. Set ETR_REWRITE_CACHE
+# to use a different file, or to an empty string to not cache at all.
+REWRITE_CACHE_PATH = os.getenv("ETR_REWRITE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rewrite_cache.sqlite"))
+
+rewrite_cache_stats = Counter()  # "hits" and "misses"
+_rewrite_cache = None
+
+# How each answer was put into ETR notation: "local" (it already was, see `local_etr_text`), "model" (the rewrite
+# model did it), or "failed" (a parse error)
+answer_tier_stats = Counter()
+
+# A statement in ETR notation, with any quantifiers in front of it
+ETR_STATEMENT_PATTERN = re.compile(r"(?:[∀∃]\w+\s*)*\{[^{}]*\}")
+# Where the answer starts, in the order that `get_etr_substr` looks for them
+ANSWER_MARKER_PATTERNS = [re.compile(r"(?<=following follows: )(.*)"), re.compile(r"(?<=Answer: )(.*)")]
+
+
 def set_openai_key():
+    import openai
+
     # Handle API key swapping for OpenRouter
     original_openai_key = os.getenv("ORIGINAL_OPENAI_KEY")
     if original_openai_key:
@@ -58,30 +91,51 @@ def score_answer(question, model_answer):
     """
     set_openai_key()
 
-    # Extract answer text
-    if isinstance(model_answer, dict):
-        answer_text = model_answer.get("text", "")
-    elif isinstance(model_answer, list) and len(model_answer) > 0:
-        answer_text = str(model_answer[0])
-    else:
-        answer_text = str(model_answer)
+    answer_text = get_answer_text(model_answer)
     original_model_answer: str = answer_text
     # print("-" * 80)
     print(f"Starting Open Ended Scoring. Got this answer text: `{answer_text}`")
 
-    num_attempts = 3
+    # Most answers are already in ETR notation, like the question asks, so try to read them without the rewrite model
+    local_result = attempt_score_answer_locally(question, answer_text, original_model_answer)
+    if local_result is not None:
+        answer_tier_stats["local"] += 1
+        return local_result
+
+    num_attempts = NUM_ATTEMPTS
     for i in range(num_attempts):
         if len(answer_text.strip()) == 0:
             print("Empty answer text, debug printing, returning early")
             print(model_answer)
             break
         try:
-            return attempt_score_answer(question, answer_text, original_model_answer, attempt_num=i)
+            result = attempt_score_answer(question, answer_text, original_model_answer, attempt_num=i)
+            answer_tier_stats["model"] += 1
+            return result
         except Exception as e:
             print(f"!!!! Failure {i+1}/{num_attempts}: {str(e)[:100]}...")
             if i == num_attempts - 1:
                 break
             continue
+    answer_tier_stats["failed"] += 1
+    return parse_error_result(answer_text, original_model_answer)
+
+
+def get_answer_text(model_answer) -> str:
+    """The text of the model's response, as lm_eval hands it to `score_answer`"""
+    if isinstance(model_answer, dict):
+        return model_answer.get("text", "")
+    elif isinstance(model_answer, list) and len(model_answer) > 0:
+        return str(model_answer[0])
+    return str(model_answer)
+
+
+def rewrite_temperature(attempt_num: int) -> float:
+    return 0.2 + 0.2 * attempt_num
+
+
+def parse_error_result(answer_text: str, original_model_answer: str) -> dict:
+    """The scores for an answer that couldn't be rewritten into a statement that we can check"""
     return {
         "correct": 0.0,
         "len_response": len(original_model_answer),
@@ -101,82 +155,50 @@ def score_answer(question, model_answer):
     }
 
 
+def local_etr_text(answer_text: str, short_name_to_full_name: dict[str, str]) -> Optional[str]:
+    """The answer in ETR notation, if it's already written that way and uses the problem's predicates, without
+    calling the rewrite model. Returns None if it needs rewriting.
+
+    Only the statement after the answer marker ("following follows:" or "Answer:", like `get_etr_substr` looks for), or
+    a response that is nothing but one statement, counts. Statements elsewhere in the response may be premises restated
+    in the reasoning, so those answers are left to the rewrite model."""
+    candidate = answer_text
+    for pattern in ANSWER_MARKER_PATTERNS:
+        match = pattern.search(answer_text)
+        if match:
+            candidate = match.group(1)
+            break
+    candidate = candidate.strip().rstrip(".").strip()
+    if not ETR_STATEMENT_PATTERN.fullmatch(candidate):
+        return None
+
+    try:
+        # Written like the rewrite model's answer, so that any quantifiers are kept
+        etr_text = etr_text_from_rewrite(f"Answer: {candidate}", short_name_to_full_name)
+        View.from_str(etr_text)
+        return etr_text
+    except Exception:
+        return None
+
+
+def attempt_score_answer_locally(question: dict, answer_text: str, original_model_answer: str) -> Optional[dict]:
+    """Score the answer without the rewrite model, or None if it can't be"""
+    short_name_to_full_name: dict[str, str] = question["scoring_guide"]["open_ended"]["short_name_to_full_name"]
+    etr_text = local_etr_text(answer_text, short_name_to_full_name)
+    if etr_text is None:
+        return None
+    try:
+        return score_etr_answer(question, etr_text, original_model_answer)
+    except Exception as e:
+        print(f"Couldn't score the answer as written, rewriting it: {str(e)[:100]}...")
+        return None
+
+
 def attempt_score_answer(question: dict, answer_text: str, original_model_answer: str, attempt_num: int = 0):
     try:
         short_name_to_full_name: dict[str, str] = question["scoring_guide"]["open_ended"]["short_name_to_full_name"]
-        model_answer = use_model_get_etr_text(answer_text, short_name_to_full_name, question["scoring_guide"]["generation_details"]["premises_etr"], temperature=0.2 + 0.2 * attempt_num)
-
-        # print(f"Compare to predicted:", question["scoring_guide"]["etr_predicted"])
-
-        # Try to see if it follows!
-        model_view_etr: View = View.from_str(model_answer)  # Assuming that this doesn't inclue any issue structure by default...
-        model_view_smt_fnode = view_to_smt(model_view_etr)
-        premises_etr = question["scoring_guide"]["generation_details"]["premises_etr"]
-        premises_view = [View.from_str(p) for p in premises_etr]
-        premises_fnodes = [view_to_smt(v) for v in premises_view]
-        etr_predicted = View.from_str(question["scoring_guide"]["etr_predicted"])
-
-        # Classical logic
-        is_classically_correct: bool = does_it_follow(premises_fnodes, model_view_smt_fnode)
-
-        # ETR
-        is_etr_predicted: bool = default_procedure_does_it_follow(premises_view, model_view_etr)
-
-        # Exact ETR
-        etr_strong_predicted_recalculated: View = default_inference_procedure(premises_view)
-        etr_strong_predicted: View = etr_predicted  # Use the cached ETR predicted conclusion, this matters in the 'reversed' case
-
-        # Check if the ETR predicted conclusion is equivalent to the strong prediction
-        recalculated_is_same: bool = etr_strong_predicted_recalculated.is_equivalent_under_arb_sub(etr_strong_predicted)
-        print(f"Recalculated ETR predicted: {recalculated_is_same}")
-
-        # Replace with an empty issue structure
-        etr_strong_predicted = View(
-            stage=etr_strong_predicted.stage,
-            supposition=etr_strong_predicted.supposition,
-            dependency_relation=etr_strong_predicted.dependency_relation,
-            issue_structure=IssueStructure(),
-            weights=etr_strong_predicted.weights
-        )
-        # 1. should be equivalence under arbitrary object substitution
-        # 2. should be compared after stripping all issue structure out
-        is_etr_strong_predicted: bool = etr_strong_predicted.is_equivalent_under_arb_sub(model_view_etr)
-
-        # Check logical equivalence between the strong prediction and model's answer
-        # Convert both to PySMT fnodes (already done above)
-        # We want to test if etr_strong_predicted and model_view_etr are equivalent
-        strong_predicted_smt = view_to_smt(etr_strong_predicted)
-        model_view_smt = view_to_smt(model_view_etr)
-        # Create the equivalence formula: (P ⟺ Q) using the Iff operator
-        equivalence_formula = strong_predicted_smt.Iff(model_view_smt)
-        # Check if this equivalence is valid (i.e., is a tautology)
-        is_logical_equivalent = is_valid(equivalence_formula)
-        # print(f"Logical equivalence: {is_logical_equivalent}")
-        
-        # This can be additionally considered in the scoring if needed
-        # For now we'll just track it but not change the result
-
-        # print(f"ETR predicted: {is_etr_predicted}")
-        # print(f"Classically correct: {is_classically_correct}")
-
-        # TODO: If you add a key here, also add it to samples_jsonl_to_csv.py!
-        return {
-            "correct": float(is_classically_correct),
-            "is_etr_predicted": float(is_etr_predicted),
-            "is_etr_predicted_exact": float(is_etr_strong_predicted),
-            "is_logically_equivalent": float(is_logical_equivalent),
-            "len_response": len(original_model_answer),
-            "parse_error": 0,
-            "model_answer": model_answer,
-            "full_model_response": original_model_answer,
-            "recalculated_is_same": float(recalculated_is_same),
-
-            # Full quadrants
-            "correct_and_etr": float(is_classically_correct and is_etr_predicted),
-            "correct_and_not_etr": float(is_classically_correct and not is_etr_predicted),
-            "not_correct_and_etr": float(not is_classically_correct and is_etr_predicted),
-            "not_correct_and_not_etr": float(not is_classically_correct and not is_etr_predicted),
-        }
+        model_answer = use_model_get_etr_text(answer_text, short_name_to_full_name, question["scoring_guide"]["generation_details"]["premises_etr"], temperature=rewrite_temperature(attempt_num))
+        return score_etr_answer(question, model_answer, original_model_answer)
     except Exception as e:
         # print("!" * 80)
         # print(f"Error: {str(e)[:100]}")
@@ -185,6 +207,114 @@ def attempt_score_answer(question: dict, answer_text: str, original_model_answer
         raise e
 
 
+@dataclass(frozen=True)
+class CompiledQuestion:
+    """Everything about a question that the logic checks need, which doesn't depend on the answer"""
+    premises_view: list[View]
+    premises_fnodes: list[FNode]
+    etr_strong_predicted: View  # The cached ETR predicted conclusion, with its issue structure stripped out
+    strong_predicted_smt: FNode
+    recalculated_is_same: bool  # Whether inference on the premises still gives the cached ETR predicted conclusion
+
+
+@lru_cache(maxsize=4096)
+def compile_premises(premises_etr: tuple[str, ...], etr_predicted_str: str) -> CompiledQuestion:
+    """Parse and run inference on a question's premises. This is memoized, so each question is only compiled once,
+    however many models answered it and however many rewrite attempts each answer took."""
+    premises_view = [View.from_str(p) for p in premises_etr]
+    premises_fnodes = [view_to_smt(v) for v in premises_view]
+    etr_predicted = View.from_str(etr_predicted_str)
+
+    # Exact ETR
+    etr_strong_predicted_recalculated: View = default_inference_procedure(premises_view)
+    etr_strong_predicted: View = etr_predicted  # Use the cached ETR predicted conclusion, this matters in the 'reversed' case
+
+    # Check if the ETR predicted conclusion is equivalent to the strong prediction
+    recalculated_is_same: bool = etr_strong_predicted_recalculated.is_equivalent_under_arb_sub(etr_strong_predicted)
+
+    # Replace with an empty issue structure
+    etr_strong_predicted = View(
+        stage=etr_strong_predicted.stage,
+        supposition=etr_strong_predicted.supposition,
+        dependency_relation=etr_strong_predicted.dependency_relation,
+        issue_structure=IssueStructure(),
+        weights=etr_strong_predicted.weights
+    )
+    return CompiledQuestion(
+        premises_view=premises_view,
+        premises_fnodes=premises_fnodes,
+        etr_strong_predicted=etr_strong_predicted,
+        strong_predicted_smt=view_to_smt(etr_strong_predicted),
+        recalculated_is_same=recalculated_is_same,
+    )
+
+
+def compile_question(question: dict) -> CompiledQuestion:
+    scoring_guide = question["scoring_guide"]
+    return compile_premises(tuple(scoring_guide["generation_details"]["premises_etr"]), scoring_guide["etr_predicted"])
+
+
+def score_etr_answer(question: dict, model_answer: str, original_model_answer: str) -> dict:
+    """The logic checks on an answer that has been rewritten into ETR notation. Doesn't call the rewrite model.
+
+    Raises:
+        Exception: If the rewritten answer can't be parsed
+    """
+    # print(f"Compare to predicted:", question["scoring_guide"]["etr_predicted"])
+    compiled = compile_question(question)
+
+    # Try to see if it follows!
+    model_view_etr: View = View.from_str(model_answer)  # Assuming that this doesn't inclue any issue structure by default...
+    model_view_smt_fnode = view_to_smt(model_view_etr)
+
+    # Classical logic
+    is_classically_correct: bool = does_it_follow(compiled.premises_fnodes, model_view_smt_fnode)
+
+    # ETR
+    is_etr_predicted: bool = default_procedure_does_it_follow(compiled.premises_view, model_view_etr)
+
+    # Exact ETR
+    recalculated_is_same: bool = compiled.recalculated_is_same
+    print(f"Recalculated ETR predicted: {recalculated_is_same}")
+
+    # 1. should be equivalence under arbitrary object substitution
+    # 2. should be compared after stripping all issue structure out
+    is_etr_strong_predicted: bool = compiled.etr_strong_predicted.is_equivalent_under_arb_sub(model_view_etr)
+
+    # Check logical equivalence between the strong prediction and model's answer
+    # We want to test if etr_strong_predicted and model_view_etr are equivalent
+    # Create the equivalence formula: (P ⟺ Q) using the Iff operator
+    equivalence_formula = compiled.strong_predicted_smt.Iff(model_view_smt_fnode)
+    # Check if this equivalence is valid (i.e., is a tautology)
+    is_logical_equivalent = is_valid(equivalence_formula)
+    # print(f"Logical equivalence: {is_logical_equivalent}")
+    
+    # This can be additionally considered in the scoring if needed
+    # For now we'll just track it but not change the result
+
+    # print(f"ETR predicted: {is_etr_predicted}")
+    # print(f"Classically correct: {is_classically_correct}")
+
+    # TODO: If you add a key here, also add it to samples_jsonl_to_csv.py!
+    return {
+        "correct": float(is_classically_correct),
+        "is_etr_predicted": float(is_etr_predicted),
+        "is_etr_predicted_exact": float(is_etr_strong_predicted),
+        "is_logically_equivalent": float(is_logical_equivalent),
+        "len_response": len(original_model_answer),
+        "parse_error": 0,
+        "model_answer": model_answer,
+        "full_model_response": original_model_answer,
+        "recalculated_is_same": float(recalculated_is_same),
+
+        # Full quadrants
+        "correct_and_etr": float(is_classically_correct and is_etr_predicted),
+        "correct_and_not_etr": float(is_classically_correct and not is_etr_predicted),
+        "not_correct_and_etr": float(not is_classically_correct and is_etr_predicted),
+        "not_correct_and_not_etr": float(not is_classically_correct and not is_etr_predicted),
+    }
+
+
 def get_etr_substr(answer_text):
     # Show the full details of the question, for debugging. This contains generation details and the scoring guide.
     # print(json.dumps(question, indent=4))
@@ -243,10 +373,103 @@ def get_etr_substr(answer_text):
     return model_answer
 
 def use_model_get_etr_text(model_answer: str, short_name_to_full_name: dict[str, str], premises: list[str], temperature: float = 0):
-    # Reverse short_name_to_full_name
-    # Here, "short names" are useful for logical statements, and they might be like "matterEating", and "long names" are for English, like "matter eating"
-    full_name_to_short_name = {v: k for k, v in short_name_to_full_name.items() if k and v}
+    cache_key = rewrite_cache_key(model_answer, short_name_to_full_name, premises, temperature)
+    rewritten_by_model = cached_rewrite(cache_key)
+    if rewritten_by_model is None:
+        import openai
+
+        prompt = rewrite_prompt(model_answer, short_name_to_full_name, premises)
+        response = openai.chat.completions.create(
+            model=REWRITE_MODEL,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=200
+        )
+        rewritten_by_model = response.choices[0].message.content
+        store_rewrite(cache_key, rewritten_by_model)
+    # print(f"Rewritten by model: {rewritten_by_model}")
+    return etr_text_from_rewrite(rewritten_by_model, short_name_to_full_name)
+
+
+def get_rewrite_cache():
+    """The on-disk cache of rewrites, opened the first time it's needed. None if caching is turned off."""
+    global _rewrite_cache
+    if _rewrite_cache is None and REWRITE_CACHE_PATH:
+        from sqlitedict import SqliteDict
+
+        _rewrite_cache = SqliteDict(REWRITE_CACHE_PATH, tablename="rewrites", autocommit=True)
+    return _rewrite_cache
+
+
+def close_rewrite_cache():
+    global _rewrite_cache
+    if _rewrite_cache is not None:
+        _rewrite_cache.close()
+        _rewrite_cache = None
+
+
+def rewrite_cache_key(model_answer: str, short_name_to_full_name: dict[str, str], premises: list[str], temperature: float,
+                      model: str = REWRITE_MODEL) -> str:
+    """A hash of everything that goes into a rewrite"""
+    key_data = json.dumps({
+        "prompt_version": REWRITE_PROMPT_VERSION,
+        "model": model,
+        "answer": model_answer,
+        "short_name_to_full_name": short_name_to_full_name,
+        "premises": list(premises),
+        "temperature": round(temperature, 3),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+def cached_rewrite(cache_key: str) -> Optional[str]:
+    """The model's response from a previous rewrite, or None if it hasn't been done before"""
+    cache = get_rewrite_cache()
+    if cache is None:
+        return None
+    rewritten_by_model = cache.get(cache_key)
+    rewrite_cache_stats["hits" if rewritten_by_model is not None else "misses"] += 1
+    return rewritten_by_model
 
+
+def store_rewrite(cache_key: str, rewritten_by_model: str):
+    cache = get_rewrite_cache()
+    if cache is not None and rewritten_by_model is not None:
+        cache[cache_key] = rewritten_by_model
+
+
+def rewrite_cache_summary() -> str:
+    lookups = rewrite_cache_stats["hits"] + rewrite_cache_stats["misses"]
+    hit_rate = rewrite_cache_stats["hits"] / lookups if lookups else 0.0
+    return f"Rewrite cache: {rewrite_cache_stats['hits']}/{lookups} hits ({hit_rate:.0%}), {REWRITE_CACHE_PATH}"
+
+
+def answer_tier_summary() -> str:
+    total = sum(answer_tier_stats.values())
+    tiers = ", ".join(f"{answer_tier_stats[tier]} {tier} ({answer_tier_stats[tier] / (total or 1):.0%})"
+                      for tier in ["local", "model", "failed"])
+    return f"Answers put into ETR notation: {tiers}"
+
+
+def report_scoring_stats():
+    """Print how the answers were scored, and close the rewrite cache. lm_eval doesn't say when it's done scoring, so
+    this also runs when the process exits."""
+    if answer_tier_stats:
+        print(answer_tier_summary())
+    if rewrite_cache_stats:
+        print(rewrite_cache_summary())
+    answer_tier_stats.clear()
+    rewrite_cache_stats.clear()
+    close_rewrite_cache()
+
+
+atexit.register(report_scoring_stats)
+
+
+def rewrite_prompt(model_answer: str, short_name_to_full_name: dict[str, str], premises: list[str]) -> str:
+    """The prompt asking the rewrite model to put a free-form answer into ETR notation"""
     # Generate some example premises
     full_premises: list[str] = []
     for p in premises:
@@ -325,16 +548,19 @@ def use_model_get_etr_text(model_answer: str, short_name_to_full_name: dict[str,
     # print("Name Options:", name_options)
     # print("Premises:", ", ".join(full_premises))
     # print("Name Substitutions:", short_name_to_full_name)
-    response = openai.chat.completions.create(
-        model="gpt-4.1-mini",  # 20 times cheaper than gpt-4!
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        temperature=temperature,
-        max_tokens=200
-    )
-    rewritten_by_model = response.choices[0].message.content
-    # print(f"Rewritten by model: {rewritten_by_model}")
+    return prompt
+
+
+def etr_text_from_rewrite(rewritten_by_model: str, short_name_to_full_name: dict[str, str]) -> str:
+    """Pull the ETR statement out of the rewrite model's response, and fix up its predicate names and notation
+
+    Raises:
+        ValueError: If it uses a predicate that isn't in the problem
+    """
+    # Reverse short_name_to_full_name
+    # Here, "short names" are useful for logical statements, and they might be like "matterEating", and "long names" are for English, like "matter eating"
+    full_name_to_short_name = {v: k for k, v in short_name_to_full_name.items() if k and v}
+
     etr_text = get_etr_substr(rewritten_by_model)
 
     # Why did this ever seem like a good idea?
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Report how long each module takes to import from cold, to catch import-time regressions.
+
+Every import is timed in a fresh interpreter, so nothing is shared between measurements. Modules listed in
+LIGHT_MODULES must also not load the heavy dependencies listed next to them (e.g. `FullProblem` has to be importable
+without rich or the solver stack, for the lm_eval scoring hooks).
+
+Usage:
+    python -m scripts.benchmark_imports
+    python -m scripts.benchmark_imports etr_case_generator.reified_problem --repeat 10 --budget etr_case_generator.reified_problem=0.1
+
+Exits with status 1 if a module fails to import, a light module loads a heavy dependency, or a module goes over its
+budget.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that are slow to import, and are only needed by code that actually works with views or solvers
+HEAVY_DEPENDENCIES = ("pyetr", "pysmt", "rich", "numpy", "smt_interface", "openai")
+
+# Modules that should stay cheap to import, and the heavy dependencies each of them must not load
+LIGHT_MODULES = {
+    "etr_case_generator": HEAVY_DEPENDENCIES,
+    "etr_case_generator.logic_types": HEAVY_DEPENDENCIES,
+    "etr_case_generator.reified_problem": HEAVY_DEPENDENCIES,
+    "lm_eval/tasks/etr_problems/scoring.py": HEAVY_DEPENDENCIES,
+}
+
+DEFAULT_MODULES = [
+    "etr_case_generator",
+    "etr_case_generator.logic_types",
+    "etr_case_generator.reified_problem",
+    "etr_case_generator.ontology",
+    "etr_case_generator.seed_banks",
+    "etr_case_generator.mutations",
+    "etr_case_generator.logic_helper",
+    "etr_case_generator.smt_generator",
+    "etr_case_generator.etr_generator_no_queue",
+    "etr_case_generator.generate_problem_from_logical",
+    "smt_interface.smt_encoder",
+    "lm_eval/tasks/etr_problems/scoring.py",
+    "lm_eval/tasks/etr_problems_open_ended/open_ended_scoring.py",
+]
+
+# Run in the fresh interpreter. Modules can be given by name, or by path for the lm_eval hooks, which lm_eval loads
+# from their files rather than as part of a package.
+_TIMING_CODE = """
+import importlib, importlib.util, json, sys, time
+target, heavy = sys.argv[1], sys.argv[2].split(",")
+start = time.perf_counter()
+if target.endswith(".py"):
+    spec = importlib.util.spec_from_file_location("_benchmarked_module", target)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+else:
+    importlib.import_module(target)
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def time_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter, returning the time taken and which heavy dependencies it loaded.
+
+    Raises:
+        ImportError: If the import fails, e.g. because an optional dependency isn't installed
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _TIMING_CODE, module, ",".join(HEAVY_DEPENDENCIES)],
+        cwd=REPO_ROOT,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_budgets(budgets: list[str]) -> dict[str, float]:
+    parsed = {}
+    for budget in budgets:
+        module, _, seconds = budget.rpartition("=")
+        if not module:
+            raise ValueError(f"Budgets look like module=seconds, got {budget}")
+        parsed[module] = float(seconds)
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold imports of the package's modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Module names, or paths to .py files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module. The median is reported.")
+    parser.add_argument("--budget", nargs="*", default=[], help="Fail if a module takes longer, e.g. etr_case_generator.reified_problem=0.1")
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    failures = []
+    print(f"{'module':<64} {'median s':>9} {'min s':>7}  heavy dependencies loaded")
+    for module in args.modules:
+        try:
+            runs = [time_import(module) for _ in range(args.repeat)]
+        except ImportError as e:
+            print(f"{module:<64} {'failed':>9} {'':>7}  {e}")
+            failures.append(f"{module} could not be imported: {e}")
+            continue
+        times = [run["seconds"] for run in runs]
+        median = statistics.median(times)
+        loaded = runs[0]["loaded"]
+        print(f"{module:<64} {median:>9.3f} {min(times):>7.3f}  {', '.join(loaded) or '-'}")
+
+        forbidden = [m for m in loaded if m in LIGHT_MODULES.get(module, ())]
+        if forbidden:
+            failures.append(f"{module} should not import {', '.join(forbidden)}")
+        if module in budgets and median > budgets[module]:
+            failures.append(f"{module} took {median:.3f}s to import, over its budget of {budgets[module]:.3f}s")
+
+    if failures:
+        print("\nImport regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
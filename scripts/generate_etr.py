@@ -1,28 +1,343 @@
 import traceback
 import argparse
 import json
-import math
+import multiprocessing
+import os
 import random
-from typing import get_args
-from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import deepcopy
+from typing import Callable, Optional, Union, get_args
+from collections import Counter, deque
 from tqdm import tqdm
 
 from etr_case_generator.etr_generator import set_queue_sizes
-from etr_case_generator.etr_generator_no_queue import ETRGeneratorIndependent
+from etr_case_generator.etr_generator_no_queue import (
+    SEARCH_MODES,
+    ETRGeneratorIndependent,
+    TargetStats,
+    format_search_stats,
+)
 from etr_case_generator.generate_problem_from_logical import generate_problem
 from etr_case_generator.reified_problem import FullProblem, QuestionType, PartialProblem
+from etr_case_generator.etr_inference_cache import get_inference_cache
 from etr_case_generator.logic_types import AtomCount
+from etr_case_generator.problem_fingerprint import problem_fingerprint
+from etr_case_generator.problem_pipeline import PipelineStats, ProblemRejected
+from etr_case_generator.quota_scheduler import QuotaScheduler
+from etr_case_generator.seed_banks import SEED_BANKS
+from pyetr import View
 
 from etr_case_generator.ontology import Ontology, get_all_ontologies, natural_name_to_logical_name
 
 
-def generate_problem_list(n_problems: int, args, question_types: list[str]) -> list[FullProblem]:
+def _exception_key(e: Exception) -> str:
+    """Identify an exception by its type and the file/line where it was raised, for the error report."""
+    # Get full module path of exception
+    exception_key = f"{type(e).__module__}.{type(e).__name__}"
+    # Get file and line number where exception occurred
+    tb = traceback.extract_tb(e.__traceback__)[-1]  # Get last frame
+    location = f"{tb.filename}:{tb.lineno}"
+    return f"{exception_key} at {location}"
+
+
+# Per-process state for `--workers` mode, set up once by _init_worker
+_worker_args = None
+_worker_ontologies: list[Ontology] = []
+
+
+def _init_worker(args):
+    global _worker_args, _worker_ontologies
+    _worker_args = args
+    _worker_ontologies = get_all_ontologies()
+    for o in _worker_ontologies:
+        o.preferred_name_shortening_scheme = args.name_shortening
+        o.fill_mapping()
+
+
+def _generate_in_worker(task_index: int, scheduler: QuotaScheduler):
+    """Run a single `generate_problem` attempt in a worker process.
+
+    Every task is seeded from (base seed, task index) and works on a fresh copy of a randomly chosen ontology and a
+    fresh generator, so the result doesn't depend on which worker picked the task up. `scheduler` is a snapshot of
+    the coordinator's quotas as of when the task was submitted.
+
+    Returns:
+        ("ok", FullProblem, search_stats, pipeline_stats) on success, ("rejected", search_stats, pipeline_stats) if a
+        stage of generate_problem turned the problem away, or ("error", exception_key, message, search_stats,
+        pipeline_stats) if the attempt failed. search_stats are the generator's per-target-count stats and
+        pipeline_stats the per-stage stats, for this attempt.
+    """
+    random.seed(f"{_worker_args.seed}:{task_index}")
+    ontology = deepcopy(random.choice(_worker_ontologies))
+    generator = ETRGeneratorIndependent(seed_bank=_worker_args.seed_bank, search=_worker_args.search)
+    pipeline_stats = PipelineStats()
+    try:
+        problem = generate_problem(_worker_args, ontology=ontology, generator=generator, scheduler=scheduler,
+                                   stats=pipeline_stats)
+        return "ok", problem, generator.search_stats, pipeline_stats
+    except ProblemRejected:
+        return "rejected", generator.search_stats, pipeline_stats
+    except Exception as e:
+        return "error", _exception_key(e), str(e), generator.search_stats, pipeline_stats
+
+
+def _generate_with_workers(n_problems: int, args, pbar: tqdm,
+                           admit_problem: Callable[[FullProblem, int, dict], bool],
+                           scheduler: QuotaScheduler,
+                           record_exception: Callable[[str, str], None],
+                           search_stats: dict[AtomCount, TargetStats],
+                           pipeline_stats: PipelineStats,
+                           first_task_index: int = 0,
+                           resumed_snapshots: Optional[dict[int, QuotaScheduler]] = None):
+    """Spread `generate_problem` attempts across a process pool.
+
+    The quota bookkeeping stays here in the coordinator: results are admitted strictly in submission order, and a
+    new task is only submitted once the task `window` places before it has been consumed. That keeps the
+    scheduler snapshot each task sees, and therefore the output, fixed for a given seed and worker count.
+
+    On resume, `resumed_snapshots` holds the snapshots that the first tasks saw in the interrupted run (see
+    `resumed_task_snapshots`), so that they are submitted with the same quotas.
+
+    Each task's generator search stats are merged into `search_stats`, and its stage stats into `pipeline_stats`.
+    """
+    window = _task_window(args)
+    in_flight: deque[tuple[int, Future]] = deque()
+    next_task_index = first_task_index
+    current_counter = 0
+    resumed_snapshots = resumed_snapshots or {}
+    # Task indices of the problems accepted from the last `window` consumed tasks, which the checkpoint needs
+    recent_task_indices: deque[int] = deque()
+
+    def submit(executor: ProcessPoolExecutor):
+        nonlocal next_task_index
+        snapshot = resumed_snapshots.pop(next_task_index, None) or deepcopy(scheduler)
+        in_flight.append((next_task_index, executor.submit(_generate_in_worker, next_task_index, snapshot)))
+        next_task_index += 1
+
+    # Mutation candidates are drawn from sets of strings and Views, whose iteration order depends on the hash seed,
+    # so workers are spawned fresh with a hash seed derived from the base seed rather than forked from this process.
+    os.environ.setdefault("PYTHONHASHSEED", str(args.seed % 2**32))
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(args,))
+    try:
+        for _ in range(window):
+            submit(executor)
+        while pbar.n < n_problems:
+            if scheduler.is_exhausted():
+                print(f"Every quota that can still be met is full, stopping at {pbar.n} problems.")
+                break
+            task_index, future = in_flight.popleft()
+            result = future.result()
+            current_counter += 1
+            submit(executor)
+
+            *_, task_search_stats, task_pipeline_stats = result
+            for count, stats in task_search_stats.items():
+                search_stats.setdefault(count, TargetStats()).merge(stats)
+            pipeline_stats.merge(task_pipeline_stats)
+            if result[0] == "rejected":
+                continue
+            if result[0] == "error":
+                _, exception_key, message, _, _ = result
+                print(f"Failed to generate problem: {message}")
+                record_exception(exception_key, message)
+                continue
+            problem: FullProblem = result[1]
+            try:
+                # On resume, pick up with the first task that wasn't consumed before the checkpoint, and rebuild the
+                # snapshots of the tasks that were in flight from the problems accepted since the oldest was submitted
+                while recent_task_indices and recent_task_indices[0] < task_index + 1 - window:
+                    recent_task_indices.popleft()
+                checkpoint = {"next_task_index": task_index + 1, "recent_task_indices": [*recent_task_indices, task_index]}
+                if admit_problem(problem, current_counter, checkpoint):
+                    recent_task_indices.append(task_index)
+                    pbar.update(1)
+                    current_counter = 0
+            except Exception as e:
+                print(f"Failed to generate problem: {e}")
+                record_exception(_exception_key(e), str(e))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _task_window(args) -> int:
+    """How many tasks `_generate_with_workers` keeps in flight"""
+    return args.workers * 2
+
+
+def resumed_task_snapshots(checkpoint: dict, num_records: int, restore_record: Callable[[int], None],
+                           scheduler: QuotaScheduler, window: int) -> dict[int, QuotaScheduler]:
+    """Restore the saved problems in order, and the scheduler snapshots that the tasks in flight at the checkpoint saw.
+
+    Task k was submitted once task k - window had been consumed, before the problem from it (if any) was admitted.
+    So its snapshot counts the problems accepted from tasks before k - window, which the checkpoint's
+    `recent_task_indices` (the tasks that the last few saved problems came from) tell apart from the others.
+
+    Args:
+        checkpoint (dict): The checkpoint of the interrupted run
+        num_records (int): How many problems were saved
+        restore_record (Callable[[int], None]): Counts the saved problem with this index towards the quotas
+        scheduler (QuotaScheduler): The scheduler that restore_record counts problems in
+        window (int): How many tasks were kept in flight
+
+    Returns:
+        dict[int, QuotaScheduler]: Task index -> the snapshot to submit it with. Empty for checkpoints from before
+            recent_task_indices was saved, whose in-flight tasks are submitted with the restored scheduler.
+    """
+    recent_task_indices = checkpoint.get("recent_task_indices")
+    first_task_index = checkpoint.get("next_task_index")
+    if recent_task_indices is None or first_task_index is None:
+        for i in range(num_records):
+            restore_record(i)
+        return {}
+
+    first_recent = num_records - len(recent_task_indices)
+    for i in range(first_recent):
+        restore_record(i)
+    snapshots = {}
+    pending = deque(zip(range(first_recent, num_records), recent_task_indices))
+    for task_index in range(first_task_index, first_task_index + window):
+        while pending and pending[0][1] < task_index - window:
+            restore_record(pending.popleft()[0])
+        snapshots[task_index] = deepcopy(scheduler)
+    while pending:
+        restore_record(pending.popleft()[0])
+    return snapshots
+
+
+class JsonlProblemWriter:
+    """Writes each accepted problem to every output file as soon as it is generated.
+
+    One buffered handle is kept open per (question type, chain of thought) file. Handles are flushed every
+    `flush_every` problems, so an interrupted run keeps everything up to the last flush and problems never pile up
+    in memory.
+
+    Every flush also writes a checkpoint next to the outputs, recording how many problems the files hold and the
+    generation state (RNG state or next worker task) at that point, which is what `--resume` restarts from.
+    """
+
+    def __init__(self, args, question_types: list[str], flush_every: int = 10, num_existing: int = 0):
+        self.args = args
+        self.flush_every = flush_every
+        self.num_written = num_existing
+        self.checkpoint: dict = {}
+        self.files = {}  # (prompt_type, chain_of_thought) -> open file handle
+        for prompt_type in question_types:
+            for chain_of_thought in chain_of_thought_options(args.chain_of_thought_prompt):
+                fname = output_file_name(args.save_file_name, prompt_type, chain_of_thought)
+                self.files[(prompt_type, chain_of_thought)] = open(fname, "a" if num_existing else "w")
+
+    def write(self, problem: FullProblem, checkpoint: Optional[dict] = None):
+        """Write a problem to all output files.
+
+        Args:
+            problem: The accepted problem
+            checkpoint: Generation state to resume from, as of just after this problem was accepted
+        """
+        for (prompt_type, chain_of_thought), f in self.files.items():
+            f.write(json.dumps(problem.to_dict_for_jsonl(self.args, format=prompt_type, chain_of_thought=chain_of_thought)) + "\n")
+        self.num_written += 1
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        if self.num_written % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+        checkpoint = {"num_written": self.num_written, "seed": self.args.seed, **self.checkpoint}
+        fname = checkpoint_file_name(self.args.save_file_name)
+        with open(fname + ".tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(fname + ".tmp", fname)  # Never leave a half-written checkpoint behind
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+            print(f"Saved file {f.name}")
+
+    def __enter__(self) -> "JsonlProblemWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def chain_of_thought_options(chain_of_thought_prompt: str) -> list[bool]:
+    options = []
+    if chain_of_thought_prompt == "no" or chain_of_thought_prompt == "both":
+        options.append(False)
+    if chain_of_thought_prompt == "yes" or chain_of_thought_prompt == "both":
+        options.append(True)
+    return options
+
+
+def output_file_name(save_file_name: str, prompt_type: str, chain_of_thought: bool) -> str:
+    if chain_of_thought:
+        return f"datasets/{save_file_name}_{prompt_type}_with_cot.jsonl"
+    return f"datasets/{save_file_name}_{prompt_type}.jsonl"
+
+
+def checkpoint_file_name(save_file_name: str) -> str:
+    return f"datasets/{save_file_name}.checkpoint.json"
+
+
+def load_resume_state(args, question_types: list[str]) -> tuple[list[dict], dict]:
+    """Load the problems saved by an interrupted run, for `--resume`.
+
+    The output files are cut back to the number of problems recorded in the last checkpoint (or, without a
+    checkpoint, to the number of complete lines that all of them share), so that every file agrees and matches the
+    generation state we resume from.
+
+    Returns:
+        tuple[list[dict], dict]: The saved records from one of the output files, and the checkpoint ({} if missing)
+    """
+    checkpoint = {}
+    if os.path.exists(checkpoint_file_name(args.save_file_name)):
+        with open(checkpoint_file_name(args.save_file_name)) as f:
+            checkpoint = json.load(f)
+
+    lines_by_file = {}
+    for prompt_type in question_types:
+        for chain_of_thought in chain_of_thought_options(args.chain_of_thought_prompt):
+            fname = output_file_name(args.save_file_name, prompt_type, chain_of_thought)
+            lines = []
+            if os.path.exists(fname):
+                with open(fname) as f:
+                    lines = [line for line in f if line.endswith("\n")]  # Drop a partially written last line
+            lines_by_file[fname] = lines
+
+    num_complete = min(len(lines) for lines in lines_by_file.values())
+    num_kept = min(checkpoint.get("num_written", num_complete), num_complete)
+    if num_kept < checkpoint.get("num_written", 0):
+        print(f"Warning: checkpoint records {checkpoint['num_written']} problems but only {num_kept} were found, ignoring the checkpoint.")
+        checkpoint = {}
+
+    for fname, lines in lines_by_file.items():
+        with open(fname, "w") as f:
+            f.writelines(lines[:num_kept])
+
+    records = [json.loads(line) for line in next(iter(lines_by_file.values()))[:num_kept]]
+    print(f"Resuming from {num_kept} problems already saved in datasets/{args.save_file_name}_*.jsonl")
+    return records, checkpoint
+
+
+def generate_problem_list(n_problems: int, args, question_types: list[str],
+                          writer: Optional[JsonlProblemWriter] = None,
+                          resumed_records: Optional[list[dict]] = None,
+                          checkpoint: Optional[dict] = None) -> list[FullProblem]:
     """Generate ETR problems with optional balancing constraints.
 
     Args:
         n_problems (int): The number of problems to generate
         args: Command line arguments including balancing options
         question_types (list[str]): List of question types to generate
+        writer (JsonlProblemWriter, optional): If given, each problem is written out as soon as it is accepted
+            and is not kept in memory, so the returned list is empty.
+        resumed_records (list[dict], optional): JSONL records saved by an interrupted run. They count towards
+            n_problems and the quotas, and won't be generated again.
+        checkpoint (dict, optional): The checkpoint saved alongside resumed_records
 
     The function can balance problems in two ways:
     - By quadrants (erotetic vs classical correctness) when args.balance_quadrants is True
@@ -34,38 +349,15 @@ def generate_problem_list(n_problems: int, args, question_types: list[str]) -> l
         o.preferred_name_shortening_scheme = args.name_shortening
         o.fill_mapping()
 
-    # Initialize tracking based on balancing mode
-    if args.balance_quadrants:
-        balance_counts = {
-            (True, True): 0,   # (erotetic, classical)
-            (True, False): 0,  # (erotetic, non-classical)
-            (False, True): 0,  # (non-erotetic, classical)
-            (False, False): 0  # (non-erotetic, non-classical)
-        }
-        num_needed_per_category = (n_problems + 3) // 4
-    elif args.balance_etr_agreement:
-        balance_counts = {True: 0, False: 0}  # Tracks agreement between ETR and classical
-        num_needed_per_category = n_problems // 2
-    else:
-        balance_counts = None
-        num_needed_per_category = n_problems
-
-    # Initialize atom count tracking
-    num_atoms_counts = {i: 0 for i in args.num_atoms_set} if args.num_atoms_set else {}
-    counts_by_atom = {}
+    scheduler = QuotaScheduler(
+        n_problems=n_problems,
+        num_atoms_set=args.num_atoms_set or [],
+        balance="quadrants" if args.balance_quadrants else "etr_agreement" if args.balance_etr_agreement else None,
+        etr_only_wrong=args.etr_only_wrong,
+        balance_seed_families=args.seed_bank == "ILLUSORY_INFERENCE_FROM_DISJUNCTION",
+    )
     if args.num_atoms_set:
-        num_needed_per_category_by_atom = num_needed_per_category // len(args.num_atoms_set)
-        print(f"Generating {num_needed_per_category_by_atom} problems per category per atom count.")
-        for size in args.num_atoms_set:
-            if args.balance_quadrants:
-                counts_by_atom[size] = {
-                    (True, True): 0, (True, False): 0,
-                    (False, True): 0, (False, False): 0
-                }
-            elif args.balance_etr_agreement:
-                counts_by_atom[size] = {True: 0, False: 0}
-            else:
-                counts_by_atom[size] = 0
+        print(f"Generating {scheduler.num_needed_per_category_by_atom} problems per category per atom count.")
 
     pbar_postfix = {}
 
@@ -73,126 +365,157 @@ def generate_problem_list(n_problems: int, args, question_types: list[str]) -> l
     exception_type_counter = Counter[str]()
     exception_examples = {}  # Store first example of each error type
 
-    problem_generator = ETRGeneratorIndependent(seed_bank=args.seed_bank)
-    count_per_size = math.ceil(n_problems / len(args.num_atoms_set)) if args.num_atoms_set else 0
+    problem_generator = ETRGeneratorIndependent(seed_bank=args.seed_bank, search=args.search)
     print(f"Balancing by: {'Quadrants' if args.balance_quadrants else 'ETR agreement' if args.balance_etr_agreement else 'Not balancing'}.")
     if args.num_atoms_set:
-        print(f"Generating {n_problems} problems with {count_per_size} problems per atom count, across {len(args.num_atoms_set)} atom counts.")
+        print(f"Generating {n_problems} problems with {scheduler.count_per_size} problems per atom count, across {len(args.num_atoms_set)} atom counts.")
 
     problems: list[FullProblem] = []
-    pbar = tqdm(range(n_problems), desc="Generating problems")
+    num_generated = 0
+    # Keys of the premises of every accepted problem. problem_generator dedups on its own, but with --workers each task
+    # gets a fresh generator. Fingerprints ignore renaming, so they match across ontologies too.
+    seen_premises: set[Union[int, tuple[str, ...]]] = set()
+    pipeline_stats = PipelineStats()  # Time spent and problems rejected at each stage of generate_problem
+
+    def premises_key(premises: list[View]) -> Union[int, tuple[str, ...]]:
+        """With a seed bank the seeds are served unmutated, and repeats in a different ontology are allowed (like in
+        `ETRGeneratorIndependent`), so key on the renamed premises there, and on their fingerprint otherwise."""
+        if args.seed_bank is not None:
+            return tuple(v.to_str() for v in premises)
+        return problem_fingerprint(premises)
+
+    def record_exception(exception_key: str, message: str):
+        exception_type_counter[exception_key] += 1
+        if exception_key not in exception_examples:
+            exception_examples[exception_key] = message[:100]  # Store first 100 chars
+
+    def admit_problem(problem: FullProblem, current_counter: int, checkpoint: Optional[dict] = None) -> bool:
+        """Apply the etr_only_wrong, balancing and atom count quotas to a generated problem.
+
+        Returns True if the problem was kept, False if its bucket is already full. Problems are mostly turned away
+        before they're filled out (see QuotaScheduler.check_partial_problem), this is the final check.
+        """
+        problem_key = premises_key([v.logical_form_etr_view for v in problem.views])
+        if problem_key in seen_premises:
+            raise ValueError(f"Already generated a problem with premises {tuple(v.logical_form_etr for v in problem.views)}")
+
+        # This is helpful for small numbers of atom counts, but it gets annoying for large numbers
+        # if args.num_atoms_set:
+        #     for na, c in num_atoms_counts.items():
+        #         pbar_postfix[f"NA{na}"] = c
+
+        # Get problem characteristics
+        conclusion = problem.etr_predicted_conclusion
+        problem_is_erotetic = conclusion.is_etr_predicted
+        assert problem_is_erotetic, "ETR predicted conclusion should be erotetic by definition"
+        problem_is_classical = conclusion.is_classically_correct
+
+        if args.etr_only_wrong and problem_is_classical:
+            # print("Skipping problem because ETR conclusion is correct, running with `--etr_only_wrong`.")
+            raise ValueError("ETR conclusion is correct, but `--etr_only_wrong` is set.")
+
+        # Handle balancing logic
+        balance_counts = scheduler.category_counts
+        if args.balance_quadrants:
+            pbar_postfix.update({
+                'EC': balance_counts[(True, True)],    # Erotetic Classical
+                'EN': balance_counts[(True, False)],   # Erotetic Non-classical
+                'NC': balance_counts[(False, True)],   # Non-erotetic Classical
+                'NN': balance_counts[(False, False)],  # Non-erotetic Non-classical
+            })
+        elif args.balance_etr_agreement:
+            pbar_postfix.update({
+                'Agree': balance_counts[True],     # ETR agrees with classical
+                'Disagree': balance_counts[False], # ETR disagrees with classical
+            })
+
+        pbar_postfix['T'] = current_counter
+        pbar.set_postfix(pbar_postfix)
+
+        # Check the atom count, category and seed family quotas
+        num_atoms = sum(len(view.logical_form_etr_view.atoms) for view in problem.views)
+        reason = scheduler.rejection_reason(num_atoms, problem_is_classical, problem.seed_id)
+        if reason is not None:
+            scheduler.late_rejections[reason] += 1
+            return False
+        scheduler.record(num_atoms, problem_is_classical, problem.seed_id)
+
+        # Print out the generated problem
+        print(f"Generated problem with {num_atoms} atoms. Premises:")
+        for v in problem.views:
+            print(" ***", v.logical_form_etr)
+        print(f"Conclusion:")
+        print(" >>>", conclusion.view.logical_form_etr)
+        print(f"Characteristics: erotetic={problem_is_erotetic}, classical={problem_is_classical}")
+
+        nonlocal num_generated
+        num_generated += 1
+        seen_premises.add(problem_key)
+        if writer is not None:
+            writer.write(problem, checkpoint)
+        else:
+            problems.append(problem)
+        pbar.set_postfix(pbar_postfix)
+        return True
+
+    def restore_record(record: dict):
+        """Count a problem saved by an earlier run towards the quotas, as admit_problem did when it accepted it."""
+        nonlocal num_generated
+        scoring_guide = record["scoring_guide"]
+        details = scoring_guide["generation_details"]
+        scheduler.record(details["total_num_atoms"], scoring_guide["etr_predicted_is_classically_correct"], details["seed_id"])
+        premises = [View.from_str(p) for p in details["premises_etr"]]
+        seen_premises.add(premises_key(premises))
+        problem_generator.mark_as_generated(premises)
+        num_generated += 1
+
+    resumed_records = resumed_records or []
+    resumed_snapshots = {}
+    if args.workers > 1:
+        resumed_snapshots = resumed_task_snapshots(checkpoint or {}, len(resumed_records),
+                                                   lambda i: restore_record(resumed_records[i]), scheduler, _task_window(args))
+    else:
+        for record in resumed_records:
+            restore_record(record)
+    if resumed_records:
+        print(f"Restored counts from {len(resumed_records)} saved problems. Atom counts: {dict(scheduler.atom_counts)}, balance: {dict(scheduler.category_counts)}")
+
+    pbar = tqdm(total=n_problems, initial=num_generated, desc="Generating problems")
     try:
-        for _ in pbar:
-            current_counter: int = 0
-            while True:  # Keep trying until we get an acceptable problem
-                ontology = random.choice(all_ontologies)
-                current_counter += 1
-
-                try:
-                    # Calculate remaining capacity needed for each atom count
-                    needed_counts = Counter[AtomCount]()
-                    if args.num_atoms_set:
-                        for size in args.num_atoms_set:
-                            remaining = count_per_size - num_atoms_counts[size]
-                            needed_counts[AtomCount(size)] = remaining
-
-                    problem: FullProblem = generate_problem(args, ontology=ontology, needed_counts=needed_counts, generator=problem_generator)
-
-                    # This is helpful for small numbers of atom counts, but it gets annoying for large numbers
-                    # if args.num_atoms_set:
-                    #     for na, c in num_atoms_counts.items():
-                    #         pbar_postfix[f"NA{na}"] = c
-
-                    # Get problem characteristics
-                    conclusion = problem.etr_predicted_conclusion
-                    problem_is_erotetic = conclusion.is_etr_predicted
-                    assert problem_is_erotetic, "ETR predicted conclusion should be erotetic by definition"
-                    problem_is_classical = conclusion.is_classically_correct
-
-                    if args.etr_only_wrong and problem_is_classical:
-                        # print("Skipping problem because ETR conclusion is correct, running with `--etr_only_wrong`.")
-                        raise ValueError("ETR conclusion is correct, but `--etr_only_wrong` is set.")
-
-                    # Handle balancing logic
-                    if args.balance_quadrants:
-                        category = (problem_is_erotetic, problem_is_classical)
-                        pbar_postfix.update({
-                            'EC': balance_counts[(True, True)],    # Erotetic Classical
-                            'EN': balance_counts[(True, False)],   # Erotetic Non-classical
-                            'NC': balance_counts[(False, True)],   # Non-erotetic Classical
-                            'NN': balance_counts[(False, False)],  # Non-erotetic Non-classical
-                        })
-                    elif args.balance_etr_agreement:
-                        category = (problem_is_erotetic == problem_is_classical)
-                        # print(f"Assessing a problem in category {category}, counts: {balance_counts}")
-                        pbar_postfix.update({
-                            'Agree': balance_counts[True],     # ETR agrees with classical
-                            'Disagree': balance_counts[False], # ETR disagrees with classical
-                        })
-                    else:
-                        category = None
-
-                    pbar_postfix['T'] = current_counter
-                    pbar.set_postfix(pbar_postfix)
-
-                    # Check atom count constraints
-                    num_atoms = sum(len(view.logical_form_etr_view.atoms) for view in problem.views)
-                    if args.num_atoms_set:
-                        if num_atoms not in args.num_atoms_set:
-                            continue
-                        if category is not None:
-                            if counts_by_atom[num_atoms][category] >= num_needed_per_category_by_atom:
-                                continue
-                            counts_by_atom[num_atoms][category] += 1
-                        num_atoms_counts[num_atoms] += 1
-
-                    # Check category constraints
-                    if category is not None:
-                        if balance_counts[category] >= num_needed_per_category:
-                            continue
-                        balance_counts[category] += 1
-
-                    # print(f"Found problem in category {category}")
-
-                    if args.seed_bank == "ILLUSORY_INFERENCE_FROM_DISJUNCTION":
-                        n_controls_in_problem_list = len([p for p in problems if str(p.seed_id).startswith("control")])
-                        n_targets_in_problem_list = len([p for p in problems if str(p.seed_id).startswith("target")])
-                        if str(problem.seed_id).startswith("control") and n_controls_in_problem_list >= n_problems // 2:
-                            continue
-                        if str(problem.seed_id).startswith("target") and n_targets_in_problem_list >= n_problems // 2:
-                            continue
-
-                    # Print out the generated problem
-                    print(f"Generated problem with {num_atoms} atoms. Premises:")
-                    for v in problem.views:
-                        print(" ***", v.logical_form_etr)
-                    print(f"Conclusion:")
-                    print(" >>>", conclusion.view.logical_form_etr)
-                    print(f"Characteristics: erotetic={problem_is_erotetic}, classical={problem_is_classical}")
-
-                    problems.append(problem)
-                    pbar.set_postfix(pbar_postfix)
-                    break  # Successfully generated a problem, move to next iteration
-                except Exception as e:
-                    print(f"Failed to generate problem: {e}")
-                    # Get full module path of exception
-                    exception_key = f"{type(e).__module__}.{type(e).__name__}"
-                    # Get file and line number where exception occurred
-                    tb = traceback.extract_tb(e.__traceback__)[-1]  # Get last frame
-                    location = f"{tb.filename}:{tb.lineno}"
-                    exception_key = f"{exception_key} at {location}"
-                    exception_type_counter[exception_key] += 1
-                    if exception_key not in exception_examples:
-                        exception_examples[exception_key] = str(e)[:100]  # Store first 100 chars
-                    # print("Exception type counts:")
-                    # for k, v in exception_type_counter.items():
-                    #     print(f" * {k}: {v}")
-                    # raise e  # Uncomment to see the exception
-                    continue  # Try again
+        if args.workers > 1:
+            _generate_with_workers(n_problems, args, pbar, admit_problem, scheduler, record_exception,
+                                   problem_generator.search_stats, pipeline_stats, first_task_index=(checkpoint or {}).get("next_task_index", 0),
+                                   resumed_snapshots=resumed_snapshots)
+        else:
+            while pbar.n < n_problems:
+                if scheduler.is_exhausted():
+                    print(f"Every quota that can still be met is full, stopping at {num_generated} problems.")
+                    break
+                current_counter: int = 0
+                while True:  # Keep trying until we get an acceptable problem
+                    ontology = random.choice(all_ontologies)
+                    current_counter += 1
+
+                    try:
+                        problem: FullProblem = generate_problem(args, ontology=ontology, generator=problem_generator,
+                                                                scheduler=scheduler, stats=pipeline_stats)
+                        if admit_problem(problem, current_counter, {"rng_state": random.getstate()}):
+                            pbar.update(1)
+                            break  # Successfully generated a problem, move to next iteration
+                    except ProblemRejected:
+                        continue  # Counted in pipeline_stats
+                    except Exception as e:
+                        print(f"Failed to generate problem: {e}")
+                        record_exception(_exception_key(e), str(e))
+                        # print("Exception type counts:")
+                        # for k, v in exception_type_counter.items():
+                        #     print(f" * {k}: {v}")
+                        # raise e  # Uncomment to see the exception
+                        continue  # Try again
     except KeyboardInterrupt:
         print("!" * 64)
         print("Interrupted by user.")
-        print(f"Generated {len(problems)} problems out of {n_problems} requested.")
+        print(f"Generated {num_generated} problems out of {n_problems} requested.")
         print("!" * 64, "\n")
     finally:
         pbar.close()
@@ -204,6 +527,16 @@ def generate_problem_list(n_problems: int, args, question_types: list[str]) -> l
         print(f" * {v} times: {k}")
         print(f"     Example: {exception_examples[k]}")
     print("!" * 64, "\n")
+
+    if args.workers <= 1:  # Each worker has its own cache, which we don't see from here
+        print(f"ETR inference cache: {get_inference_cache().stats()}")
+    print(f"Quotas:")
+    print(scheduler.summary())
+    print(f"Time and rejections by stage of generate_problem:")
+    print(pipeline_stats.summary())
+    if problem_generator.search_stats:
+        print(f"Search stats by target atom count ({args.search}):")
+        print(format_search_stats(problem_generator.search_stats))
     
     return problems
 
@@ -242,7 +575,8 @@ def main():
     parser.add_argument("--num_atoms_set", nargs="+", type=int, default=[4, 5, 6], help="Set the number of atoms in the problem.")
     parser.add_argument("--generator_max_queue_size", type=int, default=100, help="Maximum number of problems to generate at once, if using the generator with a queue.")
     parser.add_argument("--non_categorical_okay", action="store_true", help="If true, it's okay to generate non-categorical, aka problems whose ETR conclusion has disjunctions in it, or which is null.")
-    parser.add_argument("--seed_bank", type=str, default=None, help="Name of the problem seed bank to default to.")
+    parser.add_argument("--seed_bank", type=str, default=None, choices=list(SEED_BANKS), help="Name of the problem seed bank to default to.")
+    parser.add_argument("--search", type=str, default="random_walk", choices=SEARCH_MODES, help="How to mutate a seed problem up to the target atom count, with --no_multi_view. 'directed' never overshoots the target and only runs ETR inference on candidates with the right count.")
     multi_view_group = parser.add_mutually_exclusive_group(required=False)
     multi_view_group.add_argument("--multi_view", dest="multi_view", action="store_true", help="Generate problems with multiple views")
     multi_view_group.add_argument("--no_multi_view", dest="multi_view", action="store_false", help="Generate problems with a single view")
@@ -251,6 +585,10 @@ def main():
     parser.add_argument("--no-etr_only_wrong", dest="etr_only_wrong", action="store_false", 
                     help="Allow problems where the ETR conclusion is correct (by default, only wrong ETR conclusions are generated).")
     parser.set_defaults(etr_only_wrong=True)
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes to spread problem generation over. Quotas are still tracked in the main process.")
+    parser.add_argument("--flush_every", type=int, default=10, help="Flush the output files after every this many problems.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run with the same --save_file_name, generating only the problems that are still missing.")
+    parser.add_argument("--seed", type=int, default=None, help="Base random seed. With --workers, output is deterministic for a given seed and worker count.")
 
     args = parser.parse_args()
 
@@ -260,26 +598,27 @@ def main():
         assert args.question_type in get_args(QuestionType), f"Invalid question type: {args.question_type}, must be in: {get_args(QuestionType)}"
         question_types = [args.question_type]
 
-    set_queue_sizes(args.generator_max_queue_size // 2, args.generator_max_queue_size)
+    resumed_records, checkpoint = [], {}
+    if args.resume:
+        resumed_records, checkpoint = load_resume_state(args, question_types)
+        if args.seed is None:
+            args.seed = checkpoint.get("seed")
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    elif args.workers > 1:
+        args.seed = random.randrange(2**32)
+        print(f"Using base seed {args.seed} for {args.workers} workers.")
+    if "rng_state" in checkpoint:
+        version, internal_state, gauss_next = checkpoint["rng_state"]
+        random.setstate((version, tuple(internal_state), gauss_next))
 
-    # Most of the logic occurs here!
-    problems: list[FullProblem] = generate_problem_list(n_problems=args.n_problems, args=args, question_types=question_types)
+    set_queue_sizes(args.generator_max_queue_size // 2, args.generator_max_queue_size)
 
-    # Save to file
-    for prompt_type in question_types:
-        if args.chain_of_thought_prompt == "no" or args.chain_of_thought_prompt == "both":
-            fname = f"datasets/{args.save_file_name}_{prompt_type}.jsonl"
-            with open(fname, "w") as f:
-                for problem in problems:
-                    f.write(json.dumps(problem.to_dict_for_jsonl(args, format=prompt_type, chain_of_thought=False)) + "\n")
-            print(f"Saved file {fname}")
-
-        if args.chain_of_thought_prompt == "yes" or args.chain_of_thought_prompt == "both":
-            fname = f"datasets/{args.save_file_name}_{prompt_type}_with_cot.jsonl"
-            with open(fname, "w") as f:
-                for problem in problems:
-                    f.write(json.dumps(problem.to_dict_for_jsonl(args, format=prompt_type, chain_of_thought=True)) + "\n")
-            print(f"Saved file {fname}")
+    # Most of the logic occurs here! Problems are saved to file as they are generated.
+    with JsonlProblemWriter(args, question_types, flush_every=args.flush_every, num_existing=len(resumed_records)) as writer:
+        generate_problem_list(n_problems=args.n_problems, args=args, question_types=question_types, writer=writer,
+                              resumed_records=resumed_records, checkpoint=checkpoint)
 
 if __name__ == "__main__":
     main()